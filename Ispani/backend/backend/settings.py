@@ -68,6 +68,111 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Raise when a list serializer reads a relation that was not eager loaded
+# (see myapp/eager_loading.py). Meant to be switched on in tests.
+EAGER_LOADING_STRICT = False
+
+# Seconds a user's default event feed (no filters, first page) stays cached.
+# Event and participation changes invalidate it sooner.
+EVENT_FEED_CACHE_TTL = 30
+
+# Full-text search (myapp/search). InMemorySearchBackend is available for
+# databases without FTS5; it indexes in-process.
+SEARCH_BACKEND = 'myapp.search.backends.SQLiteFTSBackend'
+SEARCH_MAX_RESULTS = 500
+
+# Event recommendations (myapp/recommendations.py): ranked ids kept per user,
+# and how long a process reuses its matrix of upcoming events.
+RECOMMENDATIONS_PER_USER = 50
+RECOMMENDATIONS_CACHE_TTL = 60 * 15
+RECOMMENDATION_CANDIDATES_TTL = 60 * 5
+
+# Similar students (myapp/matching.py): ranked matches kept per user, how often
+# a process applies changed profiles to its student matrix, and how long it
+# keeps that matrix before rebuilding it from scratch.
+STUDENT_MATCHES_PER_USER = 200
+STUDENT_MATCHES_CACHE_TTL = 60 * 5
+STUDENT_MATCHING_REFRESH_INTERVAL = 10
+STUDENT_MATCHING_REBUILD_TTL = 60 * 60
+
+# Chat messages from WebSockets are written in batches (myapp/realtime):
+# a batch is flushed when it reaches the size or its oldest message has
+# waited the interval (seconds). MESSAGE_ID_WORKER (0-1023) must differ per
+# process when set; by default each process leases one from the cache.
+MESSAGE_WRITE_BATCH_SIZE = 100
+MESSAGE_WRITE_FLUSH_INTERVAL = 0.2
+MESSAGE_ID_WORKER = None
+# Failed flushes are retried after a doubling delay of at most
+# MESSAGE_WRITE_MAX_BACKOFF seconds; meanwhile no more than
+# MESSAGE_WRITE_BUFFER_LIMIT messages per model are held.
+MESSAGE_WRITE_MAX_BACKOFF = 30
+MESSAGE_WRITE_BUFFER_LIMIT = 10000
+
+# Presence (myapp/realtime/presence.py): users drop offline PRESENCE_TTL
+# seconds after their last heartbeat; UserStatus rows are synced every
+# PRESENCE_SYNC_INTERVAL seconds.
+PRESENCE_TTL = 60
+PRESENCE_SYNC_INTERVAL = 30
+
+# Chat room member ids cached for message fan-out (myapp/realtime/delivery.py);
+# membership changes drop the entry immediately.
+ROOM_MEMBERS_CACHE_TTL = 60 * 10
+
+# Each user's groups (with roles), chat rooms and events, cached for
+# permission checks (myapp/membership.py); changes drop the entry and tell
+# the user's sockets, which also reload them after MEMBERSHIP_SOCKET_MAX_AGE.
+MEMBERSHIP_CACHE_TTL = 60 * 10
+MEMBERSHIP_SOCKET_MAX_AGE = 60
+
+# WebSocket flow control (myapp/realtime/flow.py): a sender may send
+# WS_RATE_LIMIT frames per second with bursts of WS_RATE_BURST, not counting
+# heartbeats and subscriptions. Each socket
+# queues at most WS_OUTBOUND_QUEUE_SIZE frames for its client, then applies
+# WS_OVERFLOW_POLICY ('drop', 'coalesce' or 'disconnect'). Frames that
+# waited longer than WS_SEND_DELAY_WARNING seconds are counted as delayed.
+WS_RATE_LIMIT = 5
+WS_RATE_BURST = 20
+WS_OUTBOUND_QUEUE_SIZE = 200
+WS_OVERFLOW_POLICY = 'coalesce'
+WS_SEND_DELAY_WARNING = 1.0
+
+# Reconnecting sockets catch up from resume_from=<seq> (myapp/realtime/replay.py):
+# the last MESSAGE_REPLAY_BUFFER_SIZE messages of up to
+# MESSAGE_REPLAY_CONVERSATIONS conversations are kept in memory per process,
+# and at most MESSAGE_REPLAY_LIMIT messages are replayed on one resume.
+MESSAGE_REPLAY_BUFFER_SIZE = 200
+MESSAGE_REPLAY_CONVERSATIONS = 1000
+MESSAGE_REPLAY_LIMIT = 500
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Chunked uploads (myapp/media/uploads.py) are assembled in UPLOAD_DIR.
+# Image thumbnails and previews (longest side in px) are rendered by
+# MEDIA_VARIANT_WORKERS processes, or inline when it is 0.
+UPLOAD_DIR = BASE_DIR / 'uploads'
+UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MEDIA_THUMBNAIL_SIZE = 320
+MEDIA_PREVIEW_SIZE = 1280
+MEDIA_VARIANT_WORKERS = 2
+
+# Attachments and event media are stored once per content
+# (myapp/media/storage.py), hashed while multipart uploads stream in.
+# collect_media_garbage deletes blobs unused for MEDIA_GC_GRACE seconds and
+# chunked uploads left incomplete for UPLOAD_EXPIRY seconds.
+FILE_UPLOAD_HANDLERS = [
+    'myapp.media.storage.HashingMemoryFileUploadHandler',
+    'myapp.media.storage.HashingTemporaryFileUploadHandler',
+]
+MEDIA_GC_GRACE = 24 * 60 * 60
+UPLOAD_EXPIRY = 2 * 24 * 60 * 60
+
+# Media is served from MEDIA_URL with range requests and ETags
+# (myapp/media/serving.py). Behind nginx, set MEDIA_ACCEL_REDIRECT to an
+# internal location aliasing MEDIA_ROOT, e.g. '/protected-media/', to have
+# nginx send the file bodies.
+MEDIA_ACCEL_REDIRECT = None
 
 
 MIDDLEWARE = [
@@ -233,6 +338,16 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Message sequence counters, message id worker leases and presence
+# (myapp/realtime) must be seen by every process, so the cache lives in the
+# same Redis as the channel layer rather than in each process's memory.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    },
+}
+
 # Stripe settings
 STRIPE_SECRET_KEY = 'your_stripe_secret_key'
 STRIPE_PUBLISHABLE_KEY = 'your_stripe_publishable_key'
@@ -1,6 +1,8 @@
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
+from myapp.views import MediaFileView
 
 
 urlpatterns = [
@@ -22,6 +24,12 @@ urlpatterns = [
     
     # Tutoring system
     path('tutoring/', include('myapp.urls.tutoring')),
+
+    # Chunked uploads
+    path('uploads/', include('myapp.urls.media')),
+
+    # Stored media
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:name>", MediaFileView.as_view(), name='media-file'),
     
 ]
 
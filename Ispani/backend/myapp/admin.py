@@ -123,13 +123,19 @@ class PaymentAdmin(admin.ModelAdmin):
     raw_id_fields = ('booking',)
     date_hierarchy = 'created_at'
 
+class GroupMembershipInline(admin.TabularInline):
+    model = GroupMembership
+    raw_id_fields = ('user',)
+    extra = 0
+
 # Existing admin classes (updated with any necessary changes)
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('name', 'group_type', 'year_of_study', 'course', 'hobbies', 'admin')
     search_fields = ('name', 'course', 'hobbies')
     list_filter = ('group_type', 'year_of_study')
-    raw_id_fields = ('admin', 'members')
+    raw_id_fields = ('admin',)
+    inlines = [GroupMembershipInline]
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
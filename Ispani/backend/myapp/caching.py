@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+EVENT_FEED_VERSION_KEY = 'event_feed:version'
+# Bumped only by changes to events and their tags, not by participation.
+EVENT_CANDIDATES_VERSION_KEY = 'event_candidates:version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The version key was evicted; any value it is reset to is new.
+        cache.set(key, get_version(key) + 1, timeout=None)
+
+
+def get_event_feed_version():
+    return get_version(EVENT_FEED_VERSION_KEY)
+
+
+def event_feed_cache_key(user_id):
+    """
+    Cache key for a user's default (unfiltered, first page) event feed.
+    Keys embed a global version, so bumping it invalidates every user's feed.
+    """
+    return f'event_feed:{get_event_feed_version()}:{user_id}'
+
+
+def get_cached_event_feed(user_id):
+    return cache.get(event_feed_cache_key(user_id))
+
+
+def set_cached_event_feed(user_id, data):
+    cache.set(event_feed_cache_key(user_id), data, settings.EVENT_FEED_CACHE_TTL)
+
+
+def invalidate_event_feeds():
+    bump_version(EVENT_FEED_VERSION_KEY)
+
+
+def get_event_candidates_version():
+    """Version of the upcoming public events recommendations are ranked from."""
+    return get_version(EVENT_CANDIDATES_VERSION_KEY)
+
+
+def invalidate_event_candidates():
+    bump_version(EVENT_CANDIDATES_VERSION_KEY)
+
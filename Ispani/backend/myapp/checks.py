@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+PROCESS_LOCAL_CHANNEL_LAYERS = (
+    'channels.layers.InMemoryChannelLayer',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Presence, message sequence numbers and message id leases (myapp/realtime)
+    live in the default cache, so it has to be shared whenever the channel
+    layer is, i.e. whenever several processes serve sockets.
+    """
+    cache_backend = settings.CACHES.get('default', {}).get('BACKEND')
+    channel_backend = getattr(settings, 'CHANNEL_LAYERS', {}).get('default', {}).get('BACKEND')
+    if cache_backend in PROCESS_LOCAL_CACHES and channel_backend not in (None, *PROCESS_LOCAL_CHANNEL_LAYERS):
+        return [Warning(
+            "The default cache is local to each process but the channel layer is shared.",
+            hint="Point CACHES at a shared backend such as Redis; otherwise users online "
+                 "on one worker look offline on the others and sequence numbers repeat.",
+            id='myapp.W001',
+        )]
+    return []
@@ -1,82 +1,513 @@
-import json
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .models import ChatRoom, ChatMessage, PrivateChat, PrivateMessage
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db.models import Q
+from .models import ChatMessage, Event, PrivateChat, PrivateMessage
+from .membership import get_memberships
+from .realtime import flow, presence, replay
+from .realtime.codecs import DecodeError, decode_frame, negotiate
+from .realtime.writebehind import BufferFull
+from .realtime.delivery import (
+    event_comments_group_name, get_private_chat_user_ids, post_private_message,
+    post_room_message, user_group_name,
+)
 
-User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Close code sent when the socket is not allowed into the conversation
+CLOSE_FORBIDDEN = 4403
+# Close code sent when the client cannot keep up with its frames
+CLOSE_SLOW_CONSUMER = 4408
+
+
+class PresenceMixin:
+    """
+    Registers the socket with the presence service and relays presence
+    events. Clients keep themselves online by sending any frame, or
+    ``{"type": "heartbeat"}`` when idle, at least every PRESENCE_TTL seconds.
+    """
+    presence_registered = False
+
+    async def presence_connect(self):
+        await presence.user_connected(self.user.id)
+        self.presence_registered = True
+        self.last_heartbeat = time.monotonic()
+
+    async def presence_disconnect(self):
+        if self.presence_registered:
+            self.presence_registered = False
+            await presence.user_disconnected(self.user.id)
+
+    async def presence_heartbeat(self):
+        # Refreshing a few times per TTL is enough; skip it on busy sockets.
+        if time.monotonic() - self.last_heartbeat > settings.PRESENCE_TTL / 3:
+            self.last_heartbeat = time.monotonic()
+            await presence.heartbeat(self.user.id)
+
+    async def presence(self, event):
+        await self.send_frame({
+            'type': 'presence',
+            'user_id': event['user_id'],
+            'online': event['online']
+        }, key=('presence', event['user_id']))
+
+
+class UserSocketMixin(PresenceMixin):
+    """
+    Authenticates the socket and joins it to its user's group, through which
+    every message for the user is delivered (see myapp/realtime/delivery.py).
+    Subclasses name extra groups in ``get_groups`` and may reject the socket
+    in ``authorize``.
+
+    Frames are encoded with the codec negotiated on connect (see
+    myapp/realtime/codecs.py). Messages carry the sender's id; the first
+    time a sender appears on a socket a ``user`` frame with their username
+    is sent so clients can cache it.
+
+    Incoming frames other than control frames (heartbeats, subscriptions) are
+    rate limited per sender and outgoing ones go through a bounded queue
+    drained by a writer task (see myapp/realtime/flow.py).
+
+    Message frames carry the message's ``seq`` in its conversation; a client
+    reconnecting with ``resume_from=<seq>`` is sent what it missed, followed
+    by a ``resumed`` frame (see myapp/realtime/replay.py).
+    """
+    max_known_users = 1000
+    # Frame types that cost no more than a membership check, never throttled.
+    control_frames = frozenset({'heartbeat', 'subscribe', 'unsubscribe'})
+    writer = None
+    memberships = None
+    memberships_loaded_at = 0
 
-class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.room_id = self.scope['url_route']['kwargs']['room_id']
-        self.room_group_name = f'chat_{self.room_id}'
+        # The user is resolved once here and reused for every frame.
+        self.user = self.scope['user']
+        self.groups_joined = []
+        self.codec, self.subprotocol = negotiate(self.scope)
+        self.known_users = set()
+        self.outbound = flow.FrameQueue()
+        self.closing = False
+        self.throttled = False
 
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        if not self.user.is_authenticated or not await self.authorize():
+            await self.close(code=CLOSE_FORBIDDEN)
+            return
+
+        self.groups_joined = [user_group_name(self.user.id)] + self.get_groups()
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept(self.subprotocol)
+        self.rate_limit = flow.get_sender_bucket(self.user.id)
+        self.writer = asyncio.create_task(self.write_frames())
+        await self.presence_connect()
+        await self.accepted()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        sender_id = data['sender_id']
-        message = data['message']
-
-        user = await User.objects.aget(id=sender_id)
-        room = await ChatRoom.objects.aget(id=self.room_id)
-        chat_message = await ChatMessage.objects.acreate(room=room, sender=user, content=message)
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'sender': user.username,
-                'message': chat_message.content,
-                'timestamp': str(chat_message.timestamp)
-            }
-        )
+        if self.writer is not None:
+            self.writer.cancel()
+            self.outbound.clear()
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        await self.presence_disconnect()
 
-    async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'sender': event['sender'],
+    async def authorize(self):
+        return True
+
+    def get_groups(self):
+        return []
+
+    async def accepted(self):
+        pass
+
+    async def belongs_to(self, check):
+        """
+        ``check`` the user's Memberships (see myapp/membership.py). The socket
+        keeps them until they change (``memberships_changed``) or for at most
+        MEMBERSHIP_SOCKET_MAX_AGE seconds; a failed check reloads them in
+        case the user has joined since.
+        """
+        age = time.monotonic() - self.memberships_loaded_at
+        if self.memberships is None or age > settings.MEMBERSHIP_SOCKET_MAX_AGE:
+            await self.load_memberships()
+        elif check(self.memberships):
+            return True
+        else:
+            await self.load_memberships()
+        return check(self.memberships)
+
+    async def load_memberships(self):
+        self.memberships = await sync_to_async(get_memberships)(self.user, refresh=True)
+        self.memberships_loaded_at = time.monotonic()
+
+    async def memberships_changed(self, event):
+        self.memberships = None
+        await self.revalidate()
+
+    async def revalidate(self):
+        """Drop whatever the user may no longer follow after a membership change."""
+
+    async def event_invite(self, event):
+        # Notifications are only forwarded by sockets with an inbox.
+        pass
+
+    def query_param(self, name):
+        query = parse_qs(self.scope.get('query_string', b'').decode('latin-1'))
+        return (query.get(name) or [None])[0]
+
+    async def resume(self, model, conversation_id, resume_from, **extra):
+        """
+        Send the messages of a conversation after ``resume_from``. Returns
+        their seqs so the live copies of any that raced with the replay can
+        be skipped (see ``already_replayed``).
+        """
+        events, latest, complete = await sync_to_async(replay.get_missed)(model, conversation_id, resume_from)
+        # Let the writer catch up rather than overflowing the queue.
+        room = max(self.outbound.maxsize // 2, 1)
+        for event in events:
+            await self.outbound.wait_for_space(room)
+            await self.send_message_frame(event, **extra)
+        await self.send_frame({'type': 'resumed', 'seq': latest, 'complete': complete, **extra})
+        return {event['seq'] for event in events}
+
+    def already_replayed(self, replayed, event):
+        if replayed and event.get('seq') in replayed:
+            replayed.discard(event['seq'])
+            return True
+        return False
+
+    async def receive(self, text_data=None, bytes_data=None):
+        await self.presence_heartbeat()
+        try:
+            data = decode_frame(self.codec, text_data, bytes_data)
+        except DecodeError:
+            # Still counted against the rate limit below.
+            data = None
+        if data is None or data.get('type') not in self.control_frames:
+            if not self.rate_limit.consume():
+                flow.metrics['rate_limited'] += 1
+                # Tell the client once per run of rejected frames, not per frame.
+                if not self.throttled:
+                    self.throttled = True
+                    await self.send_frame({'type': 'error', 'error': 'Rate limit exceeded'})
+                return
+            self.throttled = False
+        if data is None:
+            await self.send_frame({'type': 'error', 'error': 'Malformed frame'})
+            return
+        try:
+            await self.receive_frame(data)
+        except BufferFull:
+            await self.send_frame({'type': 'error', 'error': 'Messages cannot be stored right now; try again later'})
+
+    async def receive_frame(self, data):
+        if data.get('type') == 'heartbeat':
+            return
+        message = data.get('message')
+        if isinstance(message, str) and message:
+            await self.receive_message(data, message)
+        elif message is not None:
+            await self.send_frame({'type': 'error', 'error': 'Messages must be text'})
+
+    async def send_frame(self, payload, key=None):
+        """Queue ``payload`` for the client; see FrameQueue.put for ``key``."""
+        if self.closing:
+            return
+        if not self.outbound.put(payload, key):
+            self.closing = True
+            flow.metrics['slow_disconnects'] += 1
+            logger.warning("Closing socket of user %s: %d frames queued.", self.user.id, len(self.outbound))
+            self.writer.cancel()
+            self.outbound.clear()
+            await self.close(code=CLOSE_SLOW_CONSUMER)
+
+    async def write_frames(self):
+        while True:
+            enqueued_at, payload = await self.outbound.get()
+            dropped = self.outbound.take_dropped()
+            if dropped:
+                await self.write_frame({'type': 'dropped', 'count': dropped})
+            await self.write_frame(payload)
+            flow.record_sent(enqueued_at)
+
+    async def write_frame(self, payload):
+        if self.codec.binary:
+            await self.send(bytes_data=self.codec.encode(payload))
+        else:
+            await self.send(text_data=self.codec.encode(payload))
+
+    async def send_message_frame(self, event, **extra):
+        sender_id = event['sender_id']
+        if sender_id not in self.known_users:
+            if len(self.known_users) >= self.max_known_users:
+                self.known_users.clear()
+            self.known_users.add(sender_id)
+            await self.send_frame({'type': 'user', 'id': sender_id, 'username': event['sender']})
+
+        await self.send_frame({
+            'type': 'message',
+            # As a string: message ids exceed 2**53 (see myapp/realtime/ids.py).
+            'id': str(event['id']),
+            'seq': event.get('seq'),
+            'sender_id': sender_id,
             'message': event['message'],
-            'timestamp': event['timestamp']
-        }))
+            'timestamp': event['timestamp'],
+            **extra
+        })
 
 
+class ChatConsumer(UserSocketMixin, AsyncWebsocketConsumer):
+    async def authorize(self):
+        self.room_id = int(self.scope['url_route']['kwargs']['room_id'])
+        return await self.belongs_to(lambda memberships: memberships.in_room(self.room_id))
 
-class PrivateChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.chat_id = self.scope['url_route']['kwargs']['chat_id']
-        self.room_group_name = f'private_chat_{self.chat_id}'
+    def get_groups(self):
+        # The room group carries presence; messages arrive through the user group.
+        return [f'chat_{self.room_id}']
+
+    async def accepted(self):
+        self.replayed = set()
+        resume_from = self.query_param('resume_from')
+        if resume_from and resume_from.isdigit():
+            self.replayed = await self.resume(ChatMessage, self.room_id, int(resume_from))
 
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+    async def revalidate(self):
+        if not await self.belongs_to(lambda memberships: memberships.in_room(self.room_id)):
+            await self.close(code=CLOSE_FORBIDDEN)
+
+    async def receive_message(self, data, message):
+        await post_room_message(self.user, self.room_id, message)
+
+    async def chat_message(self, event):
+        if event.get('room_id') != self.room_id or self.already_replayed(self.replayed, event):
+            return
+        await self.send_message_frame(event)
+
+
+
+class PrivateChatConsumer(UserSocketMixin, AsyncWebsocketConsumer):
+    async def authorize(self):
+        self.chat_id = int(self.scope['url_route']['kwargs']['chat_id'])
+        self.chat = await PrivateChat.objects.filter(
+            Q(user1=self.user) | Q(user2=self.user),
+            id=self.chat_id
+        ).afirst()
+        return self.chat is not None
+
+    def get_groups(self):
+        return [f'private_chat_{self.chat_id}']
+
+    async def accepted(self):
+        self.replayed = set()
+        resume_from = self.query_param('resume_from')
+        if resume_from and resume_from.isdigit():
+            self.replayed = await self.resume(PrivateMessage, self.chat_id, int(resume_from))
+
+    async def receive_message(self, data, message):
+        await post_private_message(self.user, self.chat_id, message)
+
+    async def chat_message(self, event):
+        if event.get('chat_id') != self.chat_id or self.already_replayed(self.replayed, event):
+            return
+        await self.send_message_frame(event)
+
+
+class UserConsumer(UserSocketMixin, AsyncWebsocketConsumer):
+    """
+    One multiplexed socket for everything a user follows.
+
+    The client opens streams by sending
+    ``{"type": "subscribe", "stream": <id>, "topic": <topic>, "id": <object id>}``
+    and closes them with ``{"type": "unsubscribe", "stream": <id>}``. Topics:
+
+    - ``room`` / ``private``: messages of a chat room / private chat. Sending
+      ``{"type": "message", "stream": <id>, "message": "..."}`` posts to it.
+      Adding ``"resume_from": <seq>`` to the subscribe frame replays the
+      messages after that seq first.
+    - ``inbox``: messages of every conversation without a stream of its own,
+      and invitations to events.
+    - ``event_comments``: new comments on an event.
+    - ``room_presence`` / ``private_presence``: members going online/offline.
+
+    Every frame sent back carries the ``stream`` it belongs to.
+    """
+    max_streams = 100
+    message_models = {'room': ChatMessage, 'private': PrivateMessage}
+
+    async def connect(self):
+        self.streams = {}  # stream id -> (topic, object id)
+        self.routes = {}  # (topic, object id) -> stream id
+        self.stream_groups = {}  # channel layer group -> stream id
+        self.replayed = {}  # (topic, object id) -> seqs sent by resume
+        await super().connect()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        sender_id = data['sender_id']
-        message = data['message']
-
-        user = await User.objects.aget(id=sender_id)
-        chat = await PrivateChat.objects.aget(id=self.chat_id)
-        chat_message = await PrivateMessage.objects.acreate(chat=chat, sender=user, content=message)
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'sender': user.username,
-                'message': chat_message.content,
-                'timestamp': str(chat_message.timestamp)
-            }
-        )
+        for group in self.stream_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        await super().disconnect(close_code)
+
+    async def receive_frame(self, data):
+        frame_type = data.get('type')
+        stream = data.get('stream')
+
+        if frame_type == 'heartbeat':
+            return
+        if frame_type in ('subscribe', 'unsubscribe', 'message') and not isinstance(stream, (str, int)):
+            # Stream ids key dicts, so they must be hashable scalars.
+            await self.send_error(None, 'A stream id is required')
+            return
+        if frame_type == 'subscribe':
+            await self.subscribe(stream, data.get('topic'), data.get('id'), data.get('resume_from'))
+        elif frame_type == 'unsubscribe':
+            await self.unsubscribe(stream)
+        elif frame_type == 'message':
+            await self.post_message(stream, data.get('message'))
+        else:
+            await self.send_error(stream, 'Unknown frame type')
+
+    async def subscribe(self, stream, topic, object_id, resume_from=None):
+        if stream not in self.streams and len(self.streams) >= self.max_streams:
+            await self.send_error(stream, 'Too many streams')
+            return
+
+        try:
+            object_id = int(object_id) if topic != 'inbox' else None
+            resume_from = int(resume_from) if resume_from is not None else None
+        except (TypeError, ValueError):
+            await self.send_error(stream, 'A numeric id is required')
+            return
+
+        group = await self.authorize_topic(topic, object_id)
+        if group is False:
+            await self.send_error(stream, 'Unknown topic or not allowed')
+            return
+
+        await self.unsubscribe(stream, reply=False)
+        previous = self.routes.get((topic, object_id))
+        if previous is not None:
+            await self.unsubscribe(previous, reply=False)
+
+        self.streams[stream] = (topic, object_id)
+        self.routes[(topic, object_id)] = stream
+        if group:
+            self.stream_groups[group] = stream
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.send_frame({'stream': stream, 'type': 'subscribed'})
+
+        if resume_from is not None and topic in self.message_models:
+            conversation = {'room_id': object_id} if topic == 'room' else {'chat_id': object_id}
+            self.replayed[(topic, object_id)] = await self.resume(
+                self.message_models[topic], object_id, resume_from, stream=stream, **conversation
+            )
+
+    async def unsubscribe(self, stream, reply=True):
+        subscription = self.streams.pop(stream, None)
+        if subscription is not None:
+            self.routes.pop(subscription, None)
+            self.replayed.pop(subscription, None)
+            for group, group_stream in list(self.stream_groups.items()):
+                if group_stream == stream:
+                    del self.stream_groups[group]
+                    await self.channel_layer.group_discard(group, self.channel_name)
+        if reply:
+            await self.send_frame({'stream': stream, 'type': 'unsubscribed'})
+
+    async def revalidate(self):
+        for stream, (topic, object_id) in list(self.streams.items()):
+            if topic in ('room', 'room_presence', 'event_comments'):
+                if await self.authorize_topic(topic, object_id) is False:
+                    await self.unsubscribe(stream, reply=False)
+                    await self.send_error(stream, 'No longer allowed')
+
+    async def authorize_topic(self, topic, object_id):
+        """
+        Check that the user may follow ``topic``. Returns the channel layer
+        group to join, None when the user group already carries the topic,
+        or False when it is not allowed.
+        """
+        if topic == 'inbox':
+            return None
+        if topic in ('room', 'room_presence'):
+            if not await self.belongs_to(lambda memberships: memberships.in_room(object_id)):
+                return False
+            return None if topic == 'room' else f'chat_{object_id}'
+        if topic in ('private', 'private_presence'):
+            user_ids = await sync_to_async(get_private_chat_user_ids)(object_id)
+            if self.user.id not in user_ids:
+                return False
+            return None if topic == 'private' else f'private_chat_{object_id}'
+        if topic == 'event_comments':
+            visible = (
+                await self.belongs_to(lambda memberships: memberships.in_event(object_id))
+                or await Event.objects.filter(is_public=True, id=object_id).aexists()
+            )
+            return event_comments_group_name(object_id) if visible else False
+        return False
+
+    async def post_message(self, stream, message):
+        topic, object_id = self.streams.get(stream, (None, None))
+        if not message:
+            await self.send_error(stream, 'Empty message')
+        elif not isinstance(message, str):
+            await self.send_error(stream, 'Messages must be text')
+        elif topic == 'room':
+            await post_room_message(self.user, object_id, message)
+        elif topic == 'private':
+            await post_private_message(self.user, object_id, message)
+        else:
+            await self.send_error(stream, 'Messages can only be sent to room or private streams')
+
+    async def send_error(self, stream, error):
+        await self.send_frame({'stream': stream, 'type': 'error', 'error': error})
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'sender': event['sender'],
-            'message': event['message'],
-            'timestamp': event['timestamp']
-        }))
+        if 'room_id' in event:
+            key = ('room', event['room_id'])
+        else:
+            key = ('private', event['chat_id'])
+        stream = self.routes.get(key, self.routes.get(('inbox', None)))
+        if stream is None or self.already_replayed(self.replayed.get(key), event):
+            return
+
+        if key[0] == 'room':
+            await self.send_message_frame(event, stream=stream, room_id=event['room_id'])
+        else:
+            await self.send_message_frame(event, stream=stream, chat_id=event['chat_id'])
+
+    async def presence(self, event):
+        stream = self.stream_groups.get(event.get('group'))
+        if stream is None:
+            return
+        await self.send_frame({
+            'stream': stream,
+            'type': 'presence',
+            'user_id': event['user_id'],
+            'online': event['online']
+        }, key=('presence', stream, event['user_id']))
+
+    async def event_invite(self, event):
+        stream = self.routes.get(('inbox', None))
+        if stream is None:
+            return
+        await self.send_frame({
+            'stream': stream,
+            'type': 'invite',
+            'event_id': event['event_id'],
+            'title': event['title'],
+            'start_time': event['start_time'],
+            'inviter_id': event['inviter_id'],
+            'inviter': event['inviter'],
+        })
+
+    async def event_comment(self, event):
+        stream = self.routes.get(('event_comments', event['event_id']))
+        if stream is None:
+            return
+        await self.send_frame({
+            'stream': stream,
+            'type': 'comment',
+            'comment': event['comment']
+        })
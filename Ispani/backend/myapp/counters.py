@@ -0,0 +1,120 @@
+"""
+Denormalized counters.
+
+``Group.member_count``, ``Event.participants_count`` (participants going) and
+``Booking.current_participants`` are kept on the rows themselves, so list
+endpoints read them instead of counting. The write paths that add or remove
+members move them with ``F()`` updates, which the database applies
+atomically: concurrent joins never lose an increment, and claiming a place
+only succeeds while the counter is below its limit, so concurrent joins
+cannot overfill an event or session either.
+
+Writes outside these paths (the admin, cascading deletes) let a counter
+drift; ``manage.py reconcile_counters`` recounts and repairs them.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Booking, Event, EventParticipant, Group, GroupMembership, GroupSessionParticipant
+
+
+class Full(Exception):
+    """No place is left under the counter's limit."""
+
+
+def increment(queryset, field, delta=1):
+    return queryset.update(**{field: F(field) + delta})
+
+
+def decrement(queryset, field, delta=1):
+    return queryset.filter(**{f'{field}__gte': delta}).update(**{field: F(field) - delta})
+
+
+def claim_place(queryset, field, limit_field):
+    """Increment ``field`` if it is below ``limit_field``; returns whether it was."""
+    return queryset.filter(**{f'{field}__lt': F(limit_field)}).update(**{field: F(field) + 1}) > 0
+
+
+def set_participation(event, user, status, role=None):
+    """
+    Create or update ``user``'s participation in ``event`` with ``status``,
+    keeping ``participants_count`` right. Raises Full when going would take
+    the event past ``max_participants``. Returns ``(participant, created)``.
+    """
+    with transaction.atomic():
+        participant = EventParticipant.objects.select_for_update().filter(event=event, user=user).first()
+        was_going = participant is not None and participant.status == 'going'
+        events = Event.objects.filter(pk=event.pk)
+        if status == 'going' and not was_going:
+            if not claim_place(events, 'participants_count', 'max_participants'):
+                raise Full
+        elif was_going and status != 'going':
+            decrement(events, 'participants_count')
+
+        created = participant is None
+        if created:
+            participant = EventParticipant(event=event, user=user)
+        participant.status = status
+        if role is not None:
+            participant.role = role
+        participant.save()
+    return participant, created
+
+
+def leave_event(event, user):
+    with transaction.atomic():
+        participant = EventParticipant.objects.select_for_update().filter(event=event, user=user).first()
+        if participant is None:
+            return
+        if participant.status == 'going':
+            decrement(Event.objects.filter(pk=event.pk), 'participants_count')
+        participant.delete()
+
+
+def join_group_session(booking, user):
+    """
+    Add ``user`` to a group session ``booking``. Raises Full when the session
+    has no place left. Returns the GroupSessionParticipant.
+    """
+    with transaction.atomic():
+        participant, created = GroupSessionParticipant.objects.get_or_create(booking=booking, student=user)
+        if created and not claim_place(Booking.objects.filter(pk=booking.pk), 'current_participants', 'max_participants'):
+            # Leaving the block with an exception undoes the participant row.
+            raise Full
+    return participant
+
+
+def counted(model, relation, condition=Q(), offset=0):
+    """An expression counting the ``model`` rows pointing at each row through ``relation``."""
+    count = (
+        model.objects.filter(condition, **{relation: OuterRef('pk')})
+        .order_by().values(relation).annotate(count=Count('pk')).values('count')
+    )
+    return Coalesce(Subquery(count), Value(0)) + offset
+
+
+def reconciliations():
+    """(model, counter field, expression counting what it should hold)"""
+    return [
+        (Group, 'member_count', counted(GroupMembership, 'group')),
+        (Event, 'participants_count', counted(EventParticipant, 'event', Q(status='going'))),
+        # A booking's own student takes the first place.
+        (Booking, 'current_participants', counted(GroupSessionParticipant, 'booking', offset=1)),
+    ]
+
+
+def reconcile_counters(dry_run=False, batch_size=1000):
+    """Recount every counter and repair the ones that drifted; returns drifted rows per counter."""
+    drifted = {}
+    for model, field, actual in reconciliations():
+        ids = list(
+            model.objects.annotate(actual=actual).exclude(**{field: F('actual')}).values_list('pk', flat=True)
+        )
+        drifted[f'{model.__name__}.{field}'] = len(ids)
+        if dry_run:
+            continue
+        for start in range(0, len(ids), batch_size):
+            # Recounted in the UPDATE itself, so writes since the check are included.
+            model.objects.filter(pk__in=ids[start:start + batch_size]).update(**{field: actual})
+    return drifted
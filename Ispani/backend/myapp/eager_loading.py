@@ -0,0 +1,148 @@
+"""
+Eager loading for serializer trees.
+
+``eager_load`` walks a serializer's fields and applies the ``select_related``
+and ``prefetch_related`` calls its nested serializers need, so a list endpoint
+runs the same number of queries for 5 rows as for 500. Views add anything the
+walk cannot see (relations read inside ``SerializerMethodField``s) through the
+``select_related``/``prefetch_related`` arguments.
+
+With ``EAGER_LOADING_STRICT = True`` (meant for tests), ``serialize`` raises
+``UnexpectedQueryError`` as soon as a serializer touches a relation that was
+not loaded up front.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import Prefetch, QuerySet
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+from rest_framework.response import Response
+
+
+class UnexpectedQueryError(AssertionError):
+    """Raised in strict mode when serialization hits the database."""
+
+
+_relations_cache = {}
+
+
+def eager_load(queryset, serializer, select_related=(), prefetch_related=()):
+    """Return ``queryset`` with every relation ``serializer`` reads loaded up front."""
+    selects, prefetches = get_relations(serializer)
+    if selects or select_related:
+        # select_related() without lookups would join every non-null foreign key.
+        queryset = queryset.select_related(*selects, *select_related)
+    return queryset.prefetch_related(*prefetches, *prefetch_related)
+
+
+def get_relations(serializer):
+    """
+    Return ``(select_related, prefetch_related)`` lookups for a serializer
+    class or instance. Results are cached per serializer class.
+    """
+    serializer_class = serializer if isinstance(serializer, type) else type(serializer)
+    if serializer_class not in _relations_cache:
+        if isinstance(serializer, type):
+            serializer = serializer()
+        selects, prefetches = [], []
+        _collect(serializer, serializer.Meta.model, '', selects, prefetches)
+        _relations_cache[serializer_class] = (tuple(selects), tuple(prefetches))
+    return _relations_cache[serializer_class]
+
+
+def _collect(serializer, model, prefix, selects, prefetches):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        attrs = field.source_attrs
+        if isinstance(field, RelatedField) and field.use_pk_only_optimization():
+            # The last hop is read from the foreign key column, not the row.
+            attrs = attrs[:-1]
+
+        path, current = [], model
+        for attr in attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation:
+                break
+
+            path.append(attr)
+            lookup = prefix + '__'.join(path)
+            related_model = model_field.related_model
+
+            if model_field.many_to_many or model_field.one_to_many:
+                child = field.child if isinstance(field, serializers.ListSerializer) else None
+                if isinstance(child, serializers.ModelSerializer):
+                    child_queryset = eager_load(related_model._default_manager.all(), child)
+                    prefetches.append(Prefetch(lookup, queryset=child_queryset))
+                else:
+                    prefetches.append(lookup)
+                break
+
+            if lookup not in selects:
+                selects.append(lookup)
+            current = related_model
+        else:
+            if path and isinstance(field, serializers.ModelSerializer):
+                _collect(field, current, prefix + '__'.join(path) + '__', selects, prefetches)
+
+
+class EagerLoadingMixin:
+    """
+    Generic view mixin that eager loads the serializer tree for every queryset
+    the view filters, and serializes lists through ``serialize``.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return eager_load(
+            queryset,
+            self.get_serializer_class(),
+            select_related=self.select_related_fields,
+            prefetch_related=self.prefetch_related_fields,
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serialize(serializer))
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serialize(serializer))
+
+
+def serialize(serializer):
+    """
+    Return ``serializer.data``. In strict mode the instance is evaluated first
+    and any query issued while rendering raises ``UnexpectedQueryError``.
+    """
+    if not getattr(settings, 'EAGER_LOADING_STRICT', False):
+        return serializer.data
+
+    if isinstance(serializer.instance, QuerySet):
+        serializer.instance = list(serializer.instance)
+    label = type(getattr(serializer, 'child', serializer)).__name__
+    with forbid_queries(label):
+        return serializer.data
+
+
+@contextmanager
+def forbid_queries(label='serializer'):
+    def blocker(execute, sql, params, many, context):
+        raise UnexpectedQueryError(
+            f"{label} queried a relation that was not eager loaded: {sql}"
+        )
+
+    with connection.execute_wrapper(blocker):
+        yield
@@ -0,0 +1,72 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Group, GroupHobby
+from .search import filter_matches
+from .search.tokens import tokenize
+
+
+class EventFilterBackend(BaseFilterBackend):
+    """
+    Query parameter filters for event lists:
+    event_type, tag, search, date_from and date_to.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        event_type = request.query_params.get('event_type')
+        tag = request.query_params.get('tag')
+        search = request.query_params.get('search')
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+
+        if event_type:
+            queryset = queryset.filter(event_type=event_type)
+
+        if tag:
+            queryset = queryset.filter(tags__name=tag)
+
+        if search:
+            # Every match, not the top SEARCH_MAX_RESULTS: the other filters and
+            # the feed's own ordering decide what is shown.
+            queryset = filter_matches(queryset, 'event', search)
+
+        if date_from:
+            queryset = queryset.filter(start_time__gte=date_from)
+
+        if date_to:
+            queryset = queryset.filter(start_time__lte=date_to)
+
+        return queryset
+
+
+class GroupFilterBackend(BaseFilterBackend):
+    """
+    Query parameter filters for group discovery: group_type, course,
+    year_of_study and hobby. ``hobby`` takes one or more words (repeated or
+    comma separated) and keeps the groups that list all of them.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        group_type = getattr(view, 'group_type', None) or request.query_params.get('group_type')
+        course = request.query_params.get('course')
+        year_of_study = request.query_params.get('year_of_study')
+        hobbies = {token for value in request.query_params.getlist('hobby') for token in tokenize(value)}
+
+        if group_type:
+            if group_type not in dict(Group.GROUP_TYPES):
+                raise ValidationError({'group_type': f"Must be one of: {', '.join(dict(Group.GROUP_TYPES))}."})
+            queryset = queryset.filter(group_type=group_type)
+
+        if course:
+            queryset = queryset.filter(course=course)
+
+        if year_of_study:
+            try:
+                queryset = queryset.filter(year_of_study=int(year_of_study))
+            except ValueError:
+                raise ValidationError({'year_of_study': "Must be a number."})
+
+        for token in hobbies:
+            queryset = queryset.filter(id__in=GroupHobby.objects.filter(token=token).values('group_id'))
+
+        return queryset
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from myapp.membership import assign_students
+from myapp.models import StudentProfile
+
+
+class Command(BaseCommand):
+    help = "Add existing students to the groups of their course and year of study."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Students matched and inserted at a time.")
+
+    def handle(self, *args, **options):
+        profiles = (StudentProfile.objects.exclude(course__isnull=True).exclude(course='')
+                    .filter(year_of_study__isnull=False).only('user_id', 'course', 'year_of_study')
+                    .order_by('pk'))
+        batch_size = options['batch_size']
+
+        count = 0
+        last_pk = 0
+        while True:
+            # Keyset pagination keeps every batch an index range scan.
+            batch = list(profiles.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            assign_students(batch)
+            count += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(f"Assigned {count} students to their study groups.")
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from myapp.media.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete stored media nothing has referenced for MEDIA_GC_GRACE seconds, and abandoned uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would be deleted without deleting it.")
+
+    def handle(self, *args, **options):
+        stats = collect_garbage(dry_run=options['dry_run'])
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(
+            f"{verb} {stats['blobs']} blobs, {stats['files']} files ({stats['bytes']} bytes) "
+            f"and {stats['uploads']} abandoned uploads."
+        )
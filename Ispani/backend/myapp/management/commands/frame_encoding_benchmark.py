@@ -0,0 +1,120 @@
+import json
+import random
+import string
+import time
+import zlib
+from datetime import datetime, timezone
+
+from django.core.management import BaseCommand
+
+from myapp.realtime.codecs import CODECS, JSONCodec
+
+
+class PreviousJSONCodec(JSONCodec):
+    """json.dumps with default separators, as the consumers used to send."""
+
+    def encode(self, payload):
+        return json.dumps(payload)
+
+
+class Command(BaseCommand):
+    help = (
+        "Report bytes per message and encode cost of the WebSocket frame "
+        "encodings, with and without permessage-deflate style compression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--senders', type=int, default=20,
+                            help="Distinct senders in the simulated conversation.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        events = self.make_events(rng, options['messages'], options['senders'])
+
+        rows = [('previous json', PreviousJSONCodec(), self.legacy_frames(events))]
+        compact = self.compact_frames(events)
+        for name, codec in CODECS.items():
+            rows.append((name, codec, compact))
+
+        count = len(events)
+        self.stdout.write(f"{count} messages from {options['senders']} senders\n")
+        self.stdout.write(
+            f"{'encoding':<14}{'B/msg':>8}{'deflate B/msg':>15}{'deflate+ctx B/msg':>19}{'encode us/msg':>15}"
+        )
+        for name, codec, frames in rows:
+            started = time.perf_counter()
+            encoded = [codec.encode(frame) for frame in frames]
+            encode_us = (time.perf_counter() - started) / count * 1e6
+            encoded = [data.encode('utf-8') if isinstance(data, str) else data for data in encoded]
+
+            raw = sum(len(data) for data in encoded)
+            self.stdout.write(
+                f"{name:<14}{raw / count:>8.1f}{self.deflate(encoded, False) / count:>15.1f}"
+                f"{self.deflate(encoded, True) / count:>19.1f}{encode_us:>15.2f}"
+            )
+        self.stdout.write(
+            "Byte counts include the one-off user frames of the compact format. "
+            "'deflate' compresses each frame on its own (no context takeover); "
+            "'deflate+ctx' keeps the compressor state across frames, as "
+            "permessage-deflate does by default."
+        )
+
+    def make_events(self, rng, count, sender_count):
+        senders = [
+            (sender_id, ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(6, 14))))
+            for sender_id in range(1, sender_count + 1)
+        ]
+        words = ['exam', 'tomorrow', 'notes', 'chapter', 'anyone', 'meet', 'library', 'ok', 'thanks', 'lol',
+                 'assignment', 'due', 'friday', 'lecture', 'question', 'help', 'please', 'yes', 'no', 'tutorial']
+        timestamp = datetime(2026, 5, 4, 9, 0, tzinfo=timezone.utc).timestamp()
+        events = []
+        for message_id in range(count):
+            sender_id, username = rng.choice(senders)
+            timestamp += rng.expovariate(1 / 20)
+            events.append({
+                'id': 237000000000000000 + message_id * 4096,
+                'sender_id': sender_id,
+                'sender': username,
+                'message': ' '.join(rng.choices(words, k=rng.randint(1, 15))),
+                'timestamp': timestamp,
+            })
+        return events
+
+    def legacy_frames(self, events):
+        # The previous ChatConsumer frame: username and str(datetime) on every message.
+        return [
+            {
+                'id': event['id'],
+                'sender': event['sender'],
+                'message': event['message'],
+                'timestamp': str(datetime.fromtimestamp(event['timestamp'], tz=timezone.utc)),
+            }
+            for event in events
+        ]
+
+    def compact_frames(self, events):
+        frames = []
+        known = set()
+        for event in events:
+            if event['sender_id'] not in known:
+                known.add(event['sender_id'])
+                frames.append({'type': 'user', 'id': event['sender_id'], 'username': event['sender']})
+            frames.append({
+                'type': 'message',
+                'id': event['id'],
+                'sender_id': event['sender_id'],
+                'message': event['message'],
+                'timestamp': int(event['timestamp'] * 1000),
+            })
+        return frames
+
+    def deflate(self, frames, context_takeover):
+        total = 0
+        compressor = None
+        for data in frames:
+            if compressor is None or not context_takeover:
+                compressor = zlib.compressobj(wbits=-15)
+            total += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+        return total
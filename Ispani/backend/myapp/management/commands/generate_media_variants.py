@@ -0,0 +1,40 @@
+from concurrent.futures import wait
+
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from myapp.media.variants import variant_workers
+from myapp.models import EventMedia, MessageAttachment
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails and previews for images that have none."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Images handed to the worker pool at a time.")
+
+    def handle(self, *args, **options):
+        missing = Q(thumbnail='') | Q(thumbnail__isnull=True)
+        querysets = [
+            MessageAttachment.objects.filter(missing, attachment_type='IMAGE'),
+            EventMedia.objects.filter(missing, media_type='image'),
+        ]
+
+        submitted = 0
+        seen_hashes = set()
+        futures = []
+        for queryset in querysets:
+            for instance in queryset.exclude(file='').iterator():
+                # Rows sharing a file get its variants together.
+                if instance.content_hash:
+                    if instance.content_hash in seen_hashes:
+                        continue
+                    seen_hashes.add(instance.content_hash)
+                futures.append(variant_workers.submit(instance))
+                submitted += 1
+                if len(futures) >= options['batch_size']:
+                    wait(futures)
+                    futures = []
+        wait(futures)
+        self.stdout.write(f"Generated variants for {submitted} images.")
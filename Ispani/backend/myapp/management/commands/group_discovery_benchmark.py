@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection, transaction
+from django.core.management import BaseCommand
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from myapp.eager_loading import eager_load, serialize
+from myapp.models import CustomUser, Group, GroupHobby
+from myapp.search.tokens import tokenize
+from myapp.serializers import GroupSerializer
+from myapp.views import GroupDiscoveryView
+
+
+USERNAME_PREFIX = 'benchmark_'
+COURSES = ['Computer Science', 'Law', 'Medicine', 'Accounting', 'Engineering', 'Psychology', 'Economics', 'Music']
+HOBBIES = ['chess', 'football', 'music', 'hiking', 'gaming', 'reading', 'cooking', 'photography', 'dance',
+           'art', 'coding', 'netball', 'rugby', 'film', 'poetry', 'yoga', 'running', 'debate', 'drama', 'anime']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the previous full group listings with paginated group discovery "
+        "at increasing numbers of groups. Fixtures are created in a transaction "
+        "that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--admins', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help="Runs per paginated request; the median is reported.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory()
+        for group_count in options['groups']:
+            try:
+                with transaction.atomic():
+                    self.run(group_count, options)
+                    raise Rollback
+            except Rollback:
+                pass
+        self.stdout.write(
+            "ms is the median wall time of the view and JSON rendering; previous "
+            "is the unpaginated study_groups listing with nested admin profiles."
+        )
+
+    def run(self, group_count, options):
+        rng = random.Random(options['seed'])
+        self.user = self.create_fixtures(rng, group_count, options['admins'])
+        self.stdout.write(f"\n{group_count} groups\n")
+        self.stdout.write(f"{'request':<42}{'ms':>10}{'queries':>9}{'KiB':>10}{'rows':>7}")
+
+        self.report('previous study_groups', *self.measure(self.previous_study_groups, 1))
+        cases = [
+            ('discover', {}),
+            ('discover, page 50', {'page': 50}),
+            ('discover sort=popular', {'sort': 'popular'}),
+            ('discover group_type=study', {'group_type': 'study'}),
+            ('discover group_type=study sort=popular', {'group_type': 'study', 'sort': 'popular'}),
+            ('discover course+year_of_study', {'course': COURSES[0], 'year_of_study': 2}),
+            ('discover hobby=chess,music', {'hobby': 'chess,music'}),
+            ('discover hobby=chess,music sort=popular', {'hobby': 'chess,music', 'sort': 'popular'}),
+        ]
+        for name, params in cases:
+            params = dict(params)
+            page = params.pop('page', 1)
+            if page > 1:
+                params['cursor'] = self.cursor_at(params, page)
+            self.report(name, *self.measure(lambda: self.discover(params), options['repeat']))
+
+    def create_fixtures(self, rng, group_count, admin_count):
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'{USERNAME_PREFIX}{n}', email=f'{USERNAME_PREFIX}{n}@example.com')
+            for n in range(admin_count)
+        ])
+        admin_ids = list(CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+
+        groups = []
+        for n in range(group_count):
+            study = rng.random() < 0.5
+            groups.append(Group(
+                name=f'{USERNAME_PREFIX}group_{n}',
+                description='A group for students who like to meet up. ' * rng.randint(1, 4),
+                group_type='study' if study else 'hobby',
+                course=rng.choice(COURSES) if study else '',
+                year_of_study=rng.randint(1, 4) if study else None,
+                hobbies='' if study else ', '.join(rng.sample(HOBBIES, rng.randint(1, 3))),
+                admin_id=rng.choice(admin_ids),
+                invite_link=f'{USERNAME_PREFIX}{n}',
+                member_count=int(rng.paretovariate(1.2)),
+            ))
+        # bulk_create sends no post_save, so neither the search index nor the hobby rows are written.
+        groups = Group.objects.bulk_create(groups, batch_size=1000)
+        GroupHobby.objects.bulk_create(
+            (GroupHobby(group=group, token=token) for group in groups for token in set(tokenize(group.hobbies))),
+            batch_size=1000
+        )
+        with connection.cursor() as cursor:
+            if connection.vendor in ('sqlite', 'postgresql'):
+                cursor.execute('ANALYZE')
+        return CustomUser.objects.get(id=admin_ids[0])
+
+    def previous_study_groups(self):
+        groups = eager_load(Group.objects.filter(group_type='study'), GroupSerializer)
+        return serialize(GroupSerializer(groups, many=True))
+
+    def discover(self, params):
+        request = self.factory.get('/groups/groups/discover/', params)
+        force_authenticate(request, user=self.user)
+        response = GroupDiscoveryView.as_view()(request)
+        if response.status_code != 200:
+            raise RuntimeError(f"Discovery returned {response.status_code}: {response.data}")
+        return response.data
+
+    def cursor_at(self, params, page):
+        data = self.discover(params)
+        for _ in range(page - 2):
+            data = self.discover({**params, 'cursor': self.next_cursor(data)})
+        return self.next_cursor(data)
+
+    def next_cursor(self, data):
+        return parse_qs(urlparse(data['next']).query)['cursor'][0]
+
+    def measure(self, call, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                data = call()
+                body = JSONRenderer().render(data)
+                timings.append(time.perf_counter() - started)
+        rows = len(data['results']) if isinstance(data, dict) else len(data)
+        return statistics.median(timings) * 1000, len(queries.captured_queries), len(body), rows
+
+    def report(self, name, ms, queries, size, rows):
+        self.stdout.write(f"{name:<42}{ms:>10.1f}{queries:>9}{size / 1024:>10.1f}{rows:>7}")
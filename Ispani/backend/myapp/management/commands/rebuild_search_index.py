@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand, CommandError
+
+from myapp.search import get_backend
+from myapp.search.documents import DOC_TYPES
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for events, groups and students."
+
+    def add_arguments(self, parser):
+        parser.add_argument('doc_types', nargs='*', help="Any of: %s (default: all)" % ', '.join(DOC_TYPES))
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        doc_types = options['doc_types'] or list(DOC_TYPES)
+        unknown = set(doc_types) - set(DOC_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown document types: {', '.join(sorted(unknown))}")
+
+        backend = get_backend()
+        for doc_type in doc_types:
+            count = backend.rebuild(doc_type, batch_size=options['batch_size'])
+            self.stdout.write(f"Indexed {count} {doc_type} documents.")
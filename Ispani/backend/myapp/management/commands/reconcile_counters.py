@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from myapp.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recount group members, event and group session participants, and repair counters that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drifted counters without repairing them.")
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters(dry_run=options['dry_run'])
+        verb = "Would repair" if options['dry_run'] else "Repaired"
+        for counter, count in drifted.items():
+            self.stdout.write(f"{verb} {count} rows of {counter}.")
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from myapp.models import CustomUser
+from myapp.recommendations import refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = "Precompute cached event recommendations for active users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only refresh these user ids (repeatable).")
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.filter(is_active=True)
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        count = 0
+        for user in users.iterator():
+            refresh_recommendations(user)
+            count += 1
+        self.stdout.write(f"Refreshed recommendations for {count} users.")
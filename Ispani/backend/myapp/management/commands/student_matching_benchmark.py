@@ -0,0 +1,149 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from myapp.matching import StudentIndex, clear_student_index, invalidate_similar_students, profile_features
+from myapp.models import CustomUser, StudentProfile
+from myapp.views import FindStudentsView
+
+
+USERNAME_PREFIX = 'benchmark_'
+COURSES = ['Computer Science', 'Computer Engineering', 'Law', 'Medicine', 'Accounting', 'Civil Engineering',
+           'Psychology', 'Economics', 'Music', 'Information Systems', 'Actuarial Science', 'Education']
+HOBBIES = ['chess', 'football', 'music', 'hiking', 'gaming', 'reading', 'cooking', 'photography', 'dance',
+           'art', 'coding', 'netball', 'rugby', 'film', 'poetry', 'yoga', 'running', 'debate', 'drama', 'anime',
+           'swimming', 'cricket', 'singing', 'writing', 'volunteering', 'fashion', 'gardening', 'cycling']
+INSTITUTIONS = ['UCT', 'Wits', 'Stellenbosch', 'UJ', 'UP', 'UKZN', 'Rhodes', 'NMU']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time building the similar-student matrix, applying changed profiles to "
+        "it, ranking against it and serving a page of matches. Fixtures are "
+        "created in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--queries', type=int, default=200,
+                            help="Students ranked to time queries.")
+        parser.add_argument('--changes', type=int, default=500,
+                            help="Profiles changed before an incremental refresh.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        for student_count in options['students']:
+            try:
+                with transaction.atomic():
+                    self.run(student_count, options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, student_count, options):
+        rng = random.Random(options['seed'])
+        self.create_fixtures(rng, student_count)
+        self.stdout.write(f"\n{student_count} students")
+
+        started = time.perf_counter()
+        index = StudentIndex.build()
+        build = time.perf_counter() - started
+        matrix_bytes = sum(array.nbytes for array in (index.matrix.data, index.matrix.indices, index.matrix.indptr))
+        self.stdout.write(
+            f"build: {build:.2f} s, {len(index.vocabulary)} features, "
+            f"{index.matrix.nnz} non-zeros, {matrix_bytes / 1024 / 1024:.1f} MiB"
+        )
+
+        profiles = list(
+            StudentProfile.objects.filter(user__username__startswith=USERNAME_PREFIX)
+            .values_list('user_id', 'course', 'year_of_study', 'hobbies', 'institution')
+        )
+        samples = rng.sample(profiles, min(options['queries'], len(profiles)))
+        timings = []
+        for user_id, *profile in samples:
+            started = time.perf_counter()
+            index.rank(profile_features(*profile), exclude={user_id}, limit=200)
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(f"rank top 200: {self.percentiles(timings)}")
+
+        changed = rng.sample(profiles, min(options['changes'], len(profiles)))
+        for user_id, *_ in changed:
+            StudentProfile.objects.filter(user_id=user_id).update(
+                hobbies=', '.join(rng.sample(HOBBIES, 3)), updated_at=timezone.now()
+            )
+        started = time.perf_counter()
+        index.refresh(force=True)
+        self.stdout.write(
+            f"refresh with {len(changed)} changed profiles: {(time.perf_counter() - started) * 1000:.1f} ms "
+            f"({index.delta.shape[0]} delta rows)"
+        )
+        timings = []
+        for user_id, *profile in samples:
+            started = time.perf_counter()
+            index.rank(profile_features(*profile), exclude={user_id}, limit=200)
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(f"rank top 200 with delta: {self.percentiles(timings)}")
+
+        factory = APIRequestFactory()
+        user = CustomUser.objects.get(id=samples[0][0])
+        cases = [
+            ('first page, building the matrix', {}),
+            ('first page, ranked', {}),
+            ('next page, cached', {'offset': 20}),
+        ]
+        clear_student_index()
+        for name, params in cases:
+            if not params:
+                invalidate_similar_students(user.id)
+            request = factory.get('/groups/find-students/', params)
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = FindStudentsView.as_view()(request)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"view {name}: {elapsed * 1000:.1f} ms, {len(queries.captured_queries)} queries, "
+                f"{len(response.data['results'])} rows"
+            )
+
+    def create_fixtures(self, rng, student_count):
+        CustomUser.objects.bulk_create(
+            [
+                CustomUser(username=f'{USERNAME_PREFIX}{n}', email=f'{USERNAME_PREFIX}{n}@example.com', role='student')
+                for n in range(student_count)
+            ],
+            batch_size=1000
+        )
+        user_ids = CustomUser.objects.filter(username__startswith=USERNAME_PREFIX).values_list('id', flat=True)
+        # bulk_create sends no post_save, so nothing is indexed or assigned to groups.
+        StudentProfile.objects.bulk_create(
+            (
+                StudentProfile(
+                    user_id=user_id,
+                    course=rng.choice(COURSES),
+                    year_of_study=rng.randint(1, 4),
+                    hobbies=', '.join(rng.sample(HOBBIES, rng.randint(1, 4))),
+                    institution=rng.choice(INSTITUTIONS),
+                )
+                for user_id in user_ids.iterator()
+            ),
+            batch_size=1000
+        )
+        # As if last edited long ago, so refreshes only see the profiles changed below.
+        StudentProfile.objects.filter(user_id__in=user_ids).update(updated_at=timezone.now() - timedelta(days=30))
+
+    def percentiles(self, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+        return f"median {statistics.median(timings) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
@@ -0,0 +1,132 @@
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from channels.layers import InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from channels.testing.websocket import WebsocketCommunicator
+from django.core.management import BaseCommand
+from django.utils.crypto import get_random_string
+
+from myapp.models import ChatRoom, CustomUser
+from myapp.routing import websocket_urlpatterns
+
+
+USERNAME_PREFIX = 'loadtest_'
+# tracemalloc slows everything down; don't mistake that for a hung socket.
+RECEIVE_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-connection memory of one socket per conversation "
+        "(ws/chat/<id>/) with one multiplexed socket per user (ws/user/). "
+        "Creates temporary users and rooms and deletes only those afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--conversations', type=int, default=5,
+                            help="Chat rooms every user is a member of.")
+        parser.add_argument('--memory-budget', type=int, default=512,
+                            help="Worker memory (MB) used to estimate capacity.")
+
+    def handle(self, *args, **options):
+        # Keep the test in-process and independent of Redis.
+        channel_layers.set('default', InMemoryChannelLayer(capacity=1000))
+
+        users, rooms = self.create_fixtures(options['users'], options['conversations'])
+        try:
+            results = asyncio.run(self.run(users, rooms))
+        finally:
+            ChatRoom.objects.filter(id__in=[room.id for room in rooms]).delete()
+            CustomUser.objects.filter(id__in=[user.id for user in users]).delete()
+
+        budget = options['memory_budget'] * 1024 * 1024
+        self.stdout.write(f"{len(users)} users x {len(rooms)} conversations\n")
+        self.stdout.write(f"{'mode':<18}{'sockets':>9}{'KiB/socket':>12}{'KiB/user':>10}{'connect s':>11}{'users/worker':>14}")
+        for mode, sockets, memory, elapsed in results:
+            per_socket = memory / sockets
+            per_user = memory / len(users)
+            self.stdout.write(
+                f"{mode:<18}{sockets:>9}{per_socket / 1024:>12.1f}{per_user / 1024:>10.1f}"
+                f"{elapsed:>11.2f}{int(budget / per_user):>14}"
+            )
+        self.stdout.write(
+            "Memory is Python heap growth measured with tracemalloc and includes "
+            "the test client's own queues for each socket."
+        )
+
+    def create_fixtures(self, user_count, conversation_count):
+        # A fresh prefix per run, so the cleanup can never match real accounts
+        # or another run's users.
+        prefix = f'{USERNAME_PREFIX}{get_random_string(8).lower()}_'
+        rooms = []
+        try:
+            CustomUser.objects.bulk_create([
+                CustomUser(username=f'{prefix}{n}', email=f'{prefix}{n}@example.com')
+                for n in range(user_count)
+            ])
+            users = list(CustomUser.objects.filter(username__startswith=prefix))
+            for n in range(conversation_count):
+                rooms.append(ChatRoom.objects.create(name=f'{prefix}room_{n}', chat_type='group'))
+            for room in rooms:
+                room.members.add(*users)
+        except BaseException:
+            ChatRoom.objects.filter(id__in=[room.id for room in rooms]).delete()
+            CustomUser.objects.filter(username__startswith=prefix).delete()
+            raise
+        return users, rooms
+
+    async def run(self, users, rooms):
+        application = URLRouter(websocket_urlpatterns)
+        results = []
+
+        async def per_conversation():
+            sockets = []
+            for user in users:
+                for room in rooms:
+                    sockets.append(await self.open(application, f'/ws/chat/{room.id}/', user))
+            return sockets
+
+        async def multiplexed():
+            sockets = []
+            for user in users:
+                socket = await self.open(application, '/ws/user/', user)
+                for room in rooms:
+                    await socket.send_json_to({'type': 'subscribe', 'stream': room.id, 'topic': 'room', 'id': room.id})
+                    await socket.receive_json_from(timeout=RECEIVE_TIMEOUT)
+                sockets.append(socket)
+            return sockets
+
+        for mode, connect in [('per-conversation', per_conversation), ('multiplexed', multiplexed)]:
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            sockets = await connect()
+            elapsed = time.perf_counter() - started
+            for socket in sockets:
+                await self.drain(socket)
+            gc.collect()
+            memory = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+            results.append((mode, len(sockets), memory, elapsed))
+
+            for socket in sockets:
+                await socket.disconnect()
+        return results
+
+    async def open(self, application, path, user):
+        socket = WebsocketCommunicator(application, path)
+        socket.scope['user'] = user
+        connected, _ = await socket.connect(timeout=RECEIVE_TIMEOUT)
+        if not connected:
+            raise RuntimeError(f"Could not connect to {path} as {user.username}")
+        return socket
+
+    async def drain(self, socket):
+        # Presence events queued for the client would otherwise count as socket memory.
+        while not await socket.receive_nothing(timeout=0):
+            await socket.receive_output(timeout=RECEIVE_TIMEOUT)
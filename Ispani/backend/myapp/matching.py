@@ -0,0 +1,227 @@
+"""
+Similar students.
+
+A student's profile becomes a sparse feature vector over a normalized
+vocabulary: the words of their course and hobbies, their institution and
+their year of study. Every student is one L2-normalised row of a CSR matrix
+kept per process, so scoring all of them against one student is a single
+sparse matrix-vector product (cosine similarity) and the top k come from a
+partial sort rather than a full one.
+
+Once built, the matrix is kept current incrementally. Profiles saved since
+the last refresh (by ``StudentProfile.updated_at``) get a new row in a small
+delta matrix and their old row is masked out; the delta is folded into the
+main matrix as it grows. The whole matrix is rebuilt every
+STUDENT_MATCHING_REBUILD_TTL seconds, which also drops students who left.
+Each user's ranked matches are cached and dropped when their own profile
+changes (see ``myapp.signals``).
+"""
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from scipy import sparse
+
+from .models import StudentProfile
+from .search.tokens import tokenize
+
+
+COURSE_WEIGHT = 2.0
+HOBBY_WEIGHT = 1.0
+INSTITUTION_WEIGHT = 1.0
+YEAR_WEIGHT = 0.5
+STOP_WORDS = frozenset({'a', 'an', 'and', 'for', 'in', 'of', 'the', 'to', 'with'})
+PROFILE_FIELDS = ('user_id', 'course', 'year_of_study', 'hobbies', 'institution', 'updated_at')
+# A profile saved in a transaction that commits after a refresh has an
+# updated_at before it; looking back this far picks it up on the next one.
+CHANGE_SLACK = timedelta(seconds=60)
+# Delta rows kept apart before they are folded into the main matrix.
+DELTA_LIMIT = 1000
+
+
+def profile_features(course, year_of_study, hobbies, institution):
+    """Feature weights of a student profile."""
+    features = {}
+    for word in tokenize(course):
+        if word not in STOP_WORDS:
+            features[f'course:{word}'] = COURSE_WEIGHT
+    for word in tokenize(hobbies):
+        if word not in STOP_WORDS:
+            features[f'hobby:{word}'] = HOBBY_WEIGHT
+    institution = ' '.join(tokenize(institution))
+    if institution:
+        features[f'institution:{institution}'] = INSTITUTION_WEIGHT
+    if year_of_study is not None:
+        features[f'year:{year_of_study}'] = YEAR_WEIGHT
+    return features
+
+
+def student_profiles():
+    return StudentProfile.objects.filter(user__role='student', user__is_active=True)
+
+
+class StudentIndex:
+    """Feature matrix of students, one L2-normalised row per profile."""
+
+    def __init__(self):
+        self.vocabulary = {}
+        # Per row: whose it is, the updated_at it was built from, and whether
+        # it is still that student's current row.
+        self.user_ids = []
+        self.updated = []
+        self.active = np.zeros(0, dtype=bool)
+        self.rows = {}
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.delta = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.built_at = self.refreshed_at = time.monotonic()
+        self.synced_at = None
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        index.synced_at = timezone.now()
+        profiles = student_profiles().order_by('user_id').values_list(*PROFILE_FIELDS)
+        index.matrix = index.add_rows(profiles.iterator(chunk_size=5000))
+        return index
+
+    def add_rows(self, profiles):
+        """Give each of ``profiles`` a new row; returns the rows as a CSR matrix."""
+        data, columns, indptr = [], [], [0]
+        for user_id, course, year_of_study, hobbies, institution, updated_at in profiles:
+            features = profile_features(course, year_of_study, hobbies, institution)
+            norm = np.sqrt(sum(weight * weight for weight in features.values())) or 1
+            for feature, weight in features.items():
+                columns.append(self.vocabulary.setdefault(feature, len(self.vocabulary)))
+                data.append(weight / norm)
+            indptr.append(len(columns))
+
+            previous = self.rows.get(user_id)
+            if previous is not None:
+                self.active[previous] = False
+            self.rows[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.updated.append(updated_at)
+
+        added = len(indptr) - 1
+        self.active = np.concatenate([self.active, np.ones(added, dtype=bool)])
+        return sparse.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(columns, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(added, len(self.vocabulary))
+        )
+
+    def is_expired(self):
+        return time.monotonic() - self.built_at > settings.STUDENT_MATCHING_REBUILD_TTL
+
+    def refresh(self, force=False):
+        """Apply the profiles saved since the last refresh."""
+        if not force and time.monotonic() - self.refreshed_at < settings.STUDENT_MATCHING_REFRESH_INTERVAL:
+            return
+        now = timezone.now()
+        changed = [
+            profile for profile in
+            student_profiles().filter(updated_at__gte=self.synced_at - CHANGE_SLACK).values_list(*PROFILE_FIELDS)
+            if self.updated_at(profile[0]) != profile[-1]
+        ]
+        self.synced_at = now
+        self.refreshed_at = time.monotonic()
+        if not changed:
+            return
+
+        added = self.add_rows(changed)
+        self.delta = sparse.vstack([self.widen(self.delta, len(self.vocabulary)), added], format='csr')
+        if self.delta.shape[0] > DELTA_LIMIT:
+            self.matrix = sparse.vstack([self.widen(self.matrix, len(self.vocabulary)), self.delta], format='csr')
+            self.delta = sparse.csr_matrix((0, len(self.vocabulary)), dtype=np.float32)
+
+    def updated_at(self, user_id):
+        row = self.rows.get(user_id)
+        return None if row is None else self.updated[row]
+
+    def widen(self, matrix, width):
+        if matrix.shape[1] < width:
+            matrix = matrix.copy()
+            matrix.resize((matrix.shape[0], width))
+        return matrix
+
+    def rank(self, features, exclude=(), limit=None):
+        """Return ``(user id, similarity)`` of the students most similar to ``features``, best first."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for feature, weight in features.items():
+            column = self.vocabulary.get(feature)
+            if column is not None:
+                vector[column] = weight
+        if not vector.any():
+            return []
+        # Divided by the full profile's norm, so features no one else has still count.
+        vector /= np.sqrt(sum(weight * weight for weight in features.values()))
+
+        scores = np.concatenate([
+            self.matrix @ vector[:self.matrix.shape[1]],
+            self.delta @ vector[:self.delta.shape[1]],
+        ])
+        scores[~self.active] = 0
+        for user_id in exclude:
+            row = self.rows.get(user_id)
+            if row is not None:
+                scores[row] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if limit and len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Best first; equal scores in row order, so the ranking is stable.
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self.user_ids[row], float(scores[row])) for row in candidates]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def rank_similar_students(features, exclude=(), limit=None):
+    global _index
+    with _index_lock:
+        if _index is None or _index.is_expired():
+            _index = StudentIndex.build()
+        else:
+            _index.refresh()
+        return _index.rank(features, exclude=exclude, limit=limit)
+
+
+def clear_student_index():
+    """Drop this process's matrix; the next ranking rebuilds it."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def similar_students_cache_key(user_id):
+    return f'similar_students:{user_id}'
+
+
+def refresh_similar_students(user):
+    """Recompute and cache the ``(user id, similarity)`` of ``user``'s best matches."""
+    profile = StudentProfile.objects.filter(user=user).values_list(
+        'course', 'year_of_study', 'hobbies', 'institution'
+    ).first()
+    matches = []
+    if profile is not None:
+        matches = rank_similar_students(
+            profile_features(*profile), exclude={user.id}, limit=settings.STUDENT_MATCHES_PER_USER
+        )
+    cache.set(similar_students_cache_key(user.id), matches, settings.STUDENT_MATCHES_CACHE_TTL)
+    return matches
+
+
+def get_similar_students(user):
+    matches = cache.get(similar_students_cache_key(user.id))
+    if matches is not None:
+        return matches
+    return refresh_similar_students(user)
+
+
+def invalidate_similar_students(*user_ids):
+    cache.delete_many([similar_students_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,4 @@
+"""
+Uploaded media: chunked uploads (``uploads``) and image variants generated
+in worker processes (``variants``, ``imaging``).
+"""
@@ -0,0 +1,49 @@
+"""
+Who may fetch a stored file.
+
+A file is served to a user when a media row they can see uses it: event
+media of a public event, of an event they take part in or that they
+uploaded, and attachments of messages in their chat rooms or sent by them.
+Content-addressed files and their variants are matched to rows by the
+content hash in their name, which is indexed; other files by the names
+stored on the rows.
+
+Only files used by public event media may be kept by shared caches; the
+rest are sent as private.
+"""
+from django.db.models import Q
+
+from ..membership import get_memberships
+from ..models import EventMedia, MessageAttachment
+from .storage import hash_from_name, hash_from_variant_name
+
+
+PUBLIC = 'public'
+PRIVATE = 'private'
+
+
+def rows_using(name):
+    """Condition matching the media rows whose file or variants are ``name``."""
+    content_hash = hash_from_name(name) or hash_from_variant_name(name)
+    if content_hash:
+        return Q(content_hash=content_hash)
+    return Q(file=name) | Q(thumbnail=name) | Q(preview=name)
+
+
+def media_access(user, name):
+    """
+    ``PUBLIC`` or ``PRIVATE`` when ``user`` may fetch the stored file
+    ``name``, None when no media row they can see uses it.
+    """
+    condition = rows_using(name)
+    event_media = EventMedia.objects.filter(condition)
+    if event_media.filter(event__is_public=True).exists():
+        return PUBLIC
+
+    memberships = get_memberships(user)
+    if event_media.filter(Q(event_id__in=memberships.events) | Q(uploaded_by=user)).exists():
+        return PRIVATE
+    attachments = MessageAttachment.objects.filter(condition)
+    if attachments.filter(Q(message__room_id__in=memberships.rooms) | Q(message__sender=user)).exists():
+        return PRIVATE
+    return None
@@ -0,0 +1,152 @@
+"""
+Reference counting and garbage collection of content-addressed blobs.
+
+Every MessageAttachment and EventMedia with a content hash holds one
+reference to its ``Blob``: taken just before the row is inserted, and so
+before its file is stored or reused, and released when it is deleted (see
+the receivers in ``myapp.signals``). Rows are not expected to change their
+file afterwards.
+
+``collect_garbage`` deletes blobs that have had no references for
+``MEDIA_GC_GRACE`` seconds along with their variants, files in
+content-addressed storage no blob accounts for, and chunked uploads
+abandoned for ``UPLOAD_EXPIRY`` seconds. Each blob is deleted in its own
+transaction that locks its row and checks again that it is unreferenced
+and its files were not reused within the grace period before deleting
+them. Taking a reference updates the same row, so it waits for that
+transaction; if the blob is gone by then, a new row is created and the
+file is stored again, since storage only reuses files that exist.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from ..models import Blob, Upload
+from .storage import BLOB_DIR, VARIANT_DIR, blob_name, blob_storage, file_extension, hash_from_name
+from .uploads import discard_upload
+
+
+def pending_hash(field_file):
+    """
+    SHA-256 of content assigned to a file field but not stored yet, from
+    the upload handlers if they hashed it (see ``storage``).
+    """
+    if field_file._committed:
+        return None
+    content = field_file.file
+    content_hash = getattr(content, 'content_hash', None)
+    if not content_hash:
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk.encode() if isinstance(chunk, str) else chunk)
+        # Kept on the content, so storage does not hash it again.
+        content_hash = content.content_hash = digest.hexdigest()
+    return content_hash
+
+
+def acquire_blob(instance):
+    """
+    Count a media row about to be inserted as a reference to its content's
+    blob. Sets the row's ``content_hash``.
+    """
+    content_hash = instance.content_hash or hash_from_name(instance.file.name) or pending_hash(instance.file)
+    if not content_hash:
+        return
+    instance.content_hash = content_hash
+
+    referenced = Blob.objects.filter(pk=content_hash).update(refcount=F('refcount') + 1, unreferenced_at=None)
+    if referenced:
+        return
+    try:
+        with transaction.atomic():
+            Blob.objects.create(
+                sha256=content_hash,
+                name=blob_name(content_hash, file_extension(instance.file.name)),
+                size=instance.file.size,
+                refcount=1
+            )
+    except IntegrityError:
+        # Created concurrently by another row with the same content.
+        Blob.objects.filter(pk=content_hash).update(refcount=F('refcount') + 1, unreferenced_at=None)
+
+
+def release_blob(instance):
+    """Drop a deleted media row's reference to its blob."""
+    if not instance.content_hash:
+        return
+    Blob.objects.filter(pk=instance.content_hash, refcount__gt=0).update(
+        refcount=F('refcount') - 1,
+        unreferenced_at=Case(When(refcount=1, then=Value(timezone.now())), default=F('unreferenced_at'))
+    )
+
+
+def blob_files(content_hash):
+    """Storage names of a blob's files and variants."""
+    names = []
+    for directory in (BLOB_DIR, VARIANT_DIR):
+        subdirectory = f'{directory}/{content_hash[:2]}/{content_hash[2:4]}'
+        if not blob_storage.exists(subdirectory):
+            continue
+        _, files = blob_storage.listdir(subdirectory)
+        names += [f'{subdirectory}/{name}' for name in files if name.startswith(content_hash)]
+    return names
+
+
+def is_recent(name, cutoff):
+    try:
+        return blob_storage.get_modified_time(name) >= cutoff
+    except FileNotFoundError:
+        return False
+
+
+def collect_garbage(dry_run=False):
+    """Delete unused blobs, orphaned files and abandoned uploads; returns counts."""
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.MEDIA_GC_GRACE)
+    stats = {'blobs': 0, 'files': 0, 'bytes': 0, 'uploads': 0}
+
+    def delete_file(name):
+        stats['files'] += 1
+        stats['bytes'] += blob_storage.size(name)
+        if not dry_run:
+            blob_storage.delete(name)
+
+    unused = Blob.objects.filter(refcount=0, unreferenced_at__lt=cutoff)
+    for content_hash in list(unused.values_list('sha256', flat=True)):
+        with transaction.atomic():
+            # Referenced again meanwhile, unless it is still found.
+            blob = unused.select_for_update().filter(pk=content_hash).first()
+            if blob is None:
+                continue
+            names = set(blob_files(blob.sha256))
+            if blob_storage.exists(blob.name):
+                names.add(blob.name)
+            if any(is_recent(name, cutoff) for name in names):
+                continue
+            stats['blobs'] += 1
+            if not dry_run:
+                blob.delete()
+            for name in names:
+                delete_file(name)
+
+    # Files no blob accounts for: interrupted saves, rows that failed to save.
+    known = set(Blob.objects.values_list('sha256', flat=True))
+    for directory in (BLOB_DIR, VARIANT_DIR):
+        root = blob_storage.path(directory)
+        for dirpath, _, files in os.walk(root):
+            for filename in files:
+                name = os.path.relpath(os.path.join(dirpath, filename), blob_storage.location).replace(os.sep, '/')
+                if filename[:64] not in known and not is_recent(name, cutoff):
+                    delete_file(name)
+
+    for upload in Upload.objects.filter(created_at__lt=now - timedelta(seconds=settings.UPLOAD_EXPIRY)):
+        stats['uploads'] += 1
+        if not dry_run:
+            discard_upload(upload)
+    return stats
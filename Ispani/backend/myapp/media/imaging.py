@@ -0,0 +1,53 @@
+"""
+Image downscaling, run in the worker processes of ``variants``.
+
+Nothing here imports Django, so the module loads quickly in freshly
+spawned workers and never touches the database from them.
+"""
+import io
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+def flatten(image):
+    """``image`` in a mode JPEG can store, with transparency over white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode not in ('RGB', 'L'):
+        return image.convert('RGB')
+    return image
+
+
+def render_variants(source, sizes, quality=80):
+    """
+    Downscale the image at ``source`` (a path or bytes) to fit each of
+    ``sizes`` ({name: longest side in px}) and return {name: JPEG bytes}.
+    Images are never upscaled. Returns {} when ``source`` is not an image.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        image = Image.open(source)
+    except (UnidentifiedImageError, OSError):
+        return {}
+
+    with image:
+        largest = max(sizes.values())
+        # Lets the JPEG decoder skip detail no variant needs.
+        image.draft('RGB', (largest, largest))
+        try:
+            image = flatten(ImageOps.exif_transpose(image))
+        except OSError:
+            return {}
+
+        variants = {}
+        # Largest first, so each variant is scaled from the previous one.
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+            variants[name] = buffer.getvalue()
+    return variants
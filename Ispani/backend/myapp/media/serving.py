@@ -0,0 +1,161 @@
+"""
+Serving stored media: event media, attachments and their variants.
+
+Responses carry a strong ETag and Last-Modified, so a client viewing a file
+again revalidates it with ``If-None-Match`` and gets an empty 304. Files in
+content-addressed storage never change, so their ETag is their SHA-256 and
+they may be cached indefinitely. Only public files may be cached by shared
+caches; callers decide which files are public (see ``access``).
+
+A single ``Range`` is answered with 206 Partial Content, letting video
+players seek without downloading the whole clip; other ranges get the whole
+file. The body is the open file itself, which WSGI servers send with
+``sendfile`` when it runs to the end of the file. With ``MEDIA_ACCEL_REDIRECT``
+set to an internal nginx location that aliases ``MEDIA_ROOT``, the body is
+left to the proxy via ``X-Accel-Redirect`` instead.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .storage import blob_storage, hash_from_name
+
+
+IMMUTABLE_CACHE_CONTROL = 'max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class ByteRange:
+    """Reads ``length`` bytes of ``file`` from where it is positioned."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(name, stats):
+    content_hash = hash_from_name(name)
+    if content_hash:
+        return f'"{content_hash}"'
+    return f'"{stats.st_mtime_ns:x}-{stats.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    The inclusive ``(start, end)`` of a single byte range, or None to send
+    the whole file. Raises RangeNotSatisfiable when nothing of the file is
+    in the range.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # Malformed and multi-part ranges are ignored.
+        return None
+    first, last = match.groups()
+    if not first:
+        # The last N bytes.
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    if start > end:
+        return None
+    return start, end
+
+
+def requested_range(request, etag, size):
+    header = request.headers.get('Range')
+    if not header or request.method not in ('GET', 'HEAD'):
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        # The client's copy is outdated (or only dated); send the current file.
+        return None
+    return parse_range(header, size)
+
+
+def serve_media(request, name, public=False):
+    """
+    Respond with the stored file ``name``, honouring conditional and range
+    requests. Unless ``public``, shared caches are told not to store it.
+    """
+    try:
+        path = blob_storage.path(name)
+        stats = os.stat(path)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404("No such file")
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404("No such file")
+
+    etag = file_etag(name, stats)
+    last_modified = int(stats.st_mtime)
+    cache_control = IMMUTABLE_CACHE_CONTROL if hash_from_name(name) else REVALIDATE_CACHE_CONTROL
+    cache_control = f"{'public' if public else 'private'}, {cache_control}"
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = accel_redirect_response(name)
+        else:
+            try:
+                response = file_response(request, path, etag, stats.st_size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stats.st_size}'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_response(request, path, etag, size):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    byte_range = requested_range(request, etag, size)
+    file = open(path, 'rb')
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type)
+
+    start, end = byte_range
+    file.seek(start)
+    if end == size - 1:
+        # Still a plain file to the end, so it can be sent with sendfile.
+        response = FileResponse(file, status=206, content_type=content_type)
+    else:
+        response = FileResponse(ByteRange(file, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def accel_redirect_response(name):
+    response = HttpResponse()
+    # Let nginx pick the Content-Type from the file it serves.
+    del response['Content-Type']
+    response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT + quote(name)
+    return response
@@ -0,0 +1,140 @@
+"""
+Content-addressed storage for event media and message attachments.
+
+Files are stored once per content, under ``blobs/<h[:2]>/<h[2:4]>/<h><ext>``
+where ``h`` is their SHA-256, so the same poster shared into many groups
+takes the disk space of one. Saving content that is already stored only
+touches the existing file. Which rows use a blob is counted in ``Blob``
+(see ``blobs``); ``manage.py collect_media_garbage`` deletes the ones
+nothing uses any more.
+
+The hash is computed while the content streams in: the upload handlers
+below hash multipart uploads chunk by chunk as Django receives them, and
+``uploads`` hashes chunked uploads as they are written. Content that
+arrives hashed is moved into place without being read again.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import PurePosixPath
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_DIR = 'blobs'
+VARIANT_DIR = 'variants'
+BLOB_NAME_RE = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(\.\w+)?$')
+VARIANT_NAME_RE = re.compile(rf'^{VARIANT_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})_\w+\.jpg$')
+
+
+def blob_name(content_hash, extension=''):
+    return f'{BLOB_DIR}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}'
+
+
+def variant_name(content_hash, variant):
+    return f'{VARIANT_DIR}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}_{variant}.jpg'
+
+
+def hash_from_name(name):
+    """The content hash in a blob name, or None for files stored elsewhere."""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group(1) if match else None
+
+
+def hash_from_variant_name(name):
+    """The content hash in a variant name, or None for files stored elsewhere."""
+    match = VARIANT_NAME_RE.match(name or '')
+    return match.group(1) if match else None
+
+
+def file_extension(name):
+    suffix = PurePosixPath(name or '').suffix.lower()
+    return suffix if re.fullmatch(r'\.\w{1,10}', suffix) else ''
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the content's address in _save.
+        return name
+
+    def _save(self, name, content):
+        extension = file_extension(name)
+        content_hash = getattr(content, 'content_hash', None)
+        if content_hash:
+            if self.exists(blob_name(content_hash, extension)):
+                return self.reuse(blob_name(content_hash, extension))
+            if hasattr(content, 'temporary_file_path'):
+                return self.store_path(content.temporary_file_path(), content_hash, extension)
+
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                temp.write(chunk)
+        return self.store_path(temp.name, digest.hexdigest(), extension)
+
+    def store_path(self, path, content_hash, extension=''):
+        """
+        Move the local file at ``path``, whose SHA-256 is ``content_hash``,
+        into place and return its name. When the content is already stored
+        the file is removed instead.
+        """
+        name = blob_name(content_hash, extension)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.remove(path)
+            return self.reuse(name)
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def reuse(self, name):
+        # A fresh mtime keeps the garbage collector off a blob being reused.
+        os.utime(self.path(name))
+        return name
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    return blob_storage
+
+
+class HashingUploadHandlerMixin:
+    """Hashes an uploaded file as its chunks arrive."""
+
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.content_hash = self.digest.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,194 @@
+"""
+Chunked, resumable uploads.
+
+A client creates an ``Upload`` with the file's name and size, then PUTs the
+content in chunks of at most ``UPLOAD_CHUNK_SIZE`` bytes, each with the
+offset it starts at in an ``Upload-Offset`` header. After a dropped
+connection it fetches the upload and continues from ``received``. Chunks
+are written to a partial file in ``UPLOAD_DIR`` and hashed as they are
+written, as long as they keep arriving at the same process; otherwise the
+file is hashed once the last chunk is in.
+
+``store_upload`` turns a completed upload into a ``MessageAttachment`` or
+``EventMedia`` whose file field moves the partial file into
+content-addressed storage (see ``storage``). If the content is already
+stored, the upload is dropped and the new row shares the stored file and
+its variants.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Upload
+from .variants import schedule_variants
+
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """The request does not fit the state of the upload."""
+
+
+class OffsetMismatch(UploadError):
+    """A chunk does not start where the upload stopped."""
+
+
+class RunningHashes:
+    """SHA-256 state of uploads in progress, by upload id and offset reached."""
+    max_size = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hashes = OrderedDict()
+
+    def take(self, upload_id, offset):
+        with self.lock:
+            received, digest = self.hashes.pop(upload_id, (None, None))
+        if offset == 0:
+            return hashlib.sha256()
+        return digest if received == offset else None
+
+    def put(self, upload_id, received, digest):
+        with self.lock:
+            self.hashes[upload_id] = (received, digest)
+            while len(self.hashes) > self.max_size:
+                self.hashes.popitem(last=False)
+
+    def discard(self, upload_id):
+        with self.lock:
+            self.hashes.pop(upload_id, None)
+
+
+running_hashes = RunningHashes()
+
+
+def partial_path(upload):
+    return Path(settings.UPLOAD_DIR) / f'{upload.id}.part'
+
+
+def media_kind(content_type):
+    """'image', 'video', 'audio' or 'document' for a MIME type."""
+    kind = (content_type or '').split('/')[0]
+    return kind if kind in ('image', 'video', 'audio') else 'document'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_chunk(user, upload_id, offset, stream, length):
+    """
+    Write ``length`` bytes from ``stream`` at ``offset`` of ``user``'s upload
+    and return the updated upload. Raises Upload.DoesNotExist, or
+    UploadError when the chunk does not fit.
+    """
+    if length > settings.UPLOAD_CHUNK_SIZE:
+        raise UploadError(f"Chunks may not exceed {settings.UPLOAD_CHUNK_SIZE} bytes.")
+
+    with transaction.atomic():
+        upload = Upload.objects.select_for_update().get(pk=upload_id, user=user)
+        if upload.is_complete:
+            raise UploadError("The upload is already complete.")
+        if offset != upload.received:
+            raise OffsetMismatch(f"Expected a chunk at offset {upload.received}.")
+        if offset + length > upload.size:
+            raise UploadError("The chunk goes past the declared size.")
+
+        path = partial_path(upload)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        digest = running_hashes.take(upload.pk, offset)
+        written = 0
+        with open(path, 'r+b' if path.exists() else 'wb') as file:
+            # Anything after the offset is left over from an interrupted chunk.
+            file.seek(offset)
+            file.truncate()
+            while written < length:
+                block = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                if not block:
+                    break
+                file.write(block)
+                if digest is not None:
+                    digest.update(block)
+                written += len(block)
+
+        upload.received = offset + written
+        update_fields = ['received']
+        if upload.received == upload.size:
+            upload.content_hash = digest.hexdigest() if digest is not None else file_hash(path)
+            upload.completed_at = timezone.now()
+            update_fields += ['content_hash', 'completed_at']
+        elif digest is not None:
+            running_hashes.put(upload.pk, upload.received, digest)
+        upload.save(update_fields=update_fields)
+    return upload
+
+
+def get_completed_uploads(user, upload_ids):
+    """``user``'s completed uploads with ``upload_ids``, in that order."""
+    upload_ids = [str(upload_id) for upload_id in upload_ids]
+    try:
+        uploads = Upload.objects.filter(user=user).in_bulk(upload_ids)
+    except ValidationError:
+        raise UploadError("Invalid upload id.")
+    uploads = {str(pk): upload for pk, upload in uploads.items()}
+
+    result = []
+    for upload_id in upload_ids:
+        upload = uploads.get(upload_id)
+        if upload is None:
+            raise UploadError(f"Unknown upload {upload_id}.")
+        if not upload.is_complete:
+            raise UploadError(f"Upload {upload_id} is not complete.")
+        result.append(upload)
+    return result
+
+
+class PartialFile(File):
+    """The hashed partial file of a completed upload, moved into storage rather than copied."""
+
+    def __init__(self, upload):
+        super().__init__(open(partial_path(upload), 'rb'), name=upload.filename)
+        self.content_hash = upload.content_hash
+        self.path = partial_path(upload)
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def store_upload(upload, instance):
+    """
+    Save ``instance`` (a MessageAttachment or EventMedia) with the content
+    of a completed ``upload`` and discard the upload. Images get the stored
+    variants of their content, or are queued for variant generation.
+    """
+    instance.content_hash = upload.content_hash
+    with PartialFile(upload) as content, transaction.atomic():
+        instance.file = content
+        instance.save()
+    discard_upload(upload)
+
+    if media_kind(upload.content_type) == 'image':
+        schedule_variants(instance)
+    return instance
+
+
+def discard_upload(upload):
+    running_hashes.discard(upload.pk)
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
@@ -0,0 +1,148 @@
+"""
+Background generation of image variants.
+
+Uploaded images get a ``thumbnail`` (``MEDIA_THUMBNAIL_SIZE`` px on the
+longest side) for chat lists and galleries and a ``preview``
+(``MEDIA_PREVIEW_SIZE``) for viewing on a phone, both JPEG. Decoding and
+resizing run in a pool of ``MEDIA_VARIANT_WORKERS`` spawned processes, so
+they neither hold the serving process's GIL nor delay the upload response;
+the results are saved to storage and written to the row from the pool's
+callback thread. With ``MEDIA_VARIANT_WORKERS = 0`` variants are rendered
+inline instead.
+
+Variants of content-addressed files are stored once per content (see
+``storage.variant_name``) and shared by every row using that content.
+``manage.py generate_media_variants`` fills in variants that are missing.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from ..models import EventMedia, MessageAttachment
+from .imaging import render_variants
+from .storage import variant_name
+
+
+logger = logging.getLogger(__name__)
+
+MEDIA_MODELS = (MessageAttachment, EventMedia)
+VARIANT_FIELDS = ('thumbnail', 'preview')
+
+
+def variant_sizes():
+    return {'thumbnail': settings.MEDIA_THUMBNAIL_SIZE, 'preview': settings.MEDIA_PREVIEW_SIZE}
+
+
+def attach_stored_variants(instance):
+    """
+    Point a content-addressed media row at the variants already stored for
+    its content. Returns True when every variant exists.
+    """
+    found = True
+    for name in VARIANT_FIELDS:
+        stored = variant_name(instance.content_hash, name)
+        if default_storage.exists(stored):
+            getattr(instance, name).name = stored
+        else:
+            found = False
+    return found
+
+
+def schedule_variants(instance):
+    """
+    Give a saved image row the stored variants of its content, or render
+    them once the transaction commits.
+    """
+    if instance.content_hash and attach_stored_variants(instance):
+        type(instance).objects.filter(pk=instance.pk).update(
+            **{name: getattr(instance, name).name for name in VARIANT_FIELDS}
+        )
+    else:
+        transaction.on_commit(lambda: variant_workers.submit(instance))
+
+
+def save_variants(model, pk, variants):
+    """Store rendered ``variants`` of a media row and point it at them."""
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    if not instance.content_hash:
+        stem = Path(instance.file.name).stem
+        for name, data in variants.items():
+            getattr(instance, name).save(f'{stem}.jpg', ContentFile(data), save=False)
+        model.objects.filter(pk=pk).update(**{name: getattr(instance, name).name for name in variants})
+        return
+
+    # Variants of stored content are shared by every row using it.
+    names = {}
+    for name, data in variants.items():
+        names[name] = variant_name(instance.content_hash, name)
+        if not default_storage.exists(names[name]):
+            names[name] = default_storage.save(names[name], ContentFile(data))
+    for media_model in MEDIA_MODELS:
+        media_model.objects.filter(content_hash=instance.content_hash).update(**names)
+
+
+class VariantWorkers:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # Forking a threaded server process is unsafe; spawn clean workers.
+                self.executor = ProcessPoolExecutor(
+                    max_workers=settings.MEDIA_VARIANT_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self.executor
+
+    def submit(self, instance):
+        """Render the variants of a MessageAttachment or EventMedia; returns a Future."""
+        try:
+            source = instance.file.path
+        except NotImplementedError:
+            # Storage without local paths: hand the worker the content.
+            with instance.file.open('rb') as file:
+                source = file.read()
+
+        if settings.MEDIA_VARIANT_WORKERS:
+            future = self.get_executor().submit(render_variants, source, variant_sizes())
+        else:
+            future = Future()
+            try:
+                future.set_result(render_variants(source, variant_sizes()))
+            except Exception as exc:
+                future.set_exception(exc)
+        future.add_done_callback(partial(self.finish, type(instance), instance.pk))
+        return future
+
+    def finish(self, model, pk, future):
+        try:
+            variants = future.result()
+            if variants:
+                save_variants(model, pk, variants)
+        except BrokenProcessPool:
+            logger.exception("Variant worker died on %s %s.", model.__name__, pk)
+            # A new pool is started by the next submit.
+            with self.lock:
+                self.executor = None
+        except Exception:
+            logger.exception("Generating variants of %s %s failed.", model.__name__, pk)
+        finally:
+            if settings.MEDIA_VARIANT_WORKERS:
+                close_old_connections()
+
+
+variant_workers = VariantWorkers()
@@ -0,0 +1,206 @@
+"""
+Group membership, and what each user belongs to.
+
+``GroupMembership`` is the one record of who is in a group and with which
+role; ``Group.members`` goes through it. Joining writes it with one bulk
+insert however many users or groups are involved (``add_members``), and
+recounts ``Group.member_count`` for the groups it touched.
+
+Permission checks read a user's ``Memberships``: their groups with roles,
+chat rooms and events, cached per user (``MEMBERSHIP_CACHE_TTL``) and
+dropped whenever one of them changes (see ``myapp.signals``).
+``get_memberships`` reads the cache once per user object, i.e. once per
+request, so a check is a set lookup rather than a query. The user's sockets
+are sent a ``memberships_changed`` event when the entry is dropped, so they
+reload it too (see ``myapp.consumers``).
+
+Students are auto-assigned to the groups of their course and year of study.
+Matching goes through the ``(course, year_of_study)`` index on ``Group``,
+one query per batch of students (``assign_students``). Saving a student
+profile queues its user on ``assignment_queue``; a background thread assigns
+whatever has queued up in one batch, so signup does not wait for it. Students
+are never removed from groups automatically. ``manage.py assign_study_groups``
+assigns existing students in batches.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from .counters import counted
+from .models import ChatRoom, EventParticipant, Group, GroupMembership, StudentProfile
+from .realtime.delivery import notifications
+
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = 1000
+
+
+def add_memberships(pairs, role='MEMBER'):
+    """Make each ``(group id, user id)`` in ``pairs`` a membership; existing ones are kept."""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    existing = set(
+        GroupMembership.objects.filter(
+            group_id__in={group_id for group_id, _ in pairs}, user_id__in={user_id for _, user_id in pairs}
+        ).values_list('group_id', 'user_id')
+    )
+    pairs -= existing
+    if not pairs:
+        return
+    with transaction.atomic():
+        GroupMembership.objects.bulk_create(
+            [GroupMembership(group_id=group_id, user_id=user_id, role=role) for group_id, user_id in pairs],
+            batch_size=BULK_BATCH_SIZE, ignore_conflicts=True
+        )
+        # Recounted rather than incremented: ignore_conflicts skips the rows a
+        # concurrent join inserted first, and bulk_create cannot say which.
+        Group.objects.filter(pk__in={group_id for group_id, _ in pairs}).update(
+            member_count=counted(GroupMembership, 'group')
+        )
+    # bulk_create sends no post_save.
+    invalidate_memberships(*{user_id for _, user_id in pairs})
+
+
+def add_members(group, user_ids, role='MEMBER'):
+    add_memberships(((group.id, user_id) for user_id in user_ids), role=role)
+
+
+class Memberships:
+    """The groups (id -> role), chat rooms and events (id -> role) of a user."""
+
+    def __init__(self, groups, rooms, events):
+        self.groups = groups
+        self.rooms = rooms
+        self.events = events
+
+    def in_group(self, group_id):
+        return group_id in self.groups
+
+    def in_room(self, room_id):
+        return room_id in self.rooms
+
+    def in_event(self, event_id):
+        return event_id in self.events
+
+
+def memberships_cache_key(user_id):
+    return f'memberships:{user_id}'
+
+
+def load_memberships(user_id):
+    key = memberships_cache_key(user_id)
+    memberships = cache.get(key)
+    if memberships is None:
+        memberships = Memberships(
+            groups=dict(GroupMembership.objects.filter(user_id=user_id).values_list('group_id', 'role')),
+            rooms=frozenset(
+                ChatRoom.members.through.objects.filter(customuser_id=user_id).values_list('chatroom_id', flat=True)
+            ),
+            events=dict(EventParticipant.objects.filter(user_id=user_id).values_list('event_id', 'role')),
+        )
+        cache.set(key, memberships, settings.MEMBERSHIP_CACHE_TTL)
+    return memberships
+
+
+def get_memberships(user, refresh=False):
+    """``user``'s Memberships, loaded once per user object unless ``refresh``."""
+    memberships = None if refresh else getattr(user, '_memberships', None)
+    if memberships is None:
+        memberships = user._memberships = load_memberships(user.id)
+    return memberships
+
+
+def invalidate_memberships(*user_ids):
+    keys = [memberships_cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+
+    def after_commit():
+        # Again, in case a reader cached the state from before the commit.
+        cache.delete_many(keys)
+        notify_memberships_changed(user_ids)
+
+    transaction.on_commit(after_commit)
+
+
+def notify_memberships_changed(user_ids):
+    """
+    Tell the sockets of ``user_ids`` to reload their Memberships, from the
+    background. Should that fail, they still do after MEMBERSHIP_SOCKET_MAX_AGE.
+    """
+    notifications.add(user_ids, {'type': 'memberships_changed'})
+
+
+def matching_group_ids(profiles):
+    """Ids of the groups of each ``(course, year_of_study)`` among ``profiles``."""
+    keys = {(profile.course, profile.year_of_study) for profile in profiles
+            if profile.course and profile.year_of_study is not None}
+    if not keys:
+        return {}
+    condition = Q()
+    for course, year_of_study in keys:
+        condition |= Q(course=course, year_of_study=year_of_study)
+
+    group_ids = defaultdict(list)
+    for group_id, course, year_of_study in Group.objects.filter(condition).values_list('id', 'course', 'year_of_study'):
+        group_ids[(course, year_of_study)].append(group_id)
+    return group_ids
+
+
+def assign_students(profiles):
+    """Add the students of ``profiles`` to the groups of their course and year."""
+    profiles = list(profiles)
+    group_ids = matching_group_ids(profiles)
+    add_memberships(
+        (group_id, profile.user_id)
+        for profile in profiles
+        for group_id in group_ids.get((profile.course, profile.year_of_study), ())
+    )
+
+
+class AssignmentQueue:
+    """Users whose profile changed, assigned in batches by a background thread."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = set()
+        self.thread = None
+
+    def add(self, user_id):
+        with self.condition:
+            self.pending.add(user_id)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='group-assignment', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            self.flush()
+
+    def flush(self):
+        with self.condition:
+            user_ids, self.pending = self.pending, set()
+        if not user_ids:
+            return
+        try:
+            assign_students(StudentProfile.objects.filter(user_id__in=user_ids))
+        except Exception:
+            # ``manage.py assign_study_groups`` catches up on these.
+            logger.exception("Assigning %d students to groups failed.", len(user_ids))
+        finally:
+            close_old_connections()
+
+
+assignment_queue = AssignmentQueue()
+atexit.register(assignment_queue.flush)
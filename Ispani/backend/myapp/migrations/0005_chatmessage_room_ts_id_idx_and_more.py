@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_alter_tutoravailability_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room', 'timestamp', 'id'], name='chatmessage_room_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='privatemessage',
+            index=models.Index(fields=['chat', 'timestamp', 'id'], name='privatemessage_chat_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_chatmessage_room_ts_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_time', 'id'], name='event_start_time_id_idx'),
+        ),
+    ]
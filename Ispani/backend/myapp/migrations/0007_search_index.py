@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Only SQLiteFTSBackend stores its index in the database.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS myapp_search_index USING fts5("
+        "doc_type UNINDEXED, object_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS myapp_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_event_start_time_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
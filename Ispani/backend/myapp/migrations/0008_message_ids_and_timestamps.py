@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:30
+
+import django.utils.timezone
+import myapp.realtime.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='id',
+            field=models.BigIntegerField(default=myapp.realtime.ids.next_message_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='privatemessage',
+            name='id',
+            field=models.BigIntegerField(default=myapp.realtime.ids.next_message_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='privatemessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def create_read_states(apps, schema_editor):
+    """Give every current participant a read state; existing history counts as read."""
+    ChatRoom = apps.get_model('myapp', 'ChatRoom')
+    PrivateChat = apps.get_model('myapp', 'PrivateChat')
+    ReadState = apps.get_model('myapp', 'ReadState')
+
+    states = []
+    for room in ChatRoom.objects.annotate(last_message_id=Max('messages__id')).iterator():
+        for user_id in room.members.values_list('id', flat=True):
+            states.append(ReadState(user_id=user_id, room_id=room.id, last_read_message_id=room.last_message_id or 0))
+    for chat in PrivateChat.objects.annotate(last_message_id=Max('messages__id')).iterator():
+        for user_id in {chat.user1_id, chat.user2_id}:
+            states.append(ReadState(user_id=user_id, private_chat_id=chat.id, last_read_message_id=chat.last_message_id or 0))
+    ReadState.objects.bulk_create(states, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_message_ids_and_timestamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('private_chat', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='myapp.privatechat')),
+                ('room', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='myapp.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('room__isnull', False)), fields=('user', 'room'), name='readstate_user_room_uniq'), models.UniqueConstraint(condition=models.Q(('private_chat__isnull', False)), fields=('user', 'private_chat'), name='readstate_user_private_chat_uniq')],
+            },
+        ),
+        migrations.RunPython(create_read_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_last_activity(apps, schema_editor):
+    ReadState = apps.get_model('myapp', 'ReadState')
+    for model_name, message_model_name, fk, state_field in [
+        ('ChatRoom', 'ChatMessage', 'room', 'room'),
+        ('PrivateChat', 'PrivateMessage', 'chat', 'private_chat'),
+    ]:
+        Conversation = apps.get_model('myapp', model_name)
+        Message = apps.get_model('myapp', message_model_name)
+        for conversation in Conversation.objects.iterator():
+            last = Message.objects.filter(**{fk: conversation}).order_by('-id').first()
+            conversation.last_message = last
+            conversation.last_activity_at = last.timestamp if last else conversation.created_at
+            conversation.save(update_fields=['last_message', 'last_activity_at'])
+            ReadState.objects.filter(**{state_field: conversation}).update(
+                last_activity_at=conversation.last_activity_at
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_readstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myapp.chatmessage'),
+        ),
+        migrations.AddField(
+            model_name='privatechat',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='privatechat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myapp.privatemessage'),
+        ),
+        migrations.AddField(
+            model_name='readstate',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='readstate',
+            index=models.Index(fields=['user', '-last_activity_at', '-id'], name='readstate_inbox_idx'),
+        ),
+        migrations.RunPython(fill_last_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+def fill_seq(apps, schema_editor):
+    for message_model_name, fk in [('ChatMessage', 'room_id'), ('PrivateMessage', 'chat_id')]:
+        Message = apps.get_model('myapp', message_model_name)
+        batch = []
+        conversation_id, seq = None, 0
+        for message in Message.objects.order_by(fk, 'id').only('id', fk).iterator():
+            if getattr(message, fk) != conversation_id:
+                conversation_id, seq = getattr(message, fk), 0
+            seq += 1
+            message.seq = seq
+            batch.append(message)
+            if len(batch) >= 1000:
+                Message.objects.bulk_update(batch, ['seq'])
+                batch = []
+        Message.objects.bulk_update(batch, ['seq'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_conversation_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='privatemessage',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_seq, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room', 'seq'], name='chatmessage_room_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='privatemessage',
+            index=models.Index(fields=['chat', 'seq'], name='privatemessage_chat_seq_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_message_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventmedia',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='eventmedia',
+            name='preview',
+            field=models.ImageField(blank=True, null=True, upload_to='event_media_previews/'),
+        ),
+        migrations.AddField(
+            model_name='eventmedia',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='event_media_thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='preview',
+            field=models.ImageField(blank=True, null=True, upload_to='message_previews/'),
+        ),
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.PositiveBigIntegerField()),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:00
+
+import myapp.media.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    """Create blobs for media hashed before content-addressed storage."""
+    Blob = apps.get_model('myapp', 'Blob')
+    blobs = {}
+    for model_name in ('MessageAttachment', 'EventMedia'):
+        model = apps.get_model('myapp', model_name)
+        rows = (model.objects.exclude(content_hash='').values('content_hash')
+                .annotate(references=Count('pk'), name=models.Min('file')))
+        for row in rows:
+            blob = blobs.setdefault(row['content_hash'], Blob(sha256=row['content_hash'], name=row['name'], size=0))
+            blob.refcount += row['references']
+    for blob in blobs.values():
+        try:
+            blob.size = myapp.media.storage.blob_storage.size(blob.name)
+        except OSError:
+            pass
+    Blob.objects.bulk_create(blobs.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_media_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('unreferenced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('refcount', 0)), fields=['unreferenced_at'], name='blob_unreferenced_idx')],
+            },
+        ),
+        migrations.AlterField(
+            model_name='eventmedia',
+            name='file',
+            field=models.FileField(storage=myapp.media.storage.get_blob_storage, upload_to='event_media/'),
+        ),
+        migrations.AlterField(
+            model_name='messageattachment',
+            name='file',
+            field=models.FileField(storage=myapp.media.storage.get_blob_storage, upload_to='message_attachments/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
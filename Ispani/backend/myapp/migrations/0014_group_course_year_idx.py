@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['course', 'year_of_study'], name='group_course_year_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_members(apps, schema_editor):
+    """Give every Group.members row without a GroupMembership one."""
+    Group = apps.get_model('myapp', 'Group')
+    GroupMembership = apps.get_model('myapp', 'GroupMembership')
+    admins = dict(Group.objects.values_list('id', 'admin_id'))
+    members = Group.members.through.objects.values_list('group_id', 'customuser_id')
+    GroupMembership.objects.bulk_create(
+        [
+            GroupMembership(group_id=group_id, user_id=user_id,
+                            role='ADMIN' if admins.get(group_id) == user_id else 'MEMBER')
+            for group_id, user_id in members.iterator()
+        ],
+        batch_size=1000, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_group_course_year_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_members, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            # The membership rows replace the implicit members table.
+            database_operations=[
+                migrations.RemoveField(model_name='group', name='members'),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='group',
+                    name='members',
+                    field=models.ManyToManyField(related_name='custom_groups', through='myapp.GroupMembership', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-18 21:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def counted(model, relation, **conditions):
+    count = (
+        model.objects.filter(**{relation: OuterRef('pk')}, **conditions)
+        .order_by().values(relation).annotate(count=Count('pk')).values('count')
+    )
+    return Coalesce(Subquery(count), Value(0))
+
+
+def count_members(apps, schema_editor):
+    Group = apps.get_model('myapp', 'Group')
+    GroupMembership = apps.get_model('myapp', 'GroupMembership')
+    Event = apps.get_model('myapp', 'Event')
+    EventParticipant = apps.get_model('myapp', 'EventParticipant')
+    Group.objects.update(member_count=counted(GroupMembership, 'group'))
+    Event.objects.update(participants_count=counted(EventParticipant, 'event', status='going'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_group_members_through_membership'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='participants_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_members, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 22:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from myapp.search.tokens import tokenize
+
+
+def split_hobbies(apps, schema_editor):
+    Group = apps.get_model('myapp', 'Group')
+    GroupHobby = apps.get_model('myapp', 'GroupHobby')
+    GroupHobby.objects.bulk_create(
+        (
+            GroupHobby(group_id=group_id, token=token)
+            for group_id, hobbies in Group.objects.exclude(hobbies='').values_list('id', 'hobbies').iterator()
+            for token in set(tokenize(hobbies))
+        ),
+        batch_size=1000, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_group_member_count_event_participants_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['created_at', 'id'], name='group_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['member_count', 'id'], name='group_member_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['group_type', 'created_at', 'id'], name='group_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['group_type', 'member_count', 'id'], name='group_type_member_count_idx'),
+        ),
+        migrations.CreateModel(
+            name='GroupHobby',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=200)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hobby_tokens', to='myapp.group')),
+            ],
+            options={
+                'unique_together': {('token', 'group')},
+            },
+        ),
+        migrations.RunPython(split_hobbies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 23:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_group_discovery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentprofile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
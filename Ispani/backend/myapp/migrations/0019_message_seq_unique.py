@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+def clear_duplicate_seqs(apps, schema_editor):
+    # Counters of separate processes could hand out the same seq; the first
+    # message keeps it and the others go without, so replays of their
+    # conversations report a gap and clients page the history instead.
+    for message_model_name, fk in [('ChatMessage', 'room_id'), ('PrivateMessage', 'chat_id')]:
+        Message = apps.get_model('myapp', message_model_name)
+        duplicates = []
+        previous = None
+        rows = Message.objects.filter(seq__isnull=False).order_by(fk, 'seq', 'id').values_list('id', fk, 'seq')
+        for message_id, conversation_id, seq in rows.iterator():
+            if (conversation_id, seq) == previous:
+                duplicates.append(message_id)
+            previous = (conversation_id, seq)
+        for start in range(0, len(duplicates), 500):
+            Message.objects.filter(id__in=duplicates[start:start + 500]).update(seq=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_studentprofile_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_seqs, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chatmessage_room_seq_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='privatemessage',
+            name='privatemessage_chat_seq_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('room', 'seq'), name='chatmessage_room_seq_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='privatemessage',
+            constraint=models.UniqueConstraint(fields=('chat', 'seq'), name='privatemessage_chat_seq_uniq'),
+        ),
+    ]
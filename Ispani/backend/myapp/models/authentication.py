@@ -36,6 +36,8 @@ class StudentProfile(models.Model):
     hobbies = models.TextField(null=True, blank=True)
     piece_jobs = models.TextField(null=True, blank=True)
     institution = models.CharField(max_length=50, null=True, blank=True)
+    # Student matching picks up changed profiles by it (see myapp/matching.py).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Student Profile: {self.user.username}"
@@ -1,5 +1,6 @@
 from django.forms import ValidationError
 from .import models
+from ..media.storage import get_blob_storage
 
 class Event(models.Model):
     EVENT_TYPE_CHOICES = [
@@ -35,6 +36,13 @@ class Event(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     invite_link = models.CharField(max_length=50, unique=True, null=True, blank=True)
     tags = models.ManyToManyField('EventTag', related_name='events', blank=True)
+    # Participants going, kept by myapp/counters.py.
+    participants_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_time', 'id'], name='event_start_time_id_idx'),
+        ]
     
     def clean(self):
         if self.start_time >= self.end_time:
@@ -93,11 +101,15 @@ class EventMedia(models.Model):
     ]
     
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='media')
-    file = models.FileField(upload_to='event_media/')
+    file = models.FileField(upload_to='event_media/', storage=get_blob_storage)
     media_type = models.CharField(max_length=20, choices=MEDIA_TYPE_CHOICES)
     title = models.CharField(max_length=100, blank=True)
     uploaded_by = models.ForeignKey('CustomUser', on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Image variants, generated in the background (see myapp/media/variants.py)
+    thumbnail = models.ImageField(upload_to='event_media_thumbnails/', null=True, blank=True)
+    preview = models.ImageField(upload_to='event_media_previews/', null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
     
     def __str__(self):
         return f"{self.get_media_type_display()} for {self.event.title}"
\ No newline at end of file
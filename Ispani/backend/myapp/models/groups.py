@@ -15,10 +15,24 @@ class Group(models.Model):
     course = models.CharField(max_length=100, blank=True)
     year_of_study = models.IntegerField(null=True, blank=True)
     hobbies = models.CharField(max_length=200, blank=True)
-    members = models.ManyToManyField(CustomUser, related_name='custom_groups')
+    # Roles live on the membership rows (see myapp/membership.py).
+    members = models.ManyToManyField(CustomUser, through='GroupMembership', related_name='custom_groups')
     admin = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='administered_groups')
     created_at = models.DateTimeField(auto_now_add=True)
     invite_link = models.CharField(max_length=20, unique=True)
+    # Kept by myapp/counters.py.
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Students are matched to groups on both (see myapp/membership.py).
+            models.Index(fields=['course', 'year_of_study'], name='group_course_year_idx'),
+            # Group discovery pages by recency or popularity, optionally within a type.
+            models.Index(fields=['created_at', 'id'], name='group_created_idx'),
+            models.Index(fields=['member_count', 'id'], name='group_member_count_idx'),
+            models.Index(fields=['group_type', 'created_at', 'id'], name='group_type_created_idx'),
+            models.Index(fields=['group_type', 'member_count', 'id'], name='group_type_member_count_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.invite_link:
@@ -38,4 +52,13 @@ class GroupMembership(models.Model):
     joined_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        unique_together = ('user', 'group')
\ No newline at end of file
+        unique_together = ('user', 'group')
+
+
+class GroupHobby(models.Model):
+    """A word of ``Group.hobbies``, so discovery filters hobbies through an index."""
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='hobby_tokens')
+    token = models.CharField(max_length=200)
+
+    class Meta:
+        unique_together = ('token', 'group')
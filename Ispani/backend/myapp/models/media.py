@@ -0,0 +1,49 @@
+import uuid
+from django.db import models
+from .authentication import CustomUser
+
+class Upload(models.Model):
+    """
+    A file received in chunks, so an interrupted upload can continue where it
+    stopped. Once complete it is turned into a message attachment or event
+    media (see myapp/media/uploads.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # SHA-256 of the content, set when the last chunk arrives
+    content_hash = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+class Blob(models.Model):
+    """
+    A file in content-addressed storage and the number of media rows using
+    it (see myapp/media/blobs.py). Blobs nothing has used for
+    ``MEDIA_GC_GRACE`` seconds are deleted by ``collect_media_garbage``.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    unreferenced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['unreferenced_at'], name='blob_unreferenced_idx',
+                         condition=models.Q(refcount=0)),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
@@ -4,6 +4,8 @@ from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .authentication import CustomUser, StudentProfile
+from ..media.storage import get_blob_storage
+from ..realtime.ids import next_message_id
 
 class ChatRoom(models.Model):
     CHAT_TYPES = [
@@ -16,15 +18,31 @@ class ChatRoom(models.Model):
     chat_type = models.CharField(max_length=20, choices=CHAT_TYPES)
     members = models.ManyToManyField(CustomUser, related_name="chat_rooms")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Kept current by the message write path (see myapp/realtime/unread.py)
+    last_message = models.ForeignKey('ChatMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.name} ({self.chat_type})"
 
 class ChatMessage(models.Model):
+    # Ids are time-ordered and assigned in-process so messages can be
+    # broadcast before they are written (see myapp.realtime).
+    id = models.BigIntegerField(primary_key=True, default=next_message_id, editable=False)
     room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name="messages")
     sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="sent_messages")
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Position in the room, used by reconnecting sockets (see myapp/realtime/replay.py)
+    seq = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'timestamp', 'id'], name='chatmessage_room_ts_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'seq'], name='chatmessage_room_seq_uniq'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender} in {self.room.name}"
@@ -33,6 +51,8 @@ class PrivateChat(models.Model):
     user1 = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='chats_initiated')
     user2 = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='chats_received')
     created_at = models.DateTimeField(auto_now_add=True)
+    last_message = models.ForeignKey('PrivateMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ['user1', 'user2']
@@ -41,14 +61,62 @@ class PrivateChat(models.Model):
         return f"Chat between {self.user1.username} and {self.user2.username}"
 
 class PrivateMessage(models.Model):
+    # Ids are time-ordered and assigned in-process so messages can be
+    # broadcast before they are written (see myapp.realtime).
+    id = models.BigIntegerField(primary_key=True, default=next_message_id, editable=False)
     chat = models.ForeignKey(PrivateChat, on_delete=models.CASCADE, related_name="messages")
     sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="private_sent_messages")
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    seq = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['chat', 'timestamp', 'id'], name='privatemessage_chat_ts_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['chat', 'seq'], name='privatemessage_chat_seq_uniq'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username}"
     
+class ReadState(models.Model):
+    """
+    A user's read position in one chat room or private chat, with the number
+    of messages from others after it. The counter is kept current by the
+    message write path (see myapp/realtime/unread.py).
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='read_states')
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, null=True, blank=True, related_name='read_states')
+    private_chat = models.ForeignKey(PrivateChat, on_delete=models.CASCADE, null=True, blank=True, related_name='read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+    # Copy of the conversation's last_activity_at, so a user's inbox is one
+    # index scan on (user, last_activity_at).
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-last_activity_at', '-id'], name='readstate_inbox_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'room'],
+                condition=models.Q(room__isnull=False),
+                name='readstate_user_room_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'private_chat'],
+                condition=models.Q(private_chat__isnull=False),
+                name='readstate_user_private_chat_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count} unread"
+
 class MessageAttachment(models.Model):
     ATTACHMENT_TYPES = (
         ('IMAGE', 'Image'),
@@ -58,9 +126,12 @@ class MessageAttachment(models.Model):
     )
 
     message = models.ForeignKey(ChatMessage, on_delete=models.CASCADE, related_name='attachments')
-    file = models.FileField(upload_to='message_attachments/')
+    file = models.FileField(upload_to='message_attachments/', storage=get_blob_storage)
     attachment_type = models.CharField(max_length=10, choices=ATTACHMENT_TYPES)
+    # Image variants, generated in the background (see myapp/media/variants.py)
     thumbnail = models.ImageField(upload_to='message_thumbnails/', null=True, blank=True)
+    preview = models.ImageField(upload_to='message_previews/', null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return f"{self.get_attachment_type_display()} for message {self.message.id}"
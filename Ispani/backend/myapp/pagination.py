@@ -0,0 +1,253 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Page size handling shared by the paginators below."""
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+
+class MessageCursorPagination(KeysetPagination):
+    """
+    Keyset pagination for chat histories ordered by (timestamp, id).
+
+    Without a cursor the latest page is returned. ``before=<message id>`` pages
+    back from that message and ``after=<message id>`` returns what arrived after
+    it, so every page is a bounded range scan on the (room/chat, timestamp, id)
+    index however long the history is.
+    """
+    before_query_param = 'before'
+    after_query_param = 'after'
+    ordering_field = 'timestamp'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        before = self.get_cursor(request, self.before_query_param)
+        after = self.get_cursor(request, self.after_query_param)
+
+        if before is not None and after is not None:
+            raise ValidationError({"detail": "Use either 'before' or 'after', not both."})
+
+        field = self.ordering_field
+        self.anchor = after
+
+        if after is not None:
+            position = self.get_position(queryset, after, self.after_query_param)
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': position}) | Q(**{field: position, 'id__gt': after})
+            )
+            rows = list(queryset.order_by(field, 'id')[:page_size + 1])
+            self.has_newer = len(rows) > page_size
+            self.has_older = True
+            rows = rows[:page_size]
+        else:
+            if before is not None:
+                position = self.get_position(queryset, before, self.before_query_param)
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lt': position}) | Q(**{field: position, 'id__lt': before})
+                )
+            rows = list(queryset.order_by(f'-{field}', '-id')[:page_size + 1])
+            self.has_older = len(rows) > page_size
+            self.has_newer = before is not None
+            rows = rows[:page_size]
+            rows.reverse()
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        before = self.page[0].id if self.page and self.has_older else None
+        # The newest id is always returned so clients can poll for new messages.
+        after = self.page[-1].id if self.page else self.anchor
+        # Message ids are sent as strings, like the messages themselves.
+        before, after = (str(cursor) if cursor is not None else None for cursor in (before, after))
+        return Response({
+            'before': before,
+            'after': after,
+            'has_older': self.has_older,
+            'has_newer': self.has_newer,
+            'results': data,
+        })
+
+    def get_cursor(self, request, param):
+        value = request.query_params.get(param)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({param: "Cursor must be a message id."})
+
+    def get_position(self, queryset, message_id, param):
+        position = queryset.filter(id=message_id).values_list(self.ordering_field, flat=True).first()
+        if position is None:
+            raise ValidationError({param: "Unknown message id."})
+        return position
+
+
+class TimestampCursorPagination(KeysetPagination):
+    """
+    Keyset pagination over (ordering_field, id), ascending or descending.
+
+    The opaque ``cursor`` parameter encodes the position of the last row on
+    the previous page, so rows sharing a timestamp are neither skipped nor
+    repeated, and deep pages cost the same as the first.
+    """
+    ordering_field = None
+    descending = False
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        field = self.ordering_field
+        after = 'lt' if self.descending else 'gt'
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            # The redundant bound on ``field`` alone lets the planner seek the
+            # index to the cursor; with only the OR it may scan from the start.
+            queryset = queryset.filter(**{f'{field}__{after}e': value}).filter(
+                Q(**{f'{field}__{after}': value}) | Q(**{f'id__{after}': pk})
+            )
+
+        prefix = '-' if self.descending else ''
+        rows = list(queryset.order_by(f'{prefix}{field}', f'{prefix}id')[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last))
+
+    def encode_cursor(self, obj):
+        raw = f'{self.format_position(getattr(obj, self.ordering_field))}|{obj.id}'
+        return urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            value, pk = raw.rsplit('|', 1)
+            return self.parse_position(value), int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+    def format_position(self, value):
+        return value.isoformat()
+
+    def parse_position(self, value):
+        return datetime.fromisoformat(value)
+
+
+class EventCursorPagination(TimestampCursorPagination):
+    """Event lists ordered by (start_time, id)."""
+    page_size = 20
+    max_page_size = 100
+    ordering_field = 'start_time'
+
+
+class InboxCursorPagination(TimestampCursorPagination):
+    """A user's conversations, most recently active first."""
+    page_size = 30
+    max_page_size = 100
+    ordering_field = 'last_activity_at'
+    descending = True
+
+
+class GroupCursorPagination(TimestampCursorPagination):
+    """
+    Group discovery, newest first, or most members first with ``sort=popular``.
+
+    Member counts move while a client pages, so a popular listing may repeat
+    or skip a group whose count changed in between; recency pages are exact.
+    """
+    page_size = 20
+    max_page_size = 100
+    descending = True
+    sort_query_param = 'sort'
+    orderings = {
+        'recent': 'created_at',
+        'popular': 'member_count',
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        sort = request.query_params.get(self.sort_query_param) or 'recent'
+        if sort not in self.orderings:
+            raise ValidationError({self.sort_query_param: f"Must be one of: {', '.join(self.orderings)}."})
+        self.ordering_field = self.orderings[sort]
+        return super().paginate_queryset(queryset, request, view)
+
+    def format_position(self, value):
+        if self.ordering_field == 'member_count':
+            return str(value)
+        return super().format_position(value)
+
+    def parse_position(self, value):
+        if self.ordering_field == 'member_count':
+            return int(value)
+        return super().parse_position(value)
+
+
+class RankedListPagination(KeysetPagination):
+    """
+    Pages through a ranking computed up front, such as similar students.
+    ``offset`` is the position of the page's first entry in the ranking.
+    """
+    page_size = 20
+    max_page_size = 100
+    offset_query_param = 'offset'
+
+    def paginate_queryset(self, ranked, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.offset = max(int(request.query_params.get(self.offset_query_param, 0)), 0)
+        except ValueError:
+            raise ValidationError({self.offset_query_param: "Must be a number."})
+        self.page = ranked[self.offset:self.offset + page_size]
+        self.has_next = self.offset + page_size < len(ranked)
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.offset + len(self.page))
@@ -0,0 +1,105 @@
+"""
+WebSocket frame encodings.
+
+A socket's encoding is negotiated on connect: the first ``ispani.<name>``
+subprotocol the client offers that the server supports wins, then an
+``?encoding=<name>`` query parameter, then JSON. JSON frames are sent as
+text, msgpack and CBOR frames as binary. msgpack and CBOR are optional and
+only offered when their packages are installed.
+
+Compression (permessage-deflate) is negotiated by the ASGI server, not
+here; see ``manage.py frame_encoding_benchmark`` for its effect.
+"""
+import json
+from urllib.parse import parse_qs
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+SUBPROTOCOL_PREFIX = 'ispani.'
+
+
+class DecodeError(ValueError):
+    """A frame that is malformed or not an object."""
+
+
+class JSONCodec:
+    name = 'json'
+    binary = False
+
+    def encode(self, payload):
+        return json.dumps(payload, separators=(',', ':'))
+
+    def decode(self, text_data=None, bytes_data=None):
+        return json.loads(text_data if text_data is not None else bytes_data)
+
+
+class MsgPackCodec:
+    name = 'msgpack'
+    binary = True
+
+    def encode(self, payload):
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(self, text_data=None, bytes_data=None):
+        if bytes_data is None:
+            return json.loads(text_data)
+        return msgpack.unpackb(bytes_data, raw=False)
+
+
+class CBORCodec:
+    name = 'cbor'
+    binary = True
+
+    def encode(self, payload):
+        return cbor2.dumps(payload)
+
+    def decode(self, text_data=None, bytes_data=None):
+        if bytes_data is None:
+            return json.loads(text_data)
+        return cbor2.loads(bytes_data)
+
+
+CODECS = {'json': JSONCodec()}
+if msgpack is not None:
+    CODECS['msgpack'] = MsgPackCodec()
+if cbor2 is not None:
+    CODECS['cbor'] = CBORCodec()
+
+
+# What the decoders raise on malformed input.
+DECODE_ERRORS = (ValueError, TypeError)
+if msgpack is not None:
+    DECODE_ERRORS += (msgpack.UnpackException,)
+
+
+def decode_frame(codec, text_data=None, bytes_data=None):
+    """Decode a received frame with ``codec``; raises DecodeError unless it is an object."""
+    try:
+        data = codec.decode(text_data, bytes_data)
+    except DECODE_ERRORS as exc:
+        raise DecodeError(str(exc)) from exc
+    if not isinstance(data, dict):
+        raise DecodeError("A frame must be an object")
+    return data
+
+
+def negotiate(scope):
+    """Return ``(codec, subprotocol)`` for a connecting socket's scope."""
+    for subprotocol in scope.get('subprotocols') or ():
+        if subprotocol.startswith(SUBPROTOCOL_PREFIX):
+            codec = CODECS.get(subprotocol[len(SUBPROTOCOL_PREFIX):])
+            if codec is not None:
+                return codec, subprotocol
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    name = (query.get('encoding') or ['json'])[0]
+    return CODECS.get(name, CODECS['json']), None
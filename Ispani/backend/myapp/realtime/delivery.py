@@ -0,0 +1,199 @@
+"""
+Fan-out-on-write message delivery.
+
+Every authenticated socket joins its user's channel layer group
+(``user_<id>``). A new message is sent once to the user group of each
+participant of its conversation, so one socket per user receives every
+conversation; consumers bound to a single conversation drop events for the
+others.
+
+Participant ids are cached (``ROOM_MEMBERS_CACHE_TTL``) and dropped when room
+membership changes, so sending a message does not query the database.
+Message events are also kept for reconnecting sockets (see ``replay``).
+
+Notifications that do not have to reach sockets before a request returns,
+such as event invites, go through ``notify``: they are sent by a background
+thread once the transaction commits, one channel layer call per user, and
+failures are logged rather than failing the request.
+"""
+import atexit
+import logging
+import threading
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import ChatMessage, ChatRoom, PrivateChat, PrivateMessage
+from . import replay
+from .writebehind import chat_messages, private_messages
+
+
+logger = logging.getLogger(__name__)
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+
+def event_comments_group_name(event_id):
+    return f'event_comments_{event_id}'
+
+
+def room_members_cache_key(room_id):
+    return f'room_members:{room_id}'
+
+
+def private_chat_users_cache_key(chat_id):
+    return f'private_chat_users:{chat_id}'
+
+
+def get_room_member_ids(room_id):
+    key = room_members_cache_key(room_id)
+    member_ids = cache.get(key)
+    if member_ids is None:
+        member_ids = frozenset(
+            ChatRoom.members.through.objects.filter(chatroom_id=room_id).values_list('customuser_id', flat=True)
+        )
+        cache.set(key, member_ids, settings.ROOM_MEMBERS_CACHE_TTL)
+    return member_ids
+
+
+def invalidate_room_members(room_id):
+    cache.delete(room_members_cache_key(room_id))
+
+
+def get_private_chat_user_ids(chat_id):
+    # The two users of a private chat never change, so no invalidation is needed.
+    key = private_chat_users_cache_key(chat_id)
+    user_ids = cache.get(key)
+    if user_ids is None:
+        user_ids = PrivateChat.objects.filter(id=chat_id).values_list('user1_id', 'user2_id').first()
+        user_ids = frozenset(user_ids or ())
+        cache.set(key, user_ids, settings.ROOM_MEMBERS_CACHE_TTL)
+    return user_ids
+
+
+async def deliver(user_ids, event):
+    channel_layer = get_channel_layer()
+    for user_id in user_ids:
+        await channel_layer.group_send(user_group_name(user_id), event)
+
+
+class NotificationQueue:
+    """Events for users' sockets, sent by a background thread."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = []  # (user ids, event)
+        self.thread = None
+
+    def add(self, user_ids, event):
+        with self.condition:
+            self.pending.append((list(user_ids), event))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='notifications', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            self.flush()
+
+    def flush(self):
+        with self.condition:
+            batch, self.pending = self.pending, []
+        for user_ids, event in batch:
+            try:
+                async_to_sync(deliver)(user_ids, event)
+            except Exception:
+                logger.exception("Sending %s to %d users failed.", event.get('type'), len(user_ids))
+
+
+notifications = NotificationQueue()
+atexit.register(notifications.flush)
+
+
+def notify(user_ids, event):
+    """Send ``event`` to the sockets of ``user_ids`` in the background once the transaction commits."""
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: notifications.add(user_ids, event))
+
+
+async def deliver_message(user_ids, event):
+    replay.remember(event)
+    await deliver(user_ids, event)
+
+
+def message_event(message, sender):
+    event = {
+        'type': 'chat_message',
+        'id': message.id,
+        'seq': message.seq,
+        'sender_id': sender.id,
+        'sender': sender.username,
+        'message': message.content,
+        # Epoch milliseconds: smaller on the wire than ISO strings.
+        'timestamp': int(message.timestamp.timestamp() * 1000),
+    }
+    if isinstance(message, ChatMessage):
+        event['room_id'] = message.room_id
+    else:
+        event['chat_id'] = message.chat_id
+    return event
+
+
+async def post_room_message(sender, room_id, content):
+    """
+    Deliver a room message to every member and queue it for writing.
+    The caller is responsible for checking that ``sender`` is a member.
+    """
+    # The model defaults assign the id and timestamp in-process, so the
+    # message is delivered straight away and written by the next batch
+    # flush. It is queued first: one the buffer refuses (BufferFull) is
+    # never delivered.
+    message = ChatMessage(
+        room_id=room_id, sender_id=sender.id, content=content,
+        seq=await replay.anext_seq(ChatMessage, room_id)
+    )
+    chat_messages.add(message)
+    member_ids = await sync_to_async(get_room_member_ids)(room_id)
+    await deliver_message(member_ids, message_event(message, sender))
+    return message
+
+
+async def post_private_message(sender, chat_id, content):
+    message = PrivateMessage(
+        chat_id=chat_id, sender_id=sender.id, content=content,
+        seq=await replay.anext_seq(PrivateMessage, chat_id)
+    )
+    private_messages.add(message)
+    user_ids = await sync_to_async(get_private_chat_user_ids)(chat_id)
+    await deliver_message(user_ids, message_event(message, sender))
+    return message
+
+
+def invite_notification(event, inviter):
+    """The notification sent to users invited to ``event`` by ``inviter``."""
+    return {
+        'type': 'event_invite',
+        'event_id': event.id,
+        'title': event.title,
+        'start_time': int(event.start_time.timestamp() * 1000),
+        'inviter_id': inviter.id,
+        'inviter': inviter.username,
+    }
+
+
+async def publish_event_comment(comment, data):
+    """Send a new event comment (serialized as ``data``) to the thread's subscribers."""
+    await get_channel_layer().group_send(event_comments_group_name(comment.event_id), {
+        'type': 'event_comment',
+        'event_id': comment.event_id,
+        'comment': data,
+    })
@@ -0,0 +1,164 @@
+"""
+Flow control for WebSocket consumers.
+
+Inbound, every sender has a token bucket allowing ``WS_RATE_LIMIT`` frames
+per second with bursts of ``WS_RATE_BURST``. It is shared by the sender's
+sockets in this process. Frames over the limit are discarded in ``receive``,
+before they reach the database or the channel layer. Control frames
+(heartbeats, subscribing and unsubscribing) do not count, so a client can
+resubscribe all its streams at once after a reconnect.
+
+Outbound, frames are not sent from the channel layer handlers but put on a
+bounded ``FrameQueue`` that a writer task per socket drains. A slow client
+therefore only backs up its own queue instead of the channel layer, which
+would otherwise drop messages for it (and stall its handlers). When the
+queue holds ``WS_OUTBOUND_QUEUE_SIZE`` frames, ``WS_OVERFLOW_POLICY``
+decides what happens:
+
+- ``drop``: the oldest queued frame is discarded. The client is sent a
+  ``{"type": "dropped", "count": n}`` frame once it catches up so it can
+  refetch history over REST.
+- ``coalesce``: as ``drop``, but frames that supersede an earlier one
+  (presence of the same user) replace it in the queue instead of taking a
+  slot.
+- ``disconnect``: the socket is closed with code 4408.
+
+Counters for the whole process are kept in ``metrics``.
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+
+from django.conf import settings
+
+
+DROP = 'drop'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+
+metrics = {
+    'queued': 0,
+    'sent': 0,
+    'dropped': 0,
+    'coalesced': 0,
+    'delayed': 0,
+    'max_delay': 0.0,
+    'rate_limited': 0,
+    'slow_disconnects': 0,
+}
+
+
+def get_flow_metrics():
+    return dict(metrics)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self, tokens=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+# Buckets live as long as one of their sender's sockets holds on to them.
+sender_buckets = weakref.WeakValueDictionary()
+
+
+def get_sender_bucket(user_id):
+    bucket = sender_buckets.get(user_id)
+    if bucket is None:
+        bucket = TokenBucket(settings.WS_RATE_LIMIT, settings.WS_RATE_BURST)
+        sender_buckets[user_id] = bucket
+    return bucket
+
+
+class FrameQueue:
+    """Bounded queue of outgoing frames for one socket."""
+
+    def __init__(self, maxsize=None, policy=None):
+        self.maxsize = maxsize or settings.WS_OUTBOUND_QUEUE_SIZE
+        self.policy = policy or settings.WS_OVERFLOW_POLICY
+        self.frames = deque()  # [enqueued_at, key, payload]
+        self.keyed = {}
+        self.dropped = 0  # since the client was last told
+        self.ready = asyncio.Event()
+        self.space = asyncio.Event()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, payload, key=None):
+        """
+        Queue ``payload``. ``key`` identifies frames that supersede each
+        other. Returns False when the policy says to disconnect the socket.
+        """
+        if key is not None and self.policy == COALESCE:
+            entry = self.keyed.get(key)
+            if entry is not None:
+                entry[2] = payload
+                metrics['coalesced'] += 1
+                return True
+
+        if len(self.frames) >= self.maxsize:
+            if self.policy == DISCONNECT:
+                return False
+            self.discard(self.frames.popleft())
+            self.dropped += 1
+            metrics['dropped'] += 1
+
+        entry = [time.monotonic(), key, payload]
+        self.frames.append(entry)
+        if key is not None:
+            self.keyed[key] = entry
+        metrics['queued'] += 1
+        self.ready.set()
+        return True
+
+    async def get(self):
+        """Wait for the next frame; returns ``(enqueued_at, payload)``."""
+        while not self.frames:
+            self.ready.clear()
+            await self.ready.wait()
+        entry = self.frames.popleft()
+        self.discard(entry)
+        self.space.set()
+        return entry[0], entry[2]
+
+    async def wait_for_space(self, size):
+        """Wait until fewer than ``size`` frames are queued."""
+        while len(self.frames) >= size:
+            self.space.clear()
+            await self.space.wait()
+
+    def discard(self, entry):
+        metrics['queued'] -= 1
+        if entry[1] is not None and self.keyed.get(entry[1]) is entry:
+            del self.keyed[entry[1]]
+
+    def clear(self):
+        metrics['queued'] -= len(self.frames)
+        self.frames.clear()
+        self.keyed.clear()
+
+    def take_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+def record_sent(enqueued_at):
+    delay = time.monotonic() - enqueued_at
+    metrics['sent'] += 1
+    if delay > metrics['max_delay']:
+        metrics['max_delay'] = delay
+    if delay > settings.WS_SEND_DELAY_WARNING:
+        metrics['delayed'] += 1
@@ -0,0 +1,149 @@
+"""
+Time-ordered 64-bit ids for chat messages, assigned in-process.
+
+Layout (most significant bit first): 41 bits of milliseconds since ``EPOCH``,
+10 bits of worker id and 12 bits of per-millisecond sequence. Ids sort in
+creation order and never collide between processes as long as each one has
+its own worker id.
+
+``MESSAGE_ID_WORKER`` pins a process's worker id. Otherwise a free one is
+leased from the cache (``message_id_worker:<n>``, so the cache must be shared
+by all processes) before the first id is issued. The lease is renewed while
+ids are issued; if it lapsed, e.g. because the process sat idle, a worker id
+is leased again before the next id.
+
+Ids exceed 2**53, so they are sent to clients as strings.
+"""
+import atexit
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+EPOCH_MS = int(EPOCH.timestamp() * 1000)
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# Seconds a leased worker id is held without being renewed.
+WORKER_LEASE_TTL = 60 * 10
+
+
+class IdGenerator:
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER:
+            raise ValueError(f"Worker id must be between 0 and {MAX_WORKER}.")
+        self.worker_id = worker_id
+        self.lock = threading.Lock()
+        self.last_ms = -1
+        self.sequence = 0
+
+    def next_id(self):
+        with self.lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms < self.last_ms:
+                # Clock went backwards; keep issuing ids from the last known time.
+                now_ms = self.last_ms
+            if now_ms == self.last_ms:
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    # Sequence exhausted for this millisecond; wait for the next one.
+                    while now_ms <= self.last_ms:
+                        now_ms = int(time.time() * 1000) - EPOCH_MS
+            else:
+                self.sequence = 0
+            self.last_ms = now_ms
+            return (now_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self.sequence
+
+
+def id_to_datetime(message_id):
+    """Creation time encoded in an id, to the millisecond."""
+    return EPOCH + timedelta(milliseconds=message_id >> (WORKER_BITS + SEQUENCE_BITS))
+
+
+def worker_lease_key(worker_id):
+    return f'message_id_worker:{worker_id}'
+
+
+class WorkerLease:
+    """A worker id held in the cache on behalf of this process."""
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self.worker_id = None
+        self.renewed_at = None
+
+    def acquire(self):
+        # Start at a random id so processes starting together rarely contend.
+        start = random.randrange(MAX_WORKER + 1)
+        for offset in range(MAX_WORKER + 1):
+            worker_id = (start + offset) & MAX_WORKER
+            if cache.add(worker_lease_key(worker_id), self.token, WORKER_LEASE_TTL):
+                self.worker_id = worker_id
+                self.renewed_at = time.monotonic()
+                return worker_id
+        raise ImproperlyConfigured(
+            f"All {MAX_WORKER + 1} message id workers are leased; set MESSAGE_ID_WORKER per process."
+        )
+
+    def current(self):
+        """The leased worker id, renewing the lease or leasing another one when due."""
+        if self.worker_id is None:
+            return self.acquire()
+        if time.monotonic() - self.renewed_at > WORKER_LEASE_TTL / 3:
+            key = worker_lease_key(self.worker_id)
+            if cache.get(key) == self.token and cache.touch(key, WORKER_LEASE_TTL):
+                self.renewed_at = time.monotonic()
+            else:
+                # Lapsed, and maybe taken by another process since.
+                return self.acquire()
+        return self.worker_id
+
+    def release(self):
+        if self.worker_id is not None and cache.get(worker_lease_key(self.worker_id)) == self.token:
+            cache.delete(worker_lease_key(self.worker_id))
+        self.worker_id = None
+
+
+_lock = threading.Lock()
+_generator = None
+_generator_pid = None
+_lease = None
+
+
+def next_message_id():
+    global _generator, _generator_pid, _lease
+    with _lock:
+        pid = os.getpid()
+        if _generator_pid != pid:
+            # Forked workers must not share the parent's worker id or sequence.
+            _generator = None
+            _lease = WorkerLease()
+            _generator_pid = pid
+
+        worker_id = settings.MESSAGE_ID_WORKER
+        if worker_id is None:
+            worker_id = _lease.current()
+        if _generator is None or _generator.worker_id != worker_id:
+            _generator = IdGenerator(worker_id)
+        return _generator.next_id()
+
+
+@atexit.register
+def release_worker_lease():
+    if _lease is not None and _generator_pid == os.getpid():
+        try:
+            _lease.release()
+        except Exception:
+            # The lease expires on its own.
+            pass
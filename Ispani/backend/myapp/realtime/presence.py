@@ -0,0 +1,189 @@
+"""
+Presence driven by WebSocket connections.
+
+Each user has two cache entries: a connection counter, bumped on connect and
+dropped on disconnect, and a ``presence:online:<id>`` key that exists while
+the user is online. Both expire after ``PRESENCE_TTL`` seconds unless a
+heartbeat (any frame from one of the user's sockets) refreshes them, so a
+crashed worker cannot leave users online for longer than that. The entries
+are only meaningful if every worker sees them, so the cache must be shared
+(see CACHES; ``manage.py check`` warns when it is not).
+
+When a user goes online or offline the change is sent to the channel layer
+groups of their chat rooms and private chats as a ``presence`` event. The
+``UserStatus`` table is only brought up to date periodically, in bulk, by
+``status_sync``.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import ChatRoom, PrivateChat, UserStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+def online_key(user_id):
+    return f'presence:online:{user_id}'
+
+
+def connections_key(user_id):
+    return f'presence:connections:{user_id}'
+
+
+def is_online(user_id):
+    return cache.get(online_key(user_id)) is not None
+
+
+def get_online_user_ids(user_ids):
+    """The subset of ``user_ids`` that is online, in one cache round trip."""
+    keys = {online_key(user_id): user_id for user_id in user_ids}
+    return [keys[key] for key in cache.get_many(list(keys))]
+
+
+def get_presence_groups(user_id):
+    """Channel layer groups of every conversation ``user_id`` takes part in."""
+    room_ids = ChatRoom.objects.filter(members=user_id).values_list('id', flat=True)
+    chat_ids = PrivateChat.objects.filter(Q(user1=user_id) | Q(user2=user_id)).values_list('id', flat=True)
+    return [f'chat_{room_id}' for room_id in room_ids] + [f'private_chat_{chat_id}' for chat_id in chat_ids]
+
+
+async def broadcast_presence(user_id, online):
+    groups = await sync_to_async(get_presence_groups)(user_id)
+    channel_layer = get_channel_layer()
+    for group in groups:
+        # The group tells multiplexed sockets which subscription this is for.
+        await channel_layer.group_send(group, {
+            'type': 'presence',
+            'group': group,
+            'user_id': user_id,
+            'online': online
+        })
+
+
+async def user_connected(user_id):
+    """Count a new socket for ``user_id``; announce them if it is their first."""
+    ttl = settings.PRESENCE_TTL
+    await cache.aadd(connections_key(user_id), 0, ttl)
+    try:
+        connections = await cache.aincr(connections_key(user_id))
+    except ValueError:
+        # The counter expired between add and incr.
+        await cache.aset(connections_key(user_id), 1, ttl)
+        connections = 1
+    await cache.atouch(connections_key(user_id), ttl)
+    came_online = await cache.aadd(online_key(user_id), time.time(), ttl)
+    if came_online:
+        status_sync.mark(user_id, True)
+        await broadcast_presence(user_id, True)
+    return connections
+
+
+async def user_disconnected(user_id):
+    """Drop a socket for ``user_id``; announce them offline if it was the last."""
+    try:
+        connections = await cache.adecr(connections_key(user_id))
+    except ValueError:
+        connections = 0
+    if connections <= 0:
+        await cache.adelete_many([connections_key(user_id), online_key(user_id)])
+        status_sync.mark(user_id, False)
+        await broadcast_presence(user_id, False)
+    return connections
+
+
+async def heartbeat(user_id):
+    ttl = settings.PRESENCE_TTL
+    refreshed = await cache.atouch(online_key(user_id), ttl)
+    await cache.atouch(connections_key(user_id), ttl)
+    if not refreshed:
+        # The key expired (e.g. a long pause); the socket is still there.
+        await user_connected(user_id)
+
+
+class UserStatusSync:
+    """
+    Batches presence changes into ``UserStatus`` updates.
+
+    Transitions are recorded in memory and written every
+    ``PRESENCE_SYNC_INTERVAL`` seconds with one UPDATE per state. Users this
+    process marked online whose presence key has since expired are written
+    as offline on the next sync.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changes = {}
+        self.online = set()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def mark(self, user_id, online):
+        with self.lock:
+            self.changes[user_id] = online
+            if self.thread is None or not self.thread.is_alive():
+                self.start()
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='presence-sync', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(settings.PRESENCE_SYNC_INTERVAL):
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Syncing user statuses failed.")
+            finally:
+                close_old_connections()
+
+    def sync(self):
+        with self.lock:
+            changes, self.changes = self.changes, {}
+            tracked = [user_id for user_id in self.online if user_id not in changes]
+
+        # Users whose presence expired without a disconnect (e.g. a crashed worker).
+        if tracked:
+            still_online = set(get_online_user_ids(tracked))
+            for user_id in tracked:
+                if user_id not in still_online:
+                    changes[user_id] = False
+
+        went_online = [user_id for user_id, online in changes.items() if online]
+        went_offline = [user_id for user_id, online in changes.items() if not online]
+        now = timezone.now()
+        if went_online:
+            UserStatus.objects.filter(user_id__in=went_online).update(is_online=True, last_active=now)
+        if went_offline:
+            UserStatus.objects.filter(user_id__in=went_offline).update(is_online=False, last_active=now)
+
+        with self.lock:
+            self.online.update(went_online)
+            self.online.difference_update(went_offline)
+        return len(changes)
+
+    def stop(self):
+        self.stopped.set()
+        self.sync()
+
+
+status_sync = UserStatusSync()
+
+
+@atexit.register
+def sync_on_shutdown():
+    try:
+        status_sync.stop()
+    except Exception:
+        logger.exception("Final user status sync failed.")
@@ -0,0 +1,161 @@
+"""
+Per-conversation sequence numbers and catch-up for reconnecting sockets.
+
+Every message gets ``seq``, one more than the previous message of its chat
+room or private chat. The counter lives in the cache (``message_seq:...``),
+which must be shared by all processes (see CACHES); when the entry is
+missing, e.g. evicted, it is recreated from the highest stored or buffered
+``seq``. (room, seq) and (chat, seq) are unique, so a seq handed out twice
+after such a reset is replaced when the message is written (see
+``realtime.writebehind``) instead of being stored twice.
+
+Clients remember the last ``seq`` they saw and pass it as ``resume_from``
+when they reconnect. The messages after it are replayed from an in-memory
+buffer of the latest ``MESSAGE_REPLAY_BUFFER_SIZE`` message events of each
+recently active conversation. If the buffer does not hold all of them
+(another process sent some, or the gap is older than the buffer), they
+are read from the database with one index range scan and put in the buffer,
+so the other sockets of a reconnect storm find them there. No more than
+``MESSAGE_REPLAY_LIMIT`` messages are replayed; clients told the replay is
+incomplete page the rest from the history endpoints.
+
+Messages of other processes that have not been flushed yet (see
+``realtime.writebehind``) can only be replayed by the process that sent
+them; that window is one flush interval.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from ..models import ChatMessage, PrivateMessage
+
+
+# message model -> message field naming the conversation
+CONVERSATION_FIELDS = {
+    ChatMessage: 'room',
+    PrivateMessage: 'chat',
+}
+
+
+def seq_key(model, conversation_id):
+    return f'message_seq:{model._meta.model_name}:{conversation_id}'
+
+
+def stored_max_seq(model, conversation_id):
+    field = CONVERSATION_FIELDS[model]
+    return model.objects.filter(**{f'{field}_id': conversation_id}).aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def start_seq(model, conversation_id):
+    """The value a recreated counter continues from."""
+    return max(stored_max_seq(model, conversation_id), buffers.last_seq(model, conversation_id))
+
+
+def next_seq(model, conversation_id):
+    key = seq_key(model, conversation_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, start_seq(model, conversation_id), None)
+        return cache.incr(key)
+
+
+async def anext_seq(model, conversation_id):
+    key = seq_key(model, conversation_id)
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, await sync_to_async(start_seq)(model, conversation_id), None)
+        return await cache.aincr(key)
+
+
+def current_seq(model, conversation_id):
+    seq = cache.get(seq_key(model, conversation_id))
+    return seq if seq is not None else start_seq(model, conversation_id)
+
+
+class ReplayBuffers:
+    """
+    The latest message events of the most recently active conversations,
+    kept sorted by ``seq``. Shared by the event loop and request threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conversations = OrderedDict()  # (model, id) -> (seqs, events)
+
+    def add(self, model, conversation_id, events):
+        size = settings.MESSAGE_REPLAY_BUFFER_SIZE
+        with self.lock:
+            key = (model, conversation_id)
+            seqs, buffered = self.conversations.get(key) or ([], [])
+            for event in events:
+                index = bisect.bisect_left(seqs, event['seq'])
+                if index < len(seqs) and seqs[index] == event['seq']:
+                    continue
+                seqs.insert(index, event['seq'])
+                buffered.insert(index, event)
+            del seqs[:-size], buffered[:-size]
+
+            self.conversations[key] = (seqs, buffered)
+            self.conversations.move_to_end(key)
+            while len(self.conversations) > settings.MESSAGE_REPLAY_CONVERSATIONS:
+                self.conversations.popitem(last=False)
+
+    def after(self, model, conversation_id, seq):
+        with self.lock:
+            seqs, buffered = self.conversations.get((model, conversation_id)) or ([], [])
+            return buffered[bisect.bisect_right(seqs, seq):]
+
+    def last_seq(self, model, conversation_id):
+        with self.lock:
+            seqs, _ = self.conversations.get((model, conversation_id)) or ([], [])
+            return seqs[-1] if seqs else 0
+
+
+buffers = ReplayBuffers()
+
+
+def remember(event):
+    """Keep a ``chat_message`` event (see ``delivery.message_event``) for replay."""
+    if event.get('seq') is None:
+        return
+    if 'room_id' in event:
+        buffers.add(ChatMessage, event['room_id'], [event])
+    else:
+        buffers.add(PrivateMessage, event['chat_id'], [event])
+
+
+def get_missed(model, conversation_id, resume_from):
+    """
+    The message events of a conversation after ``resume_from``, oldest
+    first, with the latest ``seq`` and whether nothing was left out.
+    """
+    # delivery imports this module
+    from .delivery import message_event
+
+    latest = current_seq(model, conversation_id)
+    if resume_from >= latest:
+        return [], latest, True
+    limit = settings.MESSAGE_REPLAY_LIMIT
+    start = max(resume_from, latest - limit)
+
+    events = [event for event in buffers.after(model, conversation_id, start) if event['seq'] <= latest]
+    if [event['seq'] for event in events] != list(range(start + 1, latest + 1)):
+        field = CONVERSATION_FIELDS[model]
+        stored = model.objects.filter(
+            **{f'{field}_id': conversation_id, 'seq__gt': start, 'seq__lte': latest}
+        ).select_related('sender').order_by('seq')
+        found = {event['seq']: event for event in events}
+        for message in stored:
+            found.setdefault(message.seq, message_event(message, message.sender))
+        events = [found[seq] for seq in sorted(found)]
+        buffers.add(model, conversation_id, events)
+
+    complete = start == resume_from and len(events) == latest - start
+    return events, latest, complete
@@ -0,0 +1,133 @@
+"""
+Read positions, unread counters and last activity of conversations.
+
+Every member of a chat room and both users of a private chat have a
+``ReadState`` row. Writing messages bumps ``unread_count`` on the rows of
+the other participants and moves ``last_activity_at`` on all of them with a
+single UPDATE per conversation, and sets the conversation's
+``last_message``. Marking a conversation read moves ``last_read_message_id``
+forward, so unread counts never need a COUNT(*) over the message tables and
+the inbox never needs to look at messages other than the last ones.
+
+Message ids are time-ordered (see ``realtime.ids``), so "after the read
+position" is simply ``id > last_read_message_id``.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from ..models import ChatMessage, ChatRoom, PrivateChat, PrivateMessage, ReadState
+
+
+# message model -> (ReadState field, message field) naming the conversation
+CONVERSATION_FIELDS = {
+    ChatMessage: ('room', 'room'),
+    PrivateMessage: ('private_chat', 'chat'),
+}
+
+CONVERSATION_MODELS = {
+    ChatMessage: ChatRoom,
+    PrivateMessage: PrivateChat,
+}
+
+
+def record_messages(messages):
+    """
+    Count newly written ``messages`` (of one model) as unread for everyone in
+    their conversation except the sender and readers already past them, and
+    make the newest of them the conversation's last message.
+    """
+    if not messages:
+        return
+    model = type(messages[0])
+    state_field, message_field = CONVERSATION_FIELDS[model]
+    conversation_model = CONVERSATION_MODELS[model]
+
+    by_conversation = defaultdict(list)
+    for message in messages:
+        by_conversation[getattr(message, f'{message_field}_id')].append(message)
+
+    for conversation_id, batch in by_conversation.items():
+        increment = Value(0)
+        for message in batch:
+            increment = increment + Case(
+                When(Q(last_read_message_id__lt=message.id) & ~Q(user_id=message.sender_id), then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        last = max(batch, key=lambda message: message.id)
+        ReadState.objects.filter(**{f'{state_field}_id': conversation_id}).update(
+            unread_count=F('unread_count') + increment,
+            last_activity_at=Greatest('last_activity_at', Value(last.timestamp))
+        )
+        # Batches from different processes may land out of order.
+        conversation_model.objects.filter(
+            Q(last_message__isnull=True) | Q(last_message_id__lt=last.id),
+            id=conversation_id
+        ).update(last_message_id=last.id, last_activity_at=last.timestamp)
+
+
+def latest_message_id(model, conversation_id):
+    _, message_field = CONVERSATION_FIELDS[model]
+    return model.objects.filter(
+        **{f'{message_field}_id': conversation_id}
+    ).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def add_readers(model, conversation_id, user_ids):
+    """Create read states for new participants; earlier history counts as read."""
+    state_field, _ = CONVERSATION_FIELDS[model]
+    last_read, last_activity_at = CONVERSATION_MODELS[model].objects.filter(
+        id=conversation_id
+    ).values_list('last_message_id', 'last_activity_at').first() or (None, None)
+    last_read = last_read or 0
+    last_activity_at = last_activity_at or timezone.now()
+    ReadState.objects.bulk_create(
+        [
+            ReadState(
+                user_id=user_id,
+                last_read_message_id=last_read,
+                last_activity_at=last_activity_at,
+                **{f'{state_field}_id': conversation_id}
+            )
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True
+    )
+
+
+def mark_read(user, model, conversation_id, message_id=None):
+    """
+    Move ``user``'s read position in a conversation up to ``message_id``
+    (default: the latest stored message) and recompute the unread count
+    from there. Returns the updated ``ReadState`` or None if the user has
+    none for that conversation.
+    """
+    state_field, message_field = CONVERSATION_FIELDS[model]
+    with transaction.atomic():
+        state = ReadState.objects.select_for_update().filter(
+            user=user, **{f'{state_field}_id': conversation_id}
+        ).first()
+        if state is None:
+            return None
+
+        if message_id is None:
+            unread = 0
+            message_id = latest_message_id(model, conversation_id)
+        else:
+            unread = None
+
+        last_read = max(state.last_read_message_id, message_id)
+        if unread is None:
+            # Only the messages after the new position are counted.
+            unread = model.objects.filter(
+                id__gt=last_read, **{f'{message_field}_id': conversation_id}
+            ).exclude(sender=user).count()
+
+        state.last_read_message_id = last_read
+        state.unread_count = unread
+        state.save(update_fields=['last_read_message_id', 'unread_count', 'updated_at'])
+    return state
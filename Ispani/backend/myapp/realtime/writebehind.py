@@ -0,0 +1,225 @@
+"""
+Write-behind persistence for chat messages.
+
+Consumers build message instances with their id and timestamp already set
+(see ``realtime.ids``), broadcast them straight away and hand them to a
+``MessageWriteBehind`` buffer. A background thread inserts the buffer with
+``bulk_create`` once it holds ``MESSAGE_WRITE_BATCH_SIZE`` messages or the
+oldest one has waited ``MESSAGE_WRITE_FLUSH_INTERVAL`` seconds, whichever
+comes first, so the database is off the latency path of every frame. The
+unread counters of each batch are updated in the same transaction.
+
+On a graceful shutdown the remaining buffer is flushed from an ``atexit``
+hook. Failed batches are put back and retried after a delay that doubles
+with each consecutive failure, up to ``MESSAGE_WRITE_MAX_BACKOFF`` seconds;
+a batch rejected by an integrity error is retried row by row. While the
+database is unreachable the buffer holds at most
+``MESSAGE_WRITE_BUFFER_LIMIT`` messages; ``add`` raises BufferFull beyond
+that, so senders are told their message was not taken. A message whose id
+or ``seq`` turns out to be taken is given a new one rather than lost
+(clients keep what it was broadcast with until they reload the history);
+only messages whose conversation was deleted meanwhile are dropped.
+
+Messages become visible to the REST history endpoints once flushed, i.e. at
+most one flush interval after they were broadcast.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from ..models import ChatMessage, PrivateMessage
+from .ids import next_message_id
+from .replay import CONVERSATION_FIELDS, next_seq
+from .unread import record_messages
+
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """The buffer is at its limit; the message was not queued."""
+
+
+class MessageWriteBehind:
+    def __init__(self, model, batch_size=None, flush_interval=None, buffer_limit=None):
+        self.model = model
+        self.batch_size = batch_size or settings.MESSAGE_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.MESSAGE_WRITE_FLUSH_INTERVAL
+        self.buffer_limit = buffer_limit or settings.MESSAGE_WRITE_BUFFER_LIMIT
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.buffer = []  # (enqueued_at, instance)
+        self.thread = None
+        self.stopping = False
+        # Consecutive failed flushes, and when the next attempt is due.
+        self.failures = 0
+        self.retry_at = 0.0
+        self.metrics = {
+            'pending': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'reassigned': 0,
+            'rejected': 0,
+            'failed_flushes': 0,
+            'last_flush_lag': 0.0,
+            'max_flush_lag': 0.0,
+        }
+
+    def add(self, instance):
+        with self.condition:
+            if len(self.buffer) >= self.buffer_limit:
+                self.metrics['rejected'] += 1
+                raise BufferFull
+            self.buffer.append((time.monotonic(), instance))
+            self.metrics['pending'] = len(self.buffer)
+            if self.thread is None or not self.thread.is_alive():
+                self.start()
+            if len(self.buffer) >= self.batch_size:
+                self.condition.notify()
+
+    def start(self):
+        self.stopping = False
+        self.thread = threading.Thread(
+            target=self.run,
+            name=f'{self.model._meta.model_name}-write-behind',
+            daemon=True
+        )
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopping and not self.is_due():
+                    timeout = self.flush_interval
+                    if self.buffer:
+                        now = time.monotonic()
+                        timeout = max(self.flush_interval - (now - self.buffer[0][0]), self.retry_at - now, 0)
+                    self.condition.wait(timeout)
+                if self.stopping:
+                    return
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def is_due(self):
+        if not self.buffer or time.monotonic() < self.retry_at:
+            return False
+        return (
+            len(self.buffer) >= self.batch_size or
+            time.monotonic() - self.buffer[0][0] >= self.flush_interval
+        )
+
+    def flush(self):
+        """Insert everything buffered so far. Safe to call from any thread."""
+        with self.flush_lock:
+            with self.condition:
+                batch, self.buffer = self.buffer, []
+            if not batch:
+                return 0
+
+            try:
+                # Rows and unread counters are written together.
+                with transaction.atomic():
+                    instances = [instance for _, instance in batch]
+                    self.model.objects.bulk_create(instances, batch_size=self.batch_size)
+                    record_messages(instances)
+            except IntegrityError:
+                self.insert_one_by_one(batch)
+            except Exception:
+                self.failures += 1
+                delay = min(self.flush_interval * 2 ** self.failures, settings.MESSAGE_WRITE_MAX_BACKOFF)
+                logger.exception(
+                    "Flushing %d %s rows failed; retrying in %.1fs.", len(batch), self.model.__name__, delay
+                )
+                self.metrics['failed_flushes'] += 1
+                with self.condition:
+                    self.retry_at = time.monotonic() + delay
+                    self.buffer[:0] = batch
+                    self.metrics['pending'] = len(self.buffer)
+                return 0
+
+            self.failures = 0
+            self.retry_at = 0.0
+            self.record_flush(batch)
+            return len(batch)
+
+    def insert_one_by_one(self, batch):
+        for enqueued_at, instance in batch:
+            while not self.insert(instance):
+                if not self.resolve_conflict(instance):
+                    logger.warning("Dropping %s %s after an integrity error.", self.model.__name__, instance.pk)
+                    self.metrics['dropped'] += 1
+                    break
+
+    def insert(self, instance):
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create([instance])
+                record_messages([instance])
+        except IntegrityError:
+            return False
+        return True
+
+    def resolve_conflict(self, instance):
+        """
+        Fix what made ``instance`` fail to insert, if it can be fixed; returns
+        whether to try again.
+        """
+        if self.model.objects.filter(pk=instance.pk).exists():
+            taken, instance.pk = instance.pk, next_message_id()
+            logger.warning("%s id %s was taken; storing it as %s.", self.model.__name__, taken, instance.pk)
+            self.metrics['reassigned'] += 1
+            return True
+
+        conversation_id = getattr(instance, f'{CONVERSATION_FIELDS[self.model]}_id')
+        conversation = {f'{CONVERSATION_FIELDS[self.model]}_id': conversation_id}
+        if instance.seq is not None and self.model.objects.filter(**conversation, seq=instance.seq).exists():
+            taken, instance.seq = instance.seq, next_seq(self.model, conversation_id)
+            logger.warning("%s seq %s was taken; storing it as %s.", self.model.__name__, taken, instance.seq)
+            self.metrics['reassigned'] += 1
+            return True
+        return False
+
+    def record_flush(self, batch):
+        lag = time.monotonic() - batch[0][0]
+        self.metrics['flushed'] += len(batch)
+        self.metrics['last_flush_lag'] = lag
+        self.metrics['max_flush_lag'] = max(self.metrics['max_flush_lag'], lag)
+        with self.condition:
+            self.metrics['pending'] = len(self.buffer)
+        if lag > self.flush_interval * 10:
+            logger.warning("%s write-behind is lagging %.2fs behind.", self.model.__name__, lag)
+
+    def stop(self):
+        """Stop the flusher thread and persist whatever is still buffered."""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval * 4)
+        self.flush()
+
+
+chat_messages = MessageWriteBehind(ChatMessage)
+private_messages = MessageWriteBehind(PrivateMessage)
+
+
+def get_write_behind_metrics():
+    return {
+        'chat_messages': dict(chat_messages.metrics),
+        'private_messages': dict(private_messages.metrics),
+    }
+
+
+@atexit.register
+def flush_on_shutdown():
+    for writer in (chat_messages, private_messages):
+        try:
+            writer.stop()
+        except Exception:
+            logger.exception("Final flush of %s messages failed.", writer.model.__name__)
@@ -0,0 +1,173 @@
+"""
+Event recommendations.
+
+Every user has an interest vector over event types, tags and hobby words,
+built from the events they attended and their ``StudentProfile.hobbies``.
+Upcoming public events are kept as one sparse feature matrix per process, so
+ranking all of them for a user is a single matrix-vector product. The matrix
+is rebuilt when events or their tags change, not on every RSVP. The ranked
+ids are cached per user and dropped when that user's participation or profile
+changes (see ``myapp.signals``).
+"""
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from scipy import sparse
+
+from .caching import get_event_candidates_version
+from .models import Event, EventParticipant, StudentProfile
+from .search.tokens import tokenize
+
+
+TYPE_WEIGHT = 1.0
+TAG_WEIGHT = 1.5
+HOBBY_WEIGHT = 1.0
+
+
+class CandidateIndex:
+    """Feature matrix of upcoming public events, one L2-normalised row per event."""
+
+    def __init__(self, event_ids, vocabulary, matrix, version):
+        self.event_ids = event_ids
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.version = version
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, version):
+        now = timezone.now()
+        events = list(
+            Event.objects.filter(is_public=True, end_time__gt=now)
+            .order_by('start_time', 'id')
+            .values_list('id', 'event_type', 'title', 'description')
+        )
+        tags = defaultdict(list)
+        for event_id, name in Event.tags.through.objects.filter(
+            event_id__in=[event[0] for event in events]
+        ).values_list('event_id', 'eventtag__name'):
+            tags[event_id].append(name)
+
+        vocabulary = {}
+        rows, columns = [], []
+        for row, (event_id, event_type, title, description) in enumerate(events):
+            features = {f'type:{event_type}'}
+            features.update(f'tag:{name}' for name in tags[event_id])
+            features.update(f'word:{word}' for word in tokenize(f'{title} {description}'))
+            for feature in features:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(feature, len(vocabulary)))
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+            shape=(len(events), len(vocabulary))
+        )
+        norms = np.sqrt(np.asarray(matrix.sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        matrix = sparse.diags(1 / norms) @ matrix
+
+        return cls([event[0] for event in events], vocabulary, matrix.tocsr(), version)
+
+    def is_stale(self, version):
+        return (
+            version != self.version or
+            time.monotonic() - self.built_at > settings.RECOMMENDATION_CANDIDATES_TTL
+        )
+
+    def rank(self, interests, exclude=(), limit=None):
+        """Return candidate event ids ordered by score against ``interests``."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for feature, weight in interests.items():
+            column = self.vocabulary.get(feature)
+            if column is not None:
+                vector[column] = weight
+        if not vector.any():
+            return []
+
+        scores = self.matrix @ vector
+        # Stable sort keeps start_time order between equal scores.
+        order = np.argsort(-scores, kind='stable')
+        ranked = []
+        for row in order:
+            if scores[row] <= 0:
+                break
+            event_id = self.event_ids[row]
+            if event_id not in exclude:
+                ranked.append(event_id)
+                if limit and len(ranked) >= limit:
+                    break
+        return ranked
+
+
+_candidates = None
+
+
+def get_candidate_index():
+    global _candidates
+    version = get_event_candidates_version()
+    if _candidates is None or _candidates.is_stale(version):
+        _candidates = CandidateIndex.build(version)
+    return _candidates
+
+
+def build_interest_vector(user):
+    """
+    Feature weights for ``user``: event types and tags of past events they
+    went to (by frequency) plus the words in their hobbies.
+    """
+    interests = defaultdict(float)
+    past = EventParticipant.objects.filter(
+        user=user,
+        status='going',
+        event__end_time__lt=timezone.now()
+    ).values_list('event_id', 'event__event_type', 'event__tags__name')
+
+    seen_events = set()
+    for event_id, event_type, tag in past:
+        if event_id not in seen_events:
+            seen_events.add(event_id)
+            interests[f'type:{event_type}'] += TYPE_WEIGHT
+        if tag:
+            interests[f'tag:{tag}'] += TAG_WEIGHT
+
+    hobbies = StudentProfile.objects.filter(user=user).values_list('hobbies', flat=True).first()
+    for word in set(tokenize(hobbies)):
+        interests[f'word:{word}'] += HOBBY_WEIGHT
+
+    return dict(interests)
+
+
+def recommendations_cache_key(user_id):
+    return f'event_recommendations:{user_id}'
+
+
+def refresh_recommendations(user):
+    """Recompute and cache ``user``'s interest vector and ranked event ids."""
+    interests = build_interest_vector(user)
+    joined = set(EventParticipant.objects.filter(user=user).values_list('event_id', flat=True))
+    ranked = get_candidate_index().rank(
+        interests,
+        exclude=joined,
+        limit=settings.RECOMMENDATIONS_PER_USER
+    )
+    cache.set(
+        recommendations_cache_key(user.id),
+        {'interests': interests, 'event_ids': ranked},
+        settings.RECOMMENDATIONS_CACHE_TTL
+    )
+    return ranked
+
+
+def get_recommended_event_ids(user):
+    cached = cache.get(recommendations_cache_key(user.id))
+    if cached is not None:
+        return cached['event_ids']
+    return refresh_recommendations(user)
+
+
+def invalidate_recommendations(*user_ids):
+    cache.delete_many([recommendations_cache_key(user_id) for user_id in user_ids])
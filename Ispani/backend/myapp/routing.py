@@ -2,7 +2,8 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
-    re_path(r'ws/chat/(?P<group_id>\d+)/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'ws/chat/(?P<room_id>\d+)/$', consumers.ChatConsumer.as_asgi()),
     re_path(r'ws/private-chat/(?P<chat_id>\d+)/$',consumers.PrivateChatConsumer.as_asgi()),
+    re_path(r'ws/user/$', consumers.UserConsumer.as_asgi()),
     
 ]
\ No newline at end of file
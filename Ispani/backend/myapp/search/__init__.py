@@ -0,0 +1,67 @@
+"""
+Full-text search over events, groups and students.
+
+The backend is chosen with the ``SEARCH_BACKEND`` setting and kept current by
+the receivers in ``myapp.signals``; ``manage.py rebuild_search_index`` fills it
+from scratch.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, When
+from django.utils.module_loading import import_string
+
+from .documents import DOC_TYPES, get_document
+from .tokens import tokenize
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.SEARCH_BACKEND)()
+    return _backend
+
+
+def search(doc_type, query, limit=None, match_any=False):
+    """Return ids of ``doc_type`` objects matching ``query``, best match first."""
+    if limit is None:
+        limit = settings.SEARCH_MAX_RESULTS
+    return get_backend().search(doc_type, query, limit=limit, match_any=match_any)
+
+
+def filter_matches(queryset, doc_type, query, match_any=False):
+    """
+    Restrict ``queryset`` to every match of ``query``, uncapped and in the
+    queryset's own order, for search used as one filter among others.
+    """
+    return get_backend().filter(queryset, doc_type, query, match_any=match_any)
+
+
+def filter_ranked(queryset, doc_type, query, limit=None, match_any=False):
+    """Restrict ``queryset`` to search matches, ordered by relevance."""
+    ids = search(doc_type, query, limit=limit, match_any=match_any)
+    if not ids:
+        return queryset.none()
+    rank = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(pk__in=ids).order_by(rank)
+
+
+def update_index(doc_type, obj):
+    """Re-index ``obj`` (or drop it if no longer indexable) once the transaction commits."""
+    def update():
+        document = get_document(doc_type, obj)
+        if document is None:
+            get_backend().remove(doc_type, obj.pk)
+        else:
+            get_backend().index(doc_type, obj.pk, document)
+
+    transaction.on_commit(update)
+
+
+def remove_from_index(doc_type, object_id):
+    transaction.on_commit(lambda: get_backend().remove(doc_type, object_id))
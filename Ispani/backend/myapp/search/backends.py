@@ -0,0 +1,214 @@
+import math
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .documents import DOC_TYPES, get_document, get_indexable_queryset
+from .tokens import tokenize
+
+
+class BaseSearchBackend:
+    """
+    Inverted index over the documents defined in ``search.documents``.
+
+    ``search`` returns object ids ordered by relevance. Every query term is
+    matched as a prefix; ``match_any`` ORs the terms instead of ANDing them.
+    """
+
+    def index(self, doc_type, object_id, document):
+        raise NotImplementedError
+
+    def remove(self, doc_type, object_id):
+        raise NotImplementedError
+
+    def search(self, doc_type, query, limit=50, match_any=False):
+        raise NotImplementedError
+
+    def filter(self, queryset, doc_type, query, match_any=False):
+        """Restrict ``queryset`` to every match of ``query``, keeping its order."""
+        return queryset.filter(pk__in=self.search(doc_type, query, limit=None, match_any=match_any))
+
+    def clear(self, doc_type):
+        raise NotImplementedError
+
+    def rebuild(self, doc_type, batch_size=500):
+        self.clear(doc_type)
+        count = 0
+        for obj in get_indexable_queryset(doc_type).iterator(chunk_size=batch_size):
+            document = get_document(doc_type, obj)
+            if document is not None:
+                self.index(doc_type, obj.pk, document)
+                count += 1
+        return count
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index in the ``myapp_search_index`` virtual table, created by
+    migration 0007. Rows are ranked with bm25, weighting titles 10:1 over
+    bodies.
+    """
+    table = 'myapp_search_index'
+
+    def row_id(self, doc_type, object_id):
+        return int(object_id) * 16 + DOC_TYPES[doc_type]
+
+    def index(self, doc_type, object_id, document):
+        row_id = self.row_id(doc_type, object_id)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [row_id])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, doc_type, object_id, title, body) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [row_id, doc_type, object_id, document['title'] or '', document['body'] or '']
+            )
+
+    def remove(self, doc_type, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [self.row_id(doc_type, object_id)])
+
+    def clear(self, doc_type):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE doc_type = %s', [doc_type])
+
+    def match_expression(self, query, match_any):
+        terms = tokenize(query)
+        if not terms:
+            return None
+        operator = ' OR ' if match_any else ' '
+        return operator.join(f'"{term}"*' for term in terms)
+
+    def search(self, doc_type, query, limit=50, match_any=False):
+        match = self.match_expression(query, match_any)
+        if match is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT object_id FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND doc_type = %s '
+                f'ORDER BY bm25({self.table}, 0, 0, 10.0, 1.0) LIMIT %s',
+                [match, doc_type, limit]
+            )
+            return [int(row[0]) for row in cursor.fetchall()]
+
+    def filter(self, queryset, doc_type, query, match_any=False):
+        # A subquery, so the database applies the queryset's other filters
+        # to every match rather than to a capped list of ids.
+        match = self.match_expression(query, match_any)
+        if match is None:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT object_id FROM {self.table} WHERE {self.table} MATCH %s AND doc_type = %s',
+            [match, doc_type]
+        ))
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    In-process inverted index with BM25 ranking, for databases without a
+    native full-text index. Each process builds its index from the database
+    on first use and keeps it current through the model signals, so changes
+    made by other processes only show up after a restart or ``rebuild``.
+    """
+    k1 = 1.2
+    b = 0.75
+    title_weight = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = defaultdict(lambda: defaultdict(dict))  # doc_type -> term -> {id: tf}
+        self.doc_terms = defaultdict(dict)  # doc_type -> id -> {term: tf}
+        self.doc_lengths = defaultdict(dict)  # doc_type -> id -> total tf
+        self.vocabulary = defaultdict(list)  # doc_type -> sorted terms
+        self.loaded = set()
+
+    def ensure_loaded(self, doc_type):
+        if doc_type not in self.loaded:
+            self.loaded.add(doc_type)
+            self.rebuild(doc_type)
+
+    def index(self, doc_type, object_id, document):
+        terms = defaultdict(int)
+        for term in tokenize(document['title']):
+            terms[term] += self.title_weight
+        for term in tokenize(document['body']):
+            terms[term] += 1
+
+        with self.lock:
+            self._remove(doc_type, object_id)
+            postings = self.postings[doc_type]
+            vocabulary = self.vocabulary[doc_type]
+            for term, tf in terms.items():
+                if term not in postings:
+                    vocabulary.insert(bisect_left(vocabulary, term), term)
+                postings[term][object_id] = tf
+            self.doc_terms[doc_type][object_id] = dict(terms)
+            self.doc_lengths[doc_type][object_id] = sum(terms.values())
+
+    def remove(self, doc_type, object_id):
+        with self.lock:
+            self._remove(doc_type, object_id)
+
+    def _remove(self, doc_type, object_id):
+        terms = self.doc_terms[doc_type].pop(object_id, None)
+        self.doc_lengths[doc_type].pop(object_id, None)
+        if not terms:
+            return
+        postings = self.postings[doc_type]
+        for term in terms:
+            postings[term].pop(object_id, None)
+            if not postings[term]:
+                del postings[term]
+                vocabulary = self.vocabulary[doc_type]
+                vocabulary.pop(bisect_left(vocabulary, term))
+
+    def clear(self, doc_type):
+        with self.lock:
+            self.postings.pop(doc_type, None)
+            self.doc_terms.pop(doc_type, None)
+            self.doc_lengths.pop(doc_type, None)
+            self.vocabulary.pop(doc_type, None)
+
+    def expand(self, doc_type, prefix):
+        vocabulary = self.vocabulary[doc_type]
+        start = bisect_left(vocabulary, prefix)
+        for term in vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, doc_type, query, limit=50, match_any=False):
+        self.ensure_loaded(doc_type)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self.lock:
+            postings = self.postings[doc_type]
+            lengths = self.doc_lengths[doc_type]
+            total = len(lengths)
+            if not total:
+                return []
+            average_length = sum(lengths.values()) / total
+
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            for query_term in terms:
+                seen = set()
+                for term in self.expand(doc_type, query_term):
+                    term_postings = postings[term]
+                    idf = math.log(1 + (total - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                    for object_id, tf in term_postings.items():
+                        norm = tf + self.k1 * (1 - self.b + self.b * lengths[object_id] / average_length)
+                        scores[object_id] += idf * tf * (self.k1 + 1) / norm
+                        seen.add(object_id)
+                for object_id in seen:
+                    matched[object_id] += 1
+
+        if not match_any:
+            scores = {object_id: score for object_id, score in scores.items() if matched[object_id] == len(terms)}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [object_id for object_id, score in ranked[:limit]]
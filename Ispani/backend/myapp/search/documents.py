@@ -0,0 +1,64 @@
+"""
+What gets indexed for each searchable model.
+
+Every document has a ``title`` (ranked higher) and a ``body``. Each doc type
+has a small integer code so backends can derive a stable row id from
+``(doc_type, object_id)``.
+"""
+from ..models import CustomUser, Event, Group
+
+
+DOC_TYPES = {
+    'event': 1,
+    'group': 2,
+    'student': 3,
+}
+
+
+def event_document(event):
+    tags = ' '.join(tag.name for tag in event.tags.all())
+    return {
+        'title': event.title,
+        'body': ' '.join(filter(None, [event.description, event.location, tags])),
+    }
+
+
+def group_document(group):
+    return {
+        'title': group.name,
+        'body': ' '.join(filter(None, [group.description, group.course, group.hobbies])),
+    }
+
+
+def student_document(user):
+    profile = getattr(user, 'student_profile', None)
+    body = ''
+    if profile is not None:
+        body = ' '.join(filter(None, [profile.course, profile.hobbies]))
+    return {
+        'title': user.username,
+        'body': body,
+    }
+
+
+def get_document(doc_type, obj):
+    """Return the document for ``obj``, or None if it should not be indexed."""
+    if doc_type == 'event':
+        return event_document(obj)
+    if doc_type == 'group':
+        return group_document(obj)
+    if doc_type == 'student':
+        if obj.role != 'student':
+            return None
+        return student_document(obj)
+    raise ValueError(f"Unknown search document type: {doc_type}")
+
+
+def get_indexable_queryset(doc_type):
+    if doc_type == 'event':
+        return Event.objects.prefetch_related('tags')
+    if doc_type == 'group':
+        return Group.objects.all()
+    if doc_type == 'student':
+        return CustomUser.objects.filter(role='student').select_related('student_profile')
+    raise ValueError(f"Unknown search document type: {doc_type}")
@@ -0,0 +1,11 @@
+import re
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split free text into lowercase word tokens."""
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
@@ -10,12 +10,12 @@ from django.contrib.auth.hashers import make_password
 class StudentProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = StudentProfile
-        fields = ['year_of_study', 'course', 'hobbies', 'piece_jobs', 'communication_preference']
+        fields = ['year_of_study', 'course', 'hobbies', 'piece_jobs']
 
 class TutorProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = TutorProfile
-        fields = ['subject_expertise', 'hourly_rate', 'qualifications', 'availability', 'verification_status']
+        fields = ['subject_expertise', 'hourly_rate', 'qualifications', 'verification_status']
 
 class UserStatusSerializer(serializers.ModelSerializer):
     class Meta:
@@ -32,6 +32,21 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'role', 'student_profile', 'tutor_profile', 'status']
         extra_kwargs = {'password': {'write_only': True}}
 
+class StudentMatchSerializer(serializers.ModelSerializer):
+    """A similar student: their profile essentials and how similar they are (0 to 1)."""
+    course = serializers.CharField(source='student_profile.course', read_only=True)
+    year_of_study = serializers.IntegerField(source='student_profile.year_of_study', read_only=True)
+    institution = serializers.CharField(source='student_profile.institution', read_only=True)
+    hobbies = serializers.CharField(source='student_profile.hobbies', read_only=True)
+    similarity = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'course', 'year_of_study', 'institution', 'hobbies', 'similarity']
+
+    def get_similarity(self, obj):
+        return round(self.context['similarity'][obj.id], 3)
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     student_profile = StudentProfileSerializer(required=False)
     tutor_profile = TutorProfileSerializer(required=False)
@@ -52,7 +67,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = CustomUser.objects.create(**validated_data)
         
         if user.role == 'student' and student_profile_data:
-            StudentProfile.objects.create(user=user, **student_profile_data)
+            # The profile itself is created by a post_save receiver on the user.
+            StudentProfile.objects.update_or_create(user=user, defaults=student_profile_data)
         elif user.role == 'tutor' and tutor_profile_data:
             TutorProfile.objects.create(user=user, **tutor_profile_data)
         
@@ -1,7 +1,6 @@
 from django.utils.crypto import get_random_string
-from stripe import Event
 from . import serializers
-from ..models import EventComment, EventMedia, EventParticipant, EventTag
+from ..models import Event, EventComment, EventMedia, EventParticipant, EventTag
 from .authentication import UserSerializer
 
 
@@ -15,7 +14,8 @@ class EventMediaSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = EventMedia
-        fields = ['id', 'file', 'media_type', 'title', 'uploaded_by', 'uploaded_at']
+        fields = ['id', 'file', 'thumbnail', 'preview', 'media_type', 'title', 'uploaded_by', 'uploaded_at']
+        read_only_fields = ['thumbnail', 'preview']
 
 class EventCommentSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
@@ -36,7 +36,6 @@ class EventParticipantSerializer(serializers.ModelSerializer):
 
 class EventSerializer(serializers.ModelSerializer):
     creator = UserSerializer(read_only=True)
-    participants_count = serializers.SerializerMethodField()
     is_creator = serializers.SerializerMethodField()
     user_status = serializers.SerializerMethodField()
     tags = EventTagSerializer(many=True, read_only=True)
@@ -53,16 +52,18 @@ class EventSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['creator', 'created_at', 'updated_at', 'invite_link']
     
-    def get_participants_count(self, obj):
-        return obj.participants.filter(status='going').count()
-    
     def get_is_creator(self, obj):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
-            return obj.creator == request.user
+            return obj.creator_id == request.user.id
         return False
     
     def get_user_status(self, obj):
+        # Prefetched for the whole page by get_event_list_context()
+        statuses = self.context.get('participation_statuses')
+        if statuses is not None:
+            return statuses.get(obj.id)
+
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
             try:
@@ -82,10 +83,11 @@ class EventSerializer(serializers.ModelSerializer):
         event = Event.objects.create(
             creator=request.user,
             invite_link=invite_link,
+            participants_count=1,
             **validated_data
         )
         
-        # Add creator as organizer
+        # Add creator as organizer, the one participant counted above
         EventParticipant.objects.create(
             event=event,
             user=request.user,
@@ -117,6 +119,21 @@ class EventSerializer(serializers.ModelSerializer):
                 
         return instance
 
+def get_event_list_context(request, events):
+    """
+    Serializer context for a list of events, with the requesting user's
+    participation status for every event loaded in a single query.
+    """
+    statuses = {}
+    if request.user.is_authenticated and events:
+        statuses = dict(
+            EventParticipant.objects.filter(
+                user=request.user,
+                event_id__in=[event.id for event in events]
+            ).values_list('event_id', 'status')
+        )
+    return {'request': request, 'participation_statuses': statuses}
+
 class EventDetailSerializer(EventSerializer):
     participants = EventParticipantSerializer(many=True, read_only=True)
     comments = EventCommentSerializer(many=True, read_only=True)
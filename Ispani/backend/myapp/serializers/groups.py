@@ -13,16 +13,21 @@ class GroupMembershipSerializer(serializers.ModelSerializer):
 
 class GroupSerializer(serializers.ModelSerializer):
     admin = UserSerializer(read_only=True)
-    member_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Group
         fields = ['id', 'name', 'description', 'group_type', 'course', 
                  'year_of_study', 'hobbies', 'admin', 'created_at', 
                  'invite_link', 'member_count']
-    
-    def get_member_count(self, obj):
-        return obj.members.count()
+
+class GroupListSerializer(serializers.ModelSerializer):
+    """Discovery listings: the group alone, without its admin's profile or invite link."""
+
+    class Meta:
+        model = Group
+        fields = ['id', 'name', 'description', 'group_type', 'course',
+                  'year_of_study', 'hobbies', 'admin', 'created_at', 'member_count']
+        read_only_fields = fields
 
 class JoinGroupSerializer(serializers.Serializer):
     group_id = serializers.IntegerField()
\ No newline at end of file
@@ -0,0 +1,17 @@
+from django.conf import settings
+from rest_framework import serializers
+from ..models import Upload
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    is_complete = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Upload
+        fields = ['id', 'filename', 'content_type', 'size', 'received', 'content_hash', 'is_complete', 'created_at']
+        read_only_fields = ['received', 'content_hash', 'created_at']
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes.")
+        return value
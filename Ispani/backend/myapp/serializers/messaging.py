@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from ..models import ChatMessage, MessageAttachment,ChatRoom,PrivateChat,PrivateMessage
+from ..models import ChatMessage, MessageAttachment,ChatRoom,PrivateChat,PrivateMessage,ReadState
 from ..serializers import UserSerializer
 from django.utils.crypto import get_random_string
 from django.contrib.auth.hashers import make_password
@@ -14,15 +14,18 @@ class ChatRoomSerializer(serializers.ModelSerializer):
 class MessageAttachmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = MessageAttachment
-        fields = ['id', 'file', 'attachment_type', 'thumbnail']
+        fields = ['id', 'file', 'attachment_type', 'thumbnail', 'preview']
+        read_only_fields = ['thumbnail', 'preview']
 
 class ChatMessageSerializer(serializers.ModelSerializer):
+    # Message ids exceed 2**53, which JavaScript numbers cannot hold.
+    id = serializers.CharField(read_only=True)
     sender = UserSerializer(read_only=True)
     attachments = MessageAttachmentSerializer(many=True, read_only=True)
 
     class Meta:
         model = ChatMessage
-        fields = ['id', 'room', 'sender', 'content', 'attachments', 'timestamp']
+        fields = ['id', 'seq', 'room', 'sender', 'content', 'attachments', 'timestamp']
         read_only_fields = ['sender', 'timestamp']
 
 class PrivateChatSerializer(serializers.ModelSerializer):
@@ -34,9 +37,55 @@ class PrivateChatSerializer(serializers.ModelSerializer):
         fields = ['id', 'user1', 'user2', 'created_at']
 
 class PrivateMessageSerializer(serializers.ModelSerializer):
+    id = serializers.CharField(read_only=True)
     sender = UserSerializer(read_only=True)
 
     class Meta:
         model = PrivateMessage
-        fields = ['id', 'chat', 'sender', 'content', 'timestamp']
+        fields = ['id', 'seq', 'chat', 'sender', 'content', 'timestamp']
         read_only_fields = ['sender', 'timestamp']
+
+class ReadStateSerializer(serializers.ModelSerializer):
+    last_read_message_id = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = ReadState
+        fields = ['room', 'private_chat', 'last_read_message_id', 'unread_count']
+
+class InboxSerializer(serializers.ModelSerializer):
+    """One conversation in a user's inbox, built from their ReadState row."""
+    PREVIEW_LENGTH = 100
+
+    conversation_type = serializers.SerializerMethodField()
+    conversation_id = serializers.SerializerMethodField()
+    name = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReadState
+        fields = ['conversation_type', 'conversation_id', 'name', 'last_message', 'unread_count', 'last_activity_at']
+
+    def get_conversation_type(self, obj):
+        return 'room' if obj.room_id else 'private'
+
+    def get_conversation_id(self, obj):
+        return obj.room_id or obj.private_chat_id
+
+    def get_name(self, obj):
+        if obj.room_id:
+            return obj.room.name
+        chat = obj.private_chat
+        other = chat.user2 if chat.user1_id == obj.user_id else chat.user1
+        return other.username
+
+    def get_last_message(self, obj):
+        conversation = obj.room if obj.room_id else obj.private_chat
+        message = conversation.last_message
+        if message is None:
+            return None
+        return {
+            'id': str(message.id),
+            'sender': message.sender.username,
+            'preview': message.content[:self.PREVIEW_LENGTH],
+            'timestamp': message.timestamp,
+        }
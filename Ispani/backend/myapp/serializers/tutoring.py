@@ -1,37 +1,12 @@
 from rest_framework import serializers
 from django.utils import timezone
 from .authentication import UserSerializer
+from ..counters import Full, join_group_session
 from ..models import (
     CustomUser, ExternalCalendarConnection, MeetingProvider,CalendlyEvent,
-    Booking,GroupSessionParticipant,Payment, StudentProfile,TutorAvailability, TutorProfile, UserStatus
+    Booking,GroupSessionParticipant,Payment,TutorAvailability
 )
 
-class UserStatusSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = UserStatus
-        fields = ['is_online', 'last_active', 'status_message']
-
-class StudentProfileSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = StudentProfile
-        fields = ['year_of_study', 'course', 'hobbies', 'piece_jobs', 'communication_preference']
-
-class TutorProfileSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = TutorProfile
-        fields = ['subject_expertise', 'hourly_rate', 'qualifications', 'availability', 'verification_status']
-
-class UserSerializer(serializers.ModelSerializer):
-    student_profile = StudentProfileSerializer(required=False)
-    tutor_profile = TutorProfileSerializer(required=False)
-    status = UserStatusSerializer(read_only=True)
-
-    class Meta:
-        model = CustomUser
-        fields = ['id', 'username', 'email', 'role', 'student_profile', 'tutor_profile', 'status']
-        extra_kwargs = {'password': {'write_only': True}}
-
-
 class TutorAvailabilitySerializer(serializers.ModelSerializer):
     tutor = UserSerializer(read_only=True)
     is_available = serializers.SerializerMethodField()
@@ -87,8 +62,8 @@ class BookingSerializer(serializers.ModelSerializer):
                   'notes', 'status', 'booking_source', 'meeting_link', 'price', 
                   'duration_minutes', 'is_group_session', 'max_participants', 
                   'current_participants', 'participants', 'has_paid',
-                  'created_at', 'updated_at']
-        read_only_fields = ['id', 'meeting_link', 'created_at', 'updated_at']
+                  'created_at']
+        read_only_fields = ['id', 'meeting_link', 'current_participants', 'created_at']
     
     def get_student_name(self, obj):
         return obj.student.username
@@ -161,17 +136,8 @@ class JoinGroupSessionSerializer(serializers.Serializer):
             raise serializers.ValidationError("Group session not found")
     
     def save(self):
-        user = self.context['request'].user
-        booking = self.booking
-        
-        # Create participant entry
-        participant, created = GroupSessionParticipant.objects.get_or_create(
-            booking=booking,
-            student=user
-        )
-        
-        if created:
-            booking.current_participants += 1
-            booking.save()
-        
-        return participant
\ No newline at end of file
+        try:
+            return join_group_session(self.booking, self.context['request'].user)
+        except Full:
+            # Filled up since validation.
+            raise serializers.ValidationError({'booking_id': "This group session is already full"})
\ No newline at end of file
@@ -0,0 +1,194 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import invalidate_event_candidates, invalidate_event_feeds
+from .models import (
+    ChatMessage, ChatRoom, CustomUser, Event, EventMedia, EventParticipant,
+    Group, GroupHobby, GroupMembership, MessageAttachment, PrivateChat, PrivateMessage,
+    ReadState, StudentProfile,
+)
+from .matching import invalidate_similar_students
+from .media.blobs import acquire_blob, release_blob
+from .membership import assignment_queue, invalidate_memberships
+from .realtime.delivery import invalidate_room_members
+from .realtime.unread import add_readers, record_messages
+from .recommendations import invalidate_recommendations
+from .search import remove_from_index, update_index
+from .search.tokens import tokenize
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventParticipant)
+@receiver(post_delete, sender=EventParticipant)
+@receiver(m2m_changed, sender=Event.tags.through)
+def invalidate_event_feeds_on_change(sender, **kwargs):
+    invalidate_event_feeds()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(m2m_changed, sender=Event.tags.through)
+def invalidate_event_candidates_on_change(sender, **kwargs):
+    invalidate_event_candidates()
+
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, **kwargs):
+    update_index('event', instance)
+
+
+@receiver(m2m_changed, sender=Event.tags.through)
+def index_event_tags(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Event):
+        update_index('event', instance)
+
+
+@receiver(post_save, sender=Group)
+def index_group(sender, instance, **kwargs):
+    update_index('group', instance)
+
+
+@receiver(post_save, sender=Group)
+def sync_group_hobbies(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'hobbies' not in update_fields:
+        return
+    tokens = set(tokenize(instance.hobbies))
+    if not created:
+        GroupHobby.objects.filter(group=instance).exclude(token__in=tokens).delete()
+    GroupHobby.objects.bulk_create(
+        [GroupHobby(group=instance, token=token) for token in tokens], ignore_conflicts=True
+    )
+
+
+@receiver(post_save, sender=CustomUser)
+def index_student(sender, instance, **kwargs):
+    update_index('student', instance)
+
+
+@receiver(post_save, sender=StudentProfile)
+def index_student_profile(sender, instance, **kwargs):
+    update_index('student', instance.user)
+
+
+@receiver(post_delete, sender=Event)
+def unindex_event(sender, instance, **kwargs):
+    remove_from_index('event', instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_group(sender, instance, **kwargs):
+    remove_from_index('group', instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def unindex_student(sender, instance, **kwargs):
+    remove_from_index('student', instance.pk)
+
+
+@receiver(post_save, sender=EventParticipant)
+@receiver(post_delete, sender=EventParticipant)
+def invalidate_participant_recommendations(sender, instance, **kwargs):
+    invalidate_recommendations(instance.user_id)
+
+
+@receiver(post_save, sender=StudentProfile)
+def invalidate_profile_recommendations(sender, instance, **kwargs):
+    invalidate_recommendations(instance.user_id)
+
+
+@receiver(post_save, sender=StudentProfile)
+def invalidate_profile_matches(sender, instance, **kwargs):
+    invalidate_similar_students(instance.user_id)
+
+
+@receiver(post_save, sender=StudentProfile)
+def assign_student_to_groups(sender, instance, **kwargs):
+    if instance.course and instance.year_of_study is not None:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: assignment_queue.add(user_id))
+
+
+@receiver(post_save, sender=ChatMessage)
+@receiver(post_save, sender=PrivateMessage)
+def count_unread_message(sender, instance, created, **kwargs):
+    # Messages from the WebSocket write-behind are bulk inserted and counted there.
+    if created:
+        record_messages([instance])
+
+
+@receiver(m2m_changed, sender=ChatRoom.members.through)
+def sync_room_read_states(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add':
+        if reverse:
+            for room_id in pk_set:
+                add_readers(ChatMessage, room_id, [instance.pk])
+        else:
+            add_readers(ChatMessage, instance.pk, pk_set)
+    elif action == 'post_remove':
+        if reverse:
+            ReadState.objects.filter(user=instance, room_id__in=pk_set).delete()
+        else:
+            ReadState.objects.filter(room=instance, user_id__in=pk_set).delete()
+    elif action == 'post_clear':
+        if reverse:
+            ReadState.objects.filter(user=instance, room__isnull=False).delete()
+        else:
+            ReadState.objects.filter(room=instance).delete()
+
+
+@receiver(m2m_changed, sender=ChatRoom.members.through)
+def invalidate_room_member_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        room_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear' and reverse:
+        # The user's rooms are unknown once the clear has happened.
+        room_ids = list(instance.chat_rooms.values_list('id', flat=True))
+    elif action == 'post_clear' and not reverse:
+        room_ids = [instance.pk]
+    else:
+        return
+    for room_id in room_ids:
+        invalidate_room_members(room_id)
+
+
+@receiver(post_save, sender=PrivateChat)
+def create_private_chat_read_states(sender, instance, created, **kwargs):
+    if created:
+        add_readers(PrivateMessage, instance.pk, [instance.user1_id, instance.user2_id])
+
+
+@receiver(pre_save, sender=MessageAttachment)
+@receiver(pre_save, sender=EventMedia)
+def reference_media_blob(sender, instance, **kwargs):
+    # Before the file field stores the file, so the collector cannot delete it in between.
+    if instance._state.adding:
+        acquire_blob(instance)
+
+
+@receiver(post_delete, sender=MessageAttachment)
+@receiver(post_delete, sender=EventMedia)
+def release_media_blob(sender, instance, **kwargs):
+    release_blob(instance)
+
+
+@receiver(post_save, sender=GroupMembership)
+@receiver(post_delete, sender=GroupMembership)
+@receiver(post_save, sender=EventParticipant)
+@receiver(post_delete, sender=EventParticipant)
+def invalidate_user_memberships(sender, instance, **kwargs):
+    invalidate_memberships(instance.user_id)
+
+
+@receiver(m2m_changed, sender=ChatRoom.members.through)
+@receiver(m2m_changed, sender=Group.members.through)
+def invalidate_member_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        user_ids = [instance.pk] if reverse else pk_set
+    elif action == 'pre_clear':
+        # The members are unknown once the clear has happened.
+        user_ids = [instance.pk] if reverse else list(instance.members.values_list('id', flat=True))
+    else:
+        return
+    invalidate_memberships(*user_ids)
@@ -0,0 +1,88 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..membership import AssignmentQueue, assign_students, assignment_queue
+from ..models import CustomUser, Group, GroupMembership, StudentProfile
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class StudyGroupAssignmentTests(TestCase):
+
+    def setUp(self):
+        admin = CustomUser.objects.create(username='admin', email='admin@example.com')
+        self.maths_1, self.maths_1_tutorials, self.maths_2, self.physics_1 = [
+            Group.objects.create(
+                name=f'{course} {year}', group_type='study', course=course, year_of_study=year, admin=admin
+            )
+            for course, year in [('Maths', 1), ('Maths', 1), ('Maths', 2), ('Physics', 1)]
+        ]
+
+    def create_student(self, name, course, year_of_study):
+        # Profiles start empty; assignment is left to the tests.
+        with mock.patch.object(assignment_queue, 'add'):
+            user = CustomUser.objects.create(username=name, email=f'{name}@example.com', role='student')
+            StudentProfile.objects.filter(user=user).update(course=course, year_of_study=year_of_study)
+        return user
+
+    def group_ids(self, user):
+        return set(GroupMembership.objects.filter(user=user).values_list('group_id', flat=True))
+
+    def test_students_join_every_group_of_their_course_and_year(self):
+        ada = self.create_student('ada', 'Maths', 1)
+        bob = self.create_student('bob', 'Physics', 1)
+        eve = self.create_student('eve', 'History', 1)
+
+        assign_students(StudentProfile.objects.all())
+        assign_students(StudentProfile.objects.all())
+
+        self.assertEqual(self.group_ids(ada), {self.maths_1.id, self.maths_1_tutorials.id})
+        self.assertEqual(self.group_ids(bob), {self.physics_1.id})
+        self.assertEqual(self.group_ids(eve), set())
+        self.maths_1.refresh_from_db()
+        self.assertEqual(self.maths_1.member_count, 1)
+
+    def test_saved_profiles_are_queued_after_commit(self):
+        user = self.create_student('ada', '', None)
+        profile = user.student_profile
+        with mock.patch.object(assignment_queue, 'add') as add:
+            with self.captureOnCommitCallbacks(execute=True):
+                profile.course, profile.year_of_study = 'Maths', 2
+                profile.save()
+            add.assert_called_once_with(user.id)
+
+            # Without a course and year there is nothing to match.
+            with self.captureOnCommitCallbacks(execute=True):
+                profile.course = ''
+                profile.save()
+            add.assert_called_once()
+
+    def test_queue_assigns_pending_students_in_one_batch(self):
+        ada = self.create_student('ada', 'Maths', 2)
+        bob = self.create_student('bob', 'Maths', 2)
+        queue = AssignmentQueue()
+        queue.pending.update({ada.id, bob.id})
+
+        # Profiles, groups and existing memberships, then one insert and one recount in a savepoint.
+        with self.assertNumQueries(7):
+            queue.flush()
+        self.assertEqual(set(self.maths_2.members.all()), {ada, bob})
+        self.assertEqual(queue.pending, set())
+
+    def test_failed_batches_are_logged(self):
+        queue = AssignmentQueue()
+        queue.pending.add(self.create_student('ada', 'Maths', 1).id)
+        with mock.patch('myapp.membership.assign_students', side_effect=RuntimeError), \
+                self.assertLogs('myapp.membership', 'ERROR'):
+            queue.flush()
+        self.assertEqual(queue.pending, set())
+
+    def test_command_assigns_existing_students(self):
+        students = [self.create_student(f'student{n}', 'Maths', 1) for n in range(3)]
+        output = StringIO()
+        call_command('assign_study_groups', batch_size=2, stdout=output)
+        self.assertIn('Assigned 3 students', output.getvalue())
+        self.assertEqual(set(self.maths_1.members.all()), set(students))
@@ -0,0 +1,87 @@
+import os
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..media.blobs import collect_garbage
+from ..media.storage import blob_storage
+from ..models import Blob, ChatMessage, ChatRoom, CustomUser, MessageAttachment
+from .utils import LOCAL_CACHE, MediaRootMixin
+
+
+@override_settings(CACHES=LOCAL_CACHE, MEDIA_GC_GRACE=60)
+class BlobTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = CustomUser.objects.create(username='sender', email='sender@example.com')
+        room = ChatRoom.objects.create(name='room')
+        self.message = ChatMessage.objects.create(room=room, sender=user, content='files')
+
+    def attach(self, data=b'same content'):
+        return MessageAttachment.objects.create(
+            message=self.message, file=ContentFile(data, name='notes.txt'), attachment_type='DOCUMENT'
+        )
+
+    def age(self, attachment):
+        """As if ``attachment``'s blob was stored and unreferenced long ago."""
+        old = timezone.now() - timedelta(days=1)
+        Blob.objects.update(unreferenced_at=old)
+        os.utime(blob_storage.path(attachment.file.name), (old.timestamp(), old.timestamp()))
+
+    def test_same_content_is_stored_once(self):
+        first, second = self.attach(), self.attach()
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.content_hash, second.content_hash)
+        blob = Blob.objects.get()
+        self.assertEqual((blob.refcount, blob.name), (2, first.file.name))
+
+    def test_deleting_rows_releases_references(self):
+        first, second = self.attach(), self.attach()
+        first.delete()
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertIsNone(Blob.objects.get().unreferenced_at)
+
+        second.delete()
+        blob = Blob.objects.get()
+        self.assertEqual(blob.refcount, 0)
+        self.assertIsNotNone(blob.unreferenced_at)
+
+    def test_unused_blob_is_collected_after_the_grace_period(self):
+        attachment = self.attach()
+        attachment.delete()
+        self.assertEqual(collect_garbage()['blobs'], 0)
+
+        self.age(attachment)
+        self.assertEqual(collect_garbage()['blobs'], 1)
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(blob_storage.exists(attachment.file.name))
+
+    def test_referenced_blob_is_kept(self):
+        attachment = self.attach()
+        self.age(attachment)
+
+        self.assertEqual(collect_garbage()['blobs'], 0)
+        self.assertTrue(blob_storage.exists(attachment.file.name))
+
+    def test_blob_referenced_again_is_kept(self):
+        first = self.attach()
+        first.delete()
+        self.age(first)
+        second = self.attach()
+
+        self.assertEqual(collect_garbage()['blobs'], 0)
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertTrue(blob_storage.exists(second.file.name))
+
+    def test_dry_run_deletes_nothing(self):
+        attachment = self.attach()
+        attachment.delete()
+        self.age(attachment)
+
+        self.assertEqual(collect_garbage(dry_run=True)['blobs'], 1)
+        self.assertTrue(Blob.objects.exists())
+        self.assertTrue(blob_storage.exists(attachment.file.name))
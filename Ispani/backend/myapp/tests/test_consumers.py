@@ -0,0 +1,86 @@
+from unittest import skipUnless
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TransactionTestCase, override_settings
+
+from ..models import ChatRoom, CustomUser
+from ..realtime import flow
+from ..realtime.codecs import CODECS
+from ..realtime.presence import status_sync
+from ..routing import websocket_urlpatterns
+from .utils import LOCAL_CACHE
+
+
+IN_MEMORY_CHANNEL_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYER)
+class UserSocketFrameTests(TransactionTestCase):
+
+    def setUp(self):
+        flow.sender_buckets.clear()
+        # Written while the test database still exists.
+        self.addCleanup(status_sync.sync)
+        self.user = CustomUser.objects.create(username='member', email='member@example.com')
+        self.room = ChatRoom.objects.create(name='room')
+        self.room.members.add(self.user)
+
+    async def connect(self, path='/ws/user/'):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_malformed_frames_get_an_error(self):
+        socket = await self.connect()
+        for frame in ('{not json', '[1, 2]', '"text"', '7'):
+            with self.subTest(frame=frame):
+                await socket.send_to(text_data=frame)
+                self.assertEqual(await socket.receive_json_from(), {'type': 'error', 'error': 'Malformed frame'})
+
+        # The socket is still usable.
+        await socket.send_json_to({'type': 'subscribe', 'stream': 1, 'topic': 'room', 'id': self.room.id})
+        self.assertEqual(await socket.receive_json_from(), {'stream': 1, 'type': 'subscribed'})
+        await socket.disconnect()
+
+    @skipUnless('msgpack' in CODECS, "msgpack is not installed")
+    async def test_malformed_binary_frames_get_an_error(self):
+        codec = CODECS['msgpack']
+        socket = await self.connect('/ws/user/?encoding=msgpack')
+        for frame in (b'\xc1\xff\x00', codec.encode([1, 2])):
+            await socket.send_to(bytes_data=frame)
+            response = codec.decode(bytes_data=await socket.receive_from())
+            self.assertEqual(response, {'type': 'error', 'error': 'Malformed frame'})
+        await socket.disconnect()
+
+    async def test_stream_ids_must_be_scalars(self):
+        socket = await self.connect()
+        for frame_type in ('subscribe', 'unsubscribe', 'message'):
+            with self.subTest(frame_type=frame_type):
+                await socket.send_json_to({'type': frame_type, 'stream': [1], 'topic': 'inbox', 'message': 'hi'})
+                self.assertEqual(
+                    await socket.receive_json_from(),
+                    {'stream': None, 'type': 'error', 'error': 'A stream id is required'}
+                )
+        await socket.disconnect()
+
+    async def test_messages_must_be_text(self):
+        socket = await self.connect()
+        await socket.send_json_to({'type': 'subscribe', 'stream': 'r', 'topic': 'room', 'id': self.room.id})
+        await socket.receive_json_from()
+        await socket.send_json_to({'type': 'message', 'stream': 'r', 'message': {'nested': True}})
+        self.assertEqual(
+            await socket.receive_json_from(), {'stream': 'r', 'type': 'error', 'error': 'Messages must be text'}
+        )
+        await socket.disconnect()
+
+    @override_settings(WS_RATE_LIMIT=0.01, WS_RATE_BURST=2)
+    async def test_malformed_frames_are_rate_limited(self):
+        socket = await self.connect()
+        for _ in range(3):
+            await socket.send_to(text_data='{not json')
+        errors = [(await socket.receive_json_from())['error'] for _ in range(3)]
+        self.assertEqual(errors, ['Malformed frame', 'Malformed frame', 'Rate limit exceeded'])
+        await socket.disconnect()
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..counters import Full, increment, set_participation
+from ..membership import add_members
+from ..models import CustomUser, Event, Group, GroupMembership
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class CounterTests(TestCase):
+
+    def setUp(self):
+        creator = CustomUser.objects.create(username='creator', email='creator@example.com')
+        self.users = [CustomUser.objects.create(username=f'u{n}', email=f'u{n}@example.com') for n in range(2)]
+        self.event = Event.objects.create(
+            title='Chess night', description='Bring a board', creator=creator, location='Library',
+            start_time=timezone.now() + timedelta(days=1), end_time=timezone.now() + timedelta(days=1, hours=2),
+            max_participants=1
+        )
+
+    def participants_count(self):
+        self.event.refresh_from_db()
+        return self.event.participants_count
+
+    def test_full_event_refuses_going(self):
+        set_participation(self.event, self.users[0], 'going')
+        with self.assertRaises(Full):
+            set_participation(self.event, self.users[1], 'going')
+        self.assertEqual(self.participants_count(), 1)
+        self.assertFalse(self.event.participants.filter(user=self.users[1]).exists())
+
+    def test_place_is_freed_when_no_longer_going(self):
+        set_participation(self.event, self.users[0], 'going')
+        set_participation(self.event, self.users[0], 'maybe')
+        self.assertEqual(self.participants_count(), 0)
+
+        set_participation(self.event, self.users[1], 'going')
+        self.assertEqual(self.participants_count(), 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class MemberCountTests(TestCase):
+
+    def setUp(self):
+        self.users = [CustomUser.objects.create(username=f'u{n}', email=f'u{n}@example.com') for n in range(3)]
+        self.group = Group.objects.create(name='Chess club', group_type='hobby', admin=self.users[0])
+
+    def member_count(self):
+        self.group.refresh_from_db()
+        return self.group.member_count
+
+    def test_members_added_are_counted(self):
+        add_members(self.group, [user.id for user in self.users])
+        add_members(self.group, [self.users[0].id])
+        self.assertEqual(self.member_count(), 3)
+
+    def test_concurrent_joins_are_not_counted_twice(self):
+        bulk_create = GroupMembership.objects.bulk_create
+
+        def join_first(objs, **kwargs):
+            # Another request joins the same user after the existing rows were read.
+            GroupMembership.objects.create(group=self.group, user=self.users[0])
+            increment(Group.objects.filter(pk=self.group.pk), 'member_count')
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(GroupMembership.objects, 'bulk_create', join_first):
+            add_members(self.group, [self.users[0].id, self.users[1].id])
+        self.assertEqual(self.group.members.count(), 2)
+        self.assertEqual(self.member_count(), 2)
@@ -0,0 +1,72 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..models import ChatRoom, CustomUser
+from ..realtime.delivery import get_room_member_ids, user_group_name
+from ..realtime.replay import buffers
+from .utils import LOCAL_CACHE
+
+
+IN_MEMORY_CHANNEL_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYER)
+class MessageDeliveryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Delivered messages are kept for replay; don't leave them to other tests.
+        self.addCleanup(buffers.conversations.clear)
+        self.users = [CustomUser.objects.create(username=f'u{n}', email=f'u{n}@example.com') for n in range(3)]
+        self.room = ChatRoom.objects.create(name='room')
+        self.room.members.add(*self.users[:2])
+        self.layer = get_channel_layer()
+        self.channels = {user.id: self.join_user_group(user) for user in self.users}
+
+    def join_user_group(self, user):
+        # What the user's socket does when it connects.
+        channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(user_group_name(user.id), channel)
+        return channel
+
+    def received(self, user):
+        return async_to_sync(self.receive_all)(self.channels[user.id])
+
+    async def receive_all(self, channel):
+        events = []
+        while True:
+            try:
+                events.append(await asyncio.wait_for(self.layer.receive(channel), timeout=0.05))
+            except asyncio.TimeoutError:
+                return events
+
+    def test_messages_reach_every_member_once(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.post(
+            f'/chat/chat/rooms/{self.room.id}/send/', {'content': 'hello', 'room': self.room.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+        for user in self.users[:2]:
+            events = self.received(user)
+            self.assertEqual([event['message'] for event in events], ['hello'])
+            self.assertEqual(events[0]['type'], 'chat_message')
+            self.assertEqual(events[0]['room_id'], self.room.id)
+            self.assertEqual(events[0]['sender_id'], self.users[0].id)
+        self.assertEqual(self.received(self.users[2]), [])
+
+    def test_member_ids_are_cached_until_membership_changes(self):
+        self.assertEqual(get_room_member_ids(self.room.id), {self.users[0].id, self.users[1].id})
+        with self.assertNumQueries(0):
+            get_room_member_ids(self.room.id)
+
+        self.room.members.add(self.users[2])
+        self.assertEqual(get_room_member_ids(self.room.id), {user.id for user in self.users})
+        self.users[0].chat_rooms.remove(self.room)
+        self.assertEqual(get_room_member_ids(self.room.id), {self.users[1].id, self.users[2].id})
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..eager_loading import UnexpectedQueryError, eager_load, serialize
+from ..models import ChatMessage, ChatRoom, CustomUser, Event, EventTag, Group, PrivateChat, PrivateMessage
+from ..serializers import ChatRoomSerializer
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE, EAGER_LOADING_STRICT=True)
+class StrictEagerLoadingTests(TestCase):
+    """List endpoints serialize without a query per row; strict mode raises on any."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='reader', email='reader@example.com', role='student')
+        self.others = [
+            CustomUser.objects.create(username=f'user{n}', email=f'user{n}@example.com', role='student')
+            for n in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_rooms(self, count):
+        for n in range(count):
+            room = ChatRoom.objects.create(name=f'room {n}')
+            room.members.add(self.user, *self.others)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_unloaded_relations_raise(self):
+        self.create_rooms(1)
+        with self.assertRaises(UnexpectedQueryError):
+            serialize(ChatRoomSerializer(ChatRoom.objects.all(), many=True))
+        data = serialize(ChatRoomSerializer(eager_load(ChatRoom.objects.all(), ChatRoomSerializer), many=True))
+        self.assertEqual(len(data[0]['members']), 4)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.create_rooms(1)
+        with CaptureQueriesContext(connection) as one:
+            self.get('/chat/chat/rooms/')
+        self.create_rooms(4)
+        with CaptureQueriesContext(connection) as five:
+            self.assertEqual(len(self.get('/chat/chat/rooms/').data), 5)
+        self.assertEqual(len(five), len(one))
+
+    def test_room_messages(self):
+        self.create_rooms(1)
+        room = ChatRoom.objects.get()
+        for sender in self.others:
+            ChatMessage.objects.create(room=room, sender=sender, content='hello')
+        response = self.get(f'/chat/chat/rooms/{room.id}/messages/')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_private_messages(self):
+        chat = PrivateChat.objects.create(user1=self.user, user2=self.others[0])
+        for sender in (self.user, self.others[0]):
+            PrivateMessage.objects.create(chat=chat, sender=sender, content='hello')
+        response = self.get(f'/chat/chat/private/{chat.id}/messages/')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_events(self):
+        tag = EventTag.objects.create(name='outdoors')
+        start = timezone.now() + timedelta(days=1)
+        for creator in self.others:
+            event = Event.objects.create(
+                title='Hike', description='', creator=creator, location='Hills', event_type='outdoor',
+                start_time=start, end_time=start + timedelta(hours=3)
+            )
+            event.tags.add(tag)
+        response = self.get('/events/events/')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['tags'], [{'id': tag.id, 'name': 'outdoors'}])
+
+    def test_groups(self):
+        for admin in self.others:
+            Group.objects.create(name=f'{admin.username} club', group_type='hobby', admin=admin)
+        self.assertEqual(len(self.get('/groups/').data['results']), 3)
+        self.assertEqual(len(self.get('/groups/groups/discover/').data['results']), 3)
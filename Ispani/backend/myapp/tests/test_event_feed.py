@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import CustomUser, Event, EventParticipant, EventTag
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class EventFeedTests(TestCase):
+    url = '/events/events/'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='reader', email='reader@example.com')
+        self.creator = CustomUser.objects.create(username='creator', email='creator@example.com')
+        self.start = timezone.now() + timedelta(days=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_event(self, title, hours=0, **fields):
+        start = self.start + timedelta(hours=hours)
+        fields.setdefault('event_type', 'social')
+        return Event.objects.create(
+            title=title, description='', creator=self.creator, location='Library',
+            start_time=start, end_time=start + timedelta(hours=1), **fields
+        )
+
+    def titles(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [event['title'] for event in response.data['results']]
+
+    def test_pages_follow_start_time_without_gaps(self):
+        # Two events share each start time.
+        for n in range(5):
+            self.create_event(f'event {n}', hours=n // 2)
+        seen = []
+        url, params = self.url, {'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            seen += self.titles(response)
+            url, params = response.data['next'], None
+        self.assertEqual(seen, [f'event {n}' for n in range(5)])
+
+    def test_only_accessible_upcoming_events_are_listed(self):
+        self.create_event('public')
+        self.create_event('private', is_public=False)
+        invited = self.create_event('invited', is_public=False)
+        EventParticipant.objects.create(event=invited, user=self.user, status='invited')
+        self.create_event('over', hours=-48)
+        self.assertEqual(self.titles(self.client.get(self.url)), ['public', 'invited'])
+
+    def test_filters(self):
+        self.create_event('football', event_type='sports', hours=1)
+        chess = self.create_event('chess', event_type='game', hours=2)
+        chess.tags.add(EventTag.objects.create(name='boardgames'))
+        self.create_event('late chess', event_type='game', hours=30)
+
+        self.assertEqual(self.titles(self.client.get(self.url, {'event_type': 'game'})), ['chess', 'late chess'])
+        self.assertEqual(self.titles(self.client.get(self.url, {'tag': 'boardgames'})), ['chess'])
+        date_to = (self.start + timedelta(hours=3)).isoformat()
+        self.assertEqual(self.titles(self.client.get(self.url, {'date_to': date_to})), ['football', 'chess'])
+
+    def test_bad_cursor_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nonsense'}).status_code, 400)
+
+    def test_cached_feed_is_dropped_when_events_change(self):
+        self.create_event('first')
+        self.assertEqual(self.titles(self.client.get(self.url)), ['first'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(self.client.get(self.url)), ['first'])
+
+        self.create_event('second', hours=1)
+        self.assertEqual(self.titles(self.client.get(self.url)), ['first', 'second'])
@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import CustomUser, Group
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class GroupDiscoveryTests(TestCase):
+    url = '/groups/groups/discover/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='browser', email='browser@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_group(self, name, member_count=0, **fields):
+        fields.setdefault('group_type', 'hobby')
+        group = Group.objects.create(name=name, admin=self.user, **fields)
+        Group.objects.filter(pk=group.pk).update(member_count=member_count)
+        return group
+
+    def names(self, url, params=None):
+        names = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            names += [group['name'] for group in response.data['results']]
+            url, params = response.data['next'], None
+        return names
+
+    def test_recent_pages_cover_every_group_once(self):
+        groups = [self.create_group(f'group {n}') for n in range(5)]
+        # Two groups share a creation time, so pages must split on the id too.
+        same_time = timezone.now()
+        Group.objects.filter(pk__in=[groups[1].pk, groups[2].pk]).update(created_at=same_time)
+        Group.objects.filter(pk__in=[groups[3].pk, groups[4].pk]).update(created_at=timezone.now())
+
+        self.assertEqual(
+            self.names(self.url, {'page_size': 2}), ['group 4', 'group 3', 'group 2', 'group 1', 'group 0']
+        )
+
+    def test_popular_pages_by_member_count(self):
+        self.create_group('quiet', member_count=1)
+        self.create_group('busy', member_count=9)
+        self.create_group('busy too', member_count=9)
+        self.create_group('middling', member_count=4)
+
+        self.assertEqual(
+            self.names(self.url, {'sort': 'popular', 'page_size': 1}), ['busy too', 'busy', 'middling', 'quiet']
+        )
+
+    def test_filters(self):
+        self.create_group('Maths 1', group_type='study', course='Maths', year_of_study=1)
+        self.create_group('Maths 2', group_type='study', course='Maths', year_of_study=2)
+        self.create_group('Hikers', hobbies='hiking, camping')
+        self.create_group('Campers', hobbies='camping')
+
+        self.assertEqual(self.names(self.url, {'course': 'Maths', 'year_of_study': 2}), ['Maths 2'])
+        self.assertEqual(self.names(self.url, {'hobby': 'camping'}), ['Campers', 'Hikers'])
+        self.assertEqual(self.names(self.url, {'hobby': ['camping', 'Hiking']}), ['Hikers'])
+        self.assertEqual(self.names('/groups/groups/study/'), ['Maths 2', 'Maths 1'])
+        self.assertEqual(self.names('/groups/groups/hobby/', {'group_type': 'study'}), ['Campers', 'Hikers'])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'sort': 'name'}, {'group_type': 'club'}, {'year_of_study': 'first'}, {'cursor': 'nonsense'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_listings_leave_out_invite_links(self):
+        self.create_group('Chess club')
+        group = self.client.get(self.url).data['results'][0]
+        self.assertNotIn('invite_link', group)
+        self.assertEqual(group['admin'], self.user.id)
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..membership import add_members
+from ..models import CustomUser, Event, EventParticipant, Group
+from ..realtime.delivery import NotificationQueue
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class EventInviteTests(TestCase):
+
+    def setUp(self):
+        self.inviter = CustomUser.objects.create(username='inviter', email='inviter@example.com')
+        self.users = [CustomUser.objects.create(username=f'u{n}', email=f'u{n}@example.com') for n in range(4)]
+        start = timezone.now() + timedelta(days=1)
+        self.event = Event.objects.create(
+            title='Quiz', description='', creator=self.inviter, location='Hall', event_type='game',
+            start_time=start, end_time=start + timedelta(hours=2)
+        )
+        EventParticipant.objects.create(event=self.event, user=self.inviter, role='organizer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.inviter)
+        add = mock.patch('myapp.realtime.delivery.notifications.add')
+        self.notify = add.start()
+        self.addCleanup(add.stop)
+
+    def invite(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/events/events/{self.event.id}/invite/', data, format='json')
+
+    def invite_notifications(self):
+        return [call.args for call in self.notify.call_args_list if call.args[1]['type'] == 'event_invite']
+
+    def test_invites_users_and_group_members_once(self):
+        group = Group.objects.create(name='Quizzers', group_type='hobby', admin=self.inviter)
+        add_members(group, [self.inviter.id, self.users[1].id, self.users[2].id])
+        EventParticipant.objects.create(event=self.event, user=self.users[2], status='going')
+
+        response = self.invite(user_ids=[self.users[0].id, self.users[1].id], group_id=group.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['invited_count'], 2)
+        invited = EventParticipant.objects.filter(event=self.event, status='invited')
+        self.assertEqual(set(invited.values_list('user_id', flat=True)), {self.users[0].id, self.users[1].id})
+        [(user_ids, notification)] = self.invite_notifications()
+        self.assertEqual(set(user_ids), {self.users[0].id, self.users[1].id})
+        self.assertEqual(notification['event_id'], self.event.id)
+
+    def test_users_who_joined_meanwhile_are_not_invited(self):
+        joined = self.users[0]
+        real_bulk_create = EventParticipant.objects.bulk_create
+
+        def join_first(rows, **kwargs):
+            # As if the user joined between the diff and the insert.
+            EventParticipant.objects.create(event=self.event, user=joined, status='going')
+            return real_bulk_create(rows, **kwargs)
+
+        with mock.patch.object(EventParticipant.objects, 'bulk_create', side_effect=join_first):
+            response = self.invite(user_ids=[joined.id, self.users[1].id])
+
+        self.assertEqual(response.data['invited_count'], 1)
+        self.assertEqual(EventParticipant.objects.get(event=self.event, user=joined).status, 'going')
+        [(user_ids, _)] = self.invite_notifications()
+        self.assertEqual(user_ids, [self.users[1].id])
+
+    def test_only_participants_invite(self):
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.invite(user_ids=[self.users[1].id]).status_code, 403)
+
+    def test_only_groups_of_the_inviter(self):
+        group = Group.objects.create(name='Others', group_type='hobby', admin=self.users[0])
+        self.assertEqual(self.invite(group_id=group.id).status_code, 403)
+
+
+class NotificationQueueTests(SimpleTestCase):
+
+    def test_failures_are_logged(self):
+        queue = NotificationQueue()
+        queue.pending = [([1, 2], {'type': 'event_invite'}), ([3], {'type': 'event_invite'})]
+        with mock.patch('myapp.realtime.delivery.deliver', side_effect=[RuntimeError, None]) as deliver, \
+                self.assertLogs('myapp.realtime.delivery', 'ERROR'):
+            queue.flush()
+        self.assertEqual(deliver.call_count, 2)
+        self.assertEqual(queue.pending, [])
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..matching import StudentIndex, clear_student_index, profile_features
+from ..models import CustomUser, StudentProfile
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class StudentMatchingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_student_index()
+        self.addCleanup(clear_student_index)
+        self.ada = self.create_student('ada', 'Computer Science', 2, 'chess, hiking', 'UCT')
+        self.bob = self.create_student('bob', 'Computer Science', 2, 'chess', 'UCT')
+        self.cal = self.create_student('cal', 'Computer Science', 3, 'rugby', 'Wits')
+        self.dee = self.create_student('dee', 'History of Art', 1, 'painting', 'Wits')
+
+    def create_student(self, name, course, year_of_study, hobbies, institution):
+        user = CustomUser.objects.create(username=name, email=f'{name}@example.com', role='student')
+        profile = user.student_profile
+        profile.course, profile.year_of_study = course, year_of_study
+        profile.hobbies, profile.institution = hobbies, institution
+        profile.save()
+        return user
+
+    def features(self, user):
+        profile = StudentProfile.objects.get(user=user)
+        return profile_features(profile.course, profile.year_of_study, profile.hobbies, profile.institution)
+
+    def test_profile_features(self):
+        self.assertEqual(profile_features('History of Art', 1, 'Painting, the piano', 'Wits University'), {
+            'course:history': 2.0, 'course:art': 2.0, 'hobby:painting': 1.0, 'hobby:piano': 1.0,
+            'institution:wits university': 1.0, 'year:1': 0.5,
+        })
+        self.assertEqual(profile_features(None, None, None, None), {})
+
+    def test_rank_orders_by_similarity(self):
+        index = StudentIndex.build()
+        ranked = index.rank(self.features(self.ada), exclude={self.ada.id})
+        self.assertEqual([user_id for user_id, _ in ranked], [self.bob.id, self.cal.id])
+        self.assertTrue(1 > ranked[0][1] > ranked[1][1] > 0)
+
+        self.assertAlmostEqual(index.rank(self.features(self.ada), limit=1)[0][1], 1, places=5)
+        self.assertEqual(index.rank({'hobby:sailing': 1.0}), [])
+
+    def test_refresh_replaces_changed_profiles(self):
+        index = StudentIndex.build()
+        profile = self.dee.student_profile
+        profile.course, profile.hobbies = 'Computer Science', 'chess, hiking'
+        profile.save()
+        index.refresh(force=True)
+
+        ranked = index.rank(self.features(self.ada), exclude={self.ada.id})
+        self.assertEqual(ranked[0][0], self.bob.id)
+        self.assertEqual([user_id for user_id, _ in ranked].count(self.dee.id), 1)
+        self.assertIn(self.dee.id, [user_id for user_id, _ in ranked[:2]])
+
+    def test_delta_is_folded_into_the_matrix(self):
+        index = StudentIndex.build()
+        with mock.patch('myapp.matching.DELTA_LIMIT', 0):
+            self.create_student('eve', 'Computer Science', 2, 'chess, hiking', 'UCT')
+            index.refresh(force=True)
+        self.assertEqual(index.delta.shape[0], 0)
+        self.assertEqual(index.matrix.shape[0], 5)
+        self.assertAlmostEqual(index.rank(self.features(self.ada), exclude={self.ada.id})[0][1], 1, places=5)
+
+    def similar(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/groups/find-students/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_similar_students_are_paged(self):
+        page = self.similar(self.ada, page_size=1)
+        self.assertEqual([student['username'] for student in page['results']], ['bob'])
+        self.assertEqual(page['results'][0]['course'], 'Computer Science')
+        self.assertIn('offset=1', page['next'])
+
+        page = self.similar(self.ada, page_size=1, offset=1)
+        self.assertEqual([student['username'] for student in page['results']], ['cal'])
+        self.assertIsNone(page['next'])
+
+    def test_students_who_left_are_skipped(self):
+        self.similar(self.ada)
+        self.bob.delete()
+        self.assertEqual([student['username'] for student in self.similar(self.ada)['results']], ['cal'])
+
+    def test_matches_are_recomputed_when_the_profile_changes(self):
+        self.assertEqual(self.similar(self.dee)['results'][0]['username'], 'cal')
+        profile = self.dee.student_profile
+        profile.course, profile.institution, profile.hobbies = 'Computer Science', 'UCT', 'chess'
+        profile.save()
+        clear_student_index()
+        self.assertEqual(self.similar(self.dee)['results'][0]['username'], 'bob')
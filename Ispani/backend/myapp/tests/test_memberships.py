@@ -0,0 +1,112 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..counters import set_participation
+from ..membership import add_members, get_memberships
+from ..models import ChatRoom, CustomUser, Event, Group
+from ..realtime.delivery import notifications, user_group_name
+from ..realtime.presence import status_sync
+from ..routing import websocket_urlpatterns
+from .utils import LOCAL_CACHE
+
+
+IN_MEMORY_CHANNEL_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class MembershipCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='member', email='member@example.com')
+        self.group = Group.objects.create(name='Chess club', group_type='hobby', admin=self.user)
+        self.room = ChatRoom.objects.create(name='room')
+        start = timezone.now() + timedelta(days=1)
+        self.event = Event.objects.create(
+            title='Chess night', description='', creator=self.user, location='Library', event_type='game',
+            start_time=start, end_time=start + timedelta(hours=2)
+        )
+
+    def memberships(self):
+        return get_memberships(CustomUser.objects.get(pk=self.user.pk))
+
+    def test_loaded_once_and_shared_through_the_cache(self):
+        with self.assertNumQueries(3):
+            memberships = get_memberships(self.user)
+        with self.assertNumQueries(0):
+            self.assertIs(get_memberships(self.user), memberships)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(get_memberships(user).in_group(self.group.id))
+
+    def test_changes_drop_the_cached_memberships(self):
+        self.assertFalse(self.memberships().in_group(self.group.id))
+        add_members(self.group, [self.user.id], role='ADMIN')
+        self.assertEqual(self.memberships().groups, {self.group.id: 'ADMIN'})
+
+        self.room.members.add(self.user)
+        self.assertTrue(self.memberships().in_room(self.room.id))
+        self.user.chat_rooms.remove(self.room)
+        self.assertFalse(self.memberships().in_room(self.room.id))
+
+        set_participation(self.event, self.user, 'going', role='organizer')
+        self.assertTrue(self.memberships().in_event(self.event.id))
+
+    def test_sockets_are_told_once_the_change_commits(self):
+        with mock.patch.object(notifications, 'add') as add:
+            with self.captureOnCommitCallbacks() as callbacks:
+                add_members(self.group, [self.user.id])
+            add.assert_not_called()
+            for callback in callbacks:
+                callback()
+        add.assert_called_with((self.user.id,), {'type': 'memberships_changed'})
+
+    def test_joining_twice_is_refused(self):
+        def join():
+            # A user object per request, as authentication would load.
+            client = APIClient()
+            client.force_authenticate(CustomUser.objects.get(pk=self.user.pk))
+            return client.post('/groups/groups/join/', {'group_id': self.group.id})
+
+        self.assertEqual(join().status_code, 200)
+        self.assertEqual(join().status_code, 400)
+        self.assertEqual(self.group.members.count(), 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYER)
+class MembershipSocketTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(status_sync.sync)
+        # The test sends the event itself, from the socket's own loop.
+        patcher = mock.patch.object(notifications, 'add')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create(username='member', email='member@example.com')
+        self.room = ChatRoom.objects.create(name='room')
+        self.room.members.add(self.user)
+
+    async def test_streams_the_user_lost_access_to_are_dropped(self):
+        socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/user/')
+        socket.scope['user'] = self.user
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        await socket.send_json_to({'type': 'subscribe', 'stream': 'r', 'topic': 'room', 'id': self.room.id})
+        self.assertEqual(await socket.receive_json_from(), {'stream': 'r', 'type': 'subscribed'})
+
+        await sync_to_async(self.room.members.remove)(self.user)
+        await get_channel_layer().group_send(user_group_name(self.user.id), {'type': 'memberships_changed'})
+        self.assertEqual(
+            await socket.receive_json_from(), {'stream': 'r', 'type': 'error', 'error': 'No longer allowed'}
+        )
+        await socket.disconnect()
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import ChatMessage, ChatRoom, CustomUser
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class MessageHistoryTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='member', email='member@example.com')
+        self.room = ChatRoom.objects.create(name='room')
+        self.room.members.add(self.user)
+        start = timezone.now() - timedelta(hours=1)
+        # Pairs of messages share a timestamp, so pages must split on the id too.
+        self.messages = [
+            ChatMessage.objects.create(
+                room=self.room, sender=self.user, content=f'message {n}', timestamp=start + timedelta(minutes=n // 2)
+            )
+            for n in range(7)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/chat/chat/rooms/{self.room.id}/messages/'
+
+    def contents(self, response):
+        return [message['content'] for message in response.data['results']]
+
+    def test_latest_page_comes_first_oldest_to_newest(self):
+        response = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.contents(response), ['message 4', 'message 5', 'message 6'])
+        self.assertTrue(response.data['has_older'])
+        self.assertFalse(response.data['has_newer'])
+        self.assertEqual(response.data['before'], str(self.messages[4].id))
+        self.assertEqual(response.data['after'], str(self.messages[6].id))
+
+    def test_paging_back_returns_every_message_once(self):
+        seen = []
+        params = {'page_size': 3}
+        while True:
+            response = self.client.get(self.url, params)
+            seen = self.contents(response) + seen
+            if not response.data['has_older']:
+                break
+            params['before'] = response.data['before']
+        self.assertEqual(seen, [f'message {n}' for n in range(7)])
+
+    def test_after_returns_newer_messages(self):
+        response = self.client.get(self.url, {'after': self.messages[2].id, 'page_size': 2})
+        self.assertEqual(self.contents(response), ['message 3', 'message 4'])
+        self.assertTrue(response.data['has_newer'])
+
+        response = self.client.get(self.url, {'after': self.messages[6].id})
+        self.assertEqual(self.contents(response), [])
+        self.assertFalse(response.data['has_newer'])
+        # Clients keep polling from the same cursor.
+        self.assertEqual(response.data['after'], str(self.messages[6].id))
+
+    def test_bad_cursors_are_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'before': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'before': 1}).status_code, 400)
+        response = self.client.get(self.url, {'before': self.messages[3].id, 'after': self.messages[1].id})
+        self.assertEqual(response.status_code, 400)
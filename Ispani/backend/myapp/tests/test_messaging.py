@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..models import ChatMessage, ChatRoom, CustomUser, PrivateChat, PrivateMessage
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class MessagingPermissionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.member = CustomUser.objects.create(username='member', email='member@example.com')
+        self.friend = CustomUser.objects.create(username='friend', email='friend@example.com')
+        self.stranger = CustomUser.objects.create(username='stranger', email='stranger@example.com')
+        self.room = ChatRoom.objects.create(name='room')
+        self.room.members.add(self.member)
+        self.chat = PrivateChat.objects.create(user1=self.member, user2=self.friend)
+        deliver = mock.patch('myapp.views.messaging.deliver_message', new=mock.AsyncMock())
+        self.deliver_message = deliver.start()
+        self.addCleanup(deliver.stop)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_members_post_to_rooms(self):
+        response = self.client_for(self.member).post(
+            f'/chat/chat/rooms/{self.room.id}/send/', {'content': 'hello', 'room': self.room.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ChatMessage.objects.get().seq, 1)
+        user_ids, event = self.deliver_message.call_args.args
+        self.assertEqual(set(user_ids), {self.member.id})
+        self.assertEqual(event['message'], 'hello')
+
+    def test_others_cannot_post_to_rooms(self):
+        response = self.client_for(self.stranger).post(
+            f'/chat/chat/rooms/{self.room.id}/send/', {'content': 'spam', 'room': self.room.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(ChatMessage.objects.exists())
+        self.deliver_message.assert_not_called()
+
+    def test_others_cannot_read_rooms(self):
+        url = f'/chat/chat/rooms/{self.room.id}/messages/'
+        self.assertEqual(self.client_for(self.member).get(url).status_code, 200)
+        self.assertEqual(self.client_for(self.stranger).get(url).status_code, 403)
+
+    def test_only_the_two_users_post_to_private_chats(self):
+        url = f'/chat/chat/private/{self.chat.id}/send/'
+        response = self.client_for(self.friend).post(url, {'content': 'hi', 'chat': self.chat.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        user_ids, _ = self.deliver_message.call_args.args
+        self.assertEqual(set(user_ids), {self.member.id, self.friend.id})
+
+        response = self.client_for(self.stranger).post(url, {'content': 'spam', 'chat': self.chat.id}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(PrivateMessage.objects.count(), 1)
+
+    def test_only_the_two_users_read_private_chats(self):
+        url = f'/chat/chat/private/{self.chat.id}/messages/'
+        self.assertEqual(self.client_for(self.friend).get(url).status_code, 200)
+        self.assertEqual(self.client_for(self.stranger).get(url).status_code, 403)
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .. import recommendations
+from ..models import CustomUser, Event, EventParticipant, StudentProfile
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class RecommendedEventsTests(TestCase):
+
+    def setUp(self):
+        recommendations._candidates = None
+        self.user = CustomUser.objects.create(username='player', email='player@example.com', role='student')
+        StudentProfile.objects.filter(user=self.user).update(hobbies='chess')
+        creator = CustomUser.objects.create(username='creator', email='creator@example.com')
+        start = timezone.now() + timedelta(days=1)
+        self.chess, self.more_chess, self.hiking = [
+            Event.objects.create(
+                title=title, description='', creator=creator, location='Library', event_type='game',
+                start_time=start, end_time=start + timedelta(hours=2)
+            )
+            for title in ('Chess night', 'Chess and chess problems', 'Hiking')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def recommended(self):
+        response = self.client.get('/events/events/recommended/')
+        self.assertEqual(response.status_code, 200)
+        return [event['id'] for event in response.data]
+
+    def test_events_matching_interests_come_first(self):
+        self.assertEqual(set(self.recommended()[:2]), {self.chess.id, self.more_chess.id})
+
+    def test_events_made_private_are_dropped_from_cached_rankings(self):
+        self.assertIn(self.chess.id, self.recommended())
+        # update() sends no signals, so the cached ranking still holds the event.
+        Event.objects.filter(pk=self.chess.pk).update(is_public=False)
+
+        self.assertIn(self.chess.id, recommendations.get_recommended_event_ids(self.user))
+        self.assertNotIn(self.chess.id, self.recommended())
+
+    def test_rsvps_keep_the_candidate_index(self):
+        index = recommendations.get_candidate_index()
+        EventParticipant.objects.create(event=self.hiking, user=self.user)
+        self.assertIs(recommendations.get_candidate_index(), index)
+
+        self.hiking.title = 'Chess hike'
+        self.hiking.save()
+        self.assertIsNot(recommendations.get_candidate_index(), index)
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..models import ChatMessage, ChatRoom, CustomUser
+from ..realtime.replay import buffers, get_missed, next_seq
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE, MESSAGE_REPLAY_LIMIT=100)
+class ReplayTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        buffers.conversations.clear()
+        self.user = CustomUser.objects.create(username='sender', email='sender@example.com')
+        self.room = ChatRoom.objects.create(name='room')
+
+    def store(self, count):
+        for _ in range(count):
+            ChatMessage.objects.create(
+                room=self.room, sender=self.user, content='hello', seq=next_seq(ChatMessage, self.room.id)
+            )
+
+    def test_seqs_count_up_per_room(self):
+        other = ChatRoom.objects.create(name='other')
+        self.assertEqual([next_seq(ChatMessage, self.room.id) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(next_seq(ChatMessage, other.id), 1)
+
+    def test_lost_counter_continues_from_stored_messages(self):
+        self.store(4)
+        cache.clear()
+        self.assertEqual(next_seq(ChatMessage, self.room.id), 5)
+
+    def test_resume_replays_missed_messages(self):
+        self.store(5)
+        events, latest, complete = get_missed(ChatMessage, self.room.id, 2)
+
+        self.assertEqual([event['seq'] for event in events], [3, 4, 5])
+        self.assertEqual(latest, 5)
+        self.assertTrue(complete)
+        # Read once from the database, then from the buffer.
+        with self.assertNumQueries(0):
+            self.assertEqual([event['seq'] for event in get_missed(ChatMessage, self.room.id, 3)[0]], [4, 5])
+
+    def test_resume_when_up_to_date(self):
+        self.store(2)
+        self.assertEqual(get_missed(ChatMessage, self.room.id, 2), ([], 2, True))
+
+    @override_settings(MESSAGE_REPLAY_LIMIT=2)
+    def test_replay_is_limited(self):
+        self.store(5)
+        events, latest, complete = get_missed(ChatMessage, self.room.id, 0)
+
+        self.assertEqual([event['seq'] for event in events], [4, 5])
+        self.assertFalse(complete)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import CustomUser, Event, Group
+from ..search.backends import InMemorySearchBackend
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE, SEARCH_MAX_RESULTS=2)
+class EventSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='searcher', email='searcher@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_events(self, count, **fields):
+        start = timezone.now() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Event.objects.create(
+                    creator=self.user, location='Library', start_time=start + timedelta(hours=n),
+                    end_time=start + timedelta(hours=n + 1), **fields
+                )
+                for n in range(count)
+            ]
+
+    def search(self, **params):
+        response = self.client.get('/events/events/', params)
+        self.assertEqual(response.status_code, 200)
+        return {event['id'] for event in response.data['results']}
+
+    def test_filters_apply_to_every_match(self):
+        # The best matches by relevance are all social events.
+        self.create_events(3, title='Chess chess', description='Chess', event_type='social')
+        study = self.create_events(2, title='Revision', description='Bring a chess board', event_type='study')
+
+        self.assertEqual(self.search(search='chess', event_type='study'), {event.id for event in study})
+        self.assertEqual(len(self.search(search='chess')), 5)
+
+    def test_terms_are_prefixes_and_all_required(self):
+        chess = self.create_events(1, title='Chess club', description='Weekly games', event_type='game')
+        self.create_events(1, title='Chess', description='Tournament', event_type='game')
+
+        self.assertEqual(self.search(search='che wee'), {chess[0].id})
+        self.assertEqual(self.search(search='!!'), set())
+
+    def test_in_memory_backend_filters_every_match(self):
+        events = self.create_events(3, title='Chess night', description='', event_type='game')
+        backend = InMemorySearchBackend()
+
+        matches = backend.filter(Event.objects.filter(id__gte=events[1].id), 'event', 'chess')
+        self.assertEqual(set(matches), set(events[1:]))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class StudentSearchTests(TestCase):
+
+    def test_caller_does_not_shorten_the_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            students = [
+                CustomUser.objects.create(
+                    username=f'chess{n}', email=f'chess{n}@example.com', first_name='Chess', role='student'
+                )
+                for n in range(55)
+            ]
+        client = APIClient()
+        client.force_authenticate(students[0])
+
+        response = client.get('/groups/find-students/', {'q': 'chess'})
+        self.assertEqual(response.status_code, 200)
+        ids = [student['id'] for student in response.data]
+        self.assertEqual(len(ids), 50)
+        self.assertNotIn(students[0].id, ids)
+
+    def test_short_queries_are_refused(self):
+        user = CustomUser.objects.create(username='searcher', email='searcher@example.com', role='student')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/groups/find-students/', {'q': 'ch'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class GroupSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='searcher', email='searcher@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_group(self, name, description=''):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Group.objects.create(name=name, description=description, group_type='hobby', admin=self.user)
+
+    def search(self, query):
+        response = self.client.get('/groups/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [group['id'] for group in response.data]
+
+    def test_title_matches_rank_first(self):
+        mentioned = self.create_group('Board games', 'Chess on Fridays')
+        named = self.create_group('Chess club')
+        self.assertEqual(self.search('chess'), [named.id, mentioned.id])
+
+    def test_index_follows_changes(self):
+        group = self.create_group('Chess club')
+        with self.captureOnCommitCallbacks(execute=True):
+            group.name = 'Hiking club'
+            group.save()
+        self.assertEqual(self.search('chess'), [])
+        self.assertEqual(self.search('hiking'), [group.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            group.delete()
+        self.assertEqual(self.search('hiking'), [])
+
+    def test_backends_rank_alike(self):
+        mentioned = self.create_group('Board games', 'Chess on Fridays')
+        named = self.create_group('Chess club')
+        hiking = self.create_group('Hiking club')
+        backend = InMemorySearchBackend()
+        self.assertEqual(backend.search('group', 'chess'), [named.id, mentioned.id])
+        self.assertEqual(backend.search('group', 'chess hiking'), [])
+        matches = backend.search('group', 'chess hiking', match_any=True)
+        self.assertEqual(set(matches), {named.id, mentioned.id, hiking.id})
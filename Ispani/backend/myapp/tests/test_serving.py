@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..media.serving import RangeNotSatisfiable, parse_range, requested_range, serve_media
+from ..media.storage import blob_storage
+from ..models import ChatMessage, ChatRoom, CustomUser, Event, EventMedia, MessageAttachment
+from .utils import LOCAL_CACHE, MediaRootMixin
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=500-', 1000), (500, 999))
+        self.assertEqual(parse_range('bytes=900-2000', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+
+    def test_ignored_ranges(self):
+        for header in ('bytes=-', 'items=0-1', 'bytes=0-1,5-6', 'bytes=5-1', 'nonsense'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 1000))
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (('bytes=1000-', 1000), ('bytes=-0', 1000), ('bytes=-10', 0)):
+            with self.subTest(header=header, size=size):
+                with self.assertRaises(RangeNotSatisfiable):
+                    parse_range(header, size)
+
+    def test_if_range(self):
+        factory = RequestFactory()
+        request = factory.get('/', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"abc"')
+        self.assertEqual(requested_range(request, '"abc"', 100), (0, 9))
+        self.assertIsNone(requested_range(request, '"changed"', 100))
+        self.assertIsNone(requested_range(factory.post('/', HTTP_RANGE='bytes=0-9'), '"abc"', 100))
+
+
+@override_settings(MEDIA_ACCEL_REDIRECT=None)
+class ServeMediaTests(MediaRootMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data = bytes(range(256)) * 4
+        self.name = blob_storage.save('notes.bin', ContentFile(self.data))
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        return serve_media(self.factory.get('/', **headers), self.name)
+
+    def test_whole_file(self):
+        response = self.serve()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['Cache-Control'].startswith('private, '))
+
+    def test_etag_is_the_content_hash(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(etag, f'"{self.name.rsplit("/", 1)[1][:64]}"')
+
+        response = self.serve(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_partial_content(self):
+        response = self.serve(HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+
+    def test_range_not_satisfiable(self):
+        response = self.serve(HTTP_RANGE=f'bytes={len(self.data)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_public_files_may_be_shared(self):
+        response = serve_media(self.factory.get('/'), self.name, public=True)
+        self.assertTrue(response['Cache-Control'].startswith('public, '))
+
+
+@override_settings(CACHES=LOCAL_CACHE, MEDIA_ACCEL_REDIRECT=None)
+class MediaAccessTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.member = CustomUser.objects.create(username='member', email='member@example.com')
+        self.stranger = CustomUser.objects.create(username='stranger', email='stranger@example.com')
+        room = ChatRoom.objects.create(name='room')
+        room.members.add(self.member)
+        message = ChatMessage.objects.create(room=room, sender=self.member, content='files')
+        self.attachment = MessageAttachment.objects.create(
+            message=message, file=ContentFile(b'room only', name='notes.txt'), attachment_type='DOCUMENT'
+        )
+        self.event = Event.objects.create(
+            title='Open day', description='All welcome', creator=self.member, location='Hall',
+            start_time=timezone.now() + timedelta(days=1), end_time=timezone.now() + timedelta(days=2)
+        )
+        self.media = EventMedia.objects.create(
+            event=self.event, file=ContentFile(b'poster', name='poster.png'), media_type='image',
+            uploaded_by=self.member
+        )
+
+    def get(self, user, name):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get(f'/media/{name}')
+
+    def test_anonymous_users_are_refused(self):
+        self.assertEqual(self.get(None, self.media.file.name).status_code, 401)
+
+    def test_attachments_are_private_to_the_room(self):
+        response = self.get(self.member, self.attachment.file.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('private, '))
+        self.assertEqual(self.get(self.stranger, self.attachment.file.name).status_code, 404)
+
+    def test_public_event_media_may_be_shared(self):
+        response = self.get(self.stranger, self.media.file.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('public, '))
+
+    def test_private_event_media_is_for_participants(self):
+        Event.objects.filter(pk=self.event.pk).update(is_public=False)
+        self.assertEqual(self.get(self.stranger, self.media.file.name).status_code, 404)
+        response = self.get(self.member, self.media.file.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('private, '))
@@ -0,0 +1,104 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TransactionTestCase, override_settings
+
+from ..models import ChatMessage, ChatRoom, CustomUser
+from ..realtime.writebehind import BufferFull, MessageWriteBehind
+from .utils import LOCAL_CACHE
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class MessageWriteBehindTests(TransactionTestCase):
+    # Foreign keys are only checked on commit, so rows must really be committed.
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='sender', email='sender@example.com')
+        self.room = ChatRoom.objects.create(name='room')
+        self.writer = MessageWriteBehind(ChatMessage, batch_size=100, flush_interval=60)
+        self.addCleanup(self.writer.stop)
+
+    def message(self, **fields):
+        return ChatMessage(room=self.room, sender=self.user, content='hello', **fields)
+
+    def test_flush_inserts_buffered_messages(self):
+        for seq in (1, 2, 3):
+            self.writer.add(self.message(seq=seq))
+        self.assertEqual(ChatMessage.objects.count(), 0)
+
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(sorted(ChatMessage.objects.values_list('seq', flat=True)), [1, 2, 3])
+        self.assertEqual(self.writer.metrics['flushed'], 3)
+        self.assertEqual(self.writer.metrics['pending'], 0)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, max(ChatMessage.objects.values_list('id', flat=True)))
+
+    def test_flush_after_the_interval(self):
+        writer = MessageWriteBehind(ChatMessage, batch_size=100, flush_interval=0.05)
+        self.addCleanup(writer.stop)
+        writer.add(self.message(seq=1))
+        deadline = time.monotonic() + 5
+        while writer.metrics['flushed'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(ChatMessage.objects.count(), 1)
+
+    def test_taken_id_is_replaced(self):
+        stored = ChatMessage.objects.create(room=self.room, sender=self.user, content='first', seq=1)
+        self.writer.add(self.message(id=stored.id, seq=2))
+        self.writer.flush()
+
+        self.assertEqual(ChatMessage.objects.count(), 2)
+        self.assertNotEqual(ChatMessage.objects.get(seq=2).id, stored.id)
+        self.assertEqual(self.writer.metrics['reassigned'], 1)
+        self.assertEqual(self.writer.metrics['dropped'], 0)
+
+    def test_taken_seq_is_replaced(self):
+        ChatMessage.objects.create(room=self.room, sender=self.user, content='first', seq=1)
+        self.writer.add(self.message(seq=1))
+        self.writer.flush()
+
+        self.assertEqual(sorted(ChatMessage.objects.values_list('seq', flat=True)), [1, 2])
+        self.assertEqual(self.writer.metrics['reassigned'], 1)
+
+    def test_message_of_deleted_room_is_dropped(self):
+        self.writer.add(self.message(seq=1))
+        self.writer.add(ChatMessage(room_id=self.room.id + 1000, sender=self.user, content='lost', seq=1))
+        self.writer.flush()
+
+        self.assertEqual(list(ChatMessage.objects.values_list('content', flat=True)), ['hello'])
+        self.assertEqual(self.writer.metrics['dropped'], 1)
+        self.assertEqual(self.writer.metrics['flushed'], 2)
+
+    def test_failed_flush_is_retried_after_a_delay(self):
+        writer = MessageWriteBehind(ChatMessage, batch_size=1, flush_interval=1)
+        writer.buffer.append((time.monotonic(), self.message(seq=1)))
+        with mock.patch.object(ChatMessage.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('myapp.realtime.writebehind', 'ERROR'):
+            self.assertEqual(writer.flush(), 0)
+            self.assertEqual(writer.flush(), 0)
+
+        # 2s after the first failure, 4s after the second.
+        self.assertGreater(writer.retry_at, time.monotonic() + 3)
+        self.assertEqual(writer.metrics['failed_flushes'], 2)
+        self.assertEqual(writer.metrics['pending'], 1)
+        self.assertFalse(writer.is_due())
+
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(ChatMessage.objects.count(), 1)
+        self.assertEqual((writer.failures, writer.retry_at), (0, 0.0))
+
+    def test_full_buffer_rejects_messages(self):
+        writer = MessageWriteBehind(ChatMessage, batch_size=100, flush_interval=60, buffer_limit=2)
+        self.addCleanup(writer.stop)
+        writer.add(self.message(seq=1))
+        writer.add(self.message(seq=2))
+        with self.assertRaises(BufferFull):
+            writer.add(self.message(seq=3))
+
+        self.assertEqual(writer.metrics['rejected'], 1)
+        writer.flush()
+        writer.add(self.message(seq=3))
+        self.assertEqual(writer.metrics['pending'], 1)
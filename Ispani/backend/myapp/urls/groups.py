@@ -8,9 +8,11 @@ urlpatterns = [
     path('groups/create/', views.CreateGroupView.as_view(), name='create-group'),
     path('groups/join/', views.join_group, name='join-group'),
     path('groups/join-by-invite/', views.join_group_by_invite, name='join-group-by-invite'),
-    path('groups/study/', views.study_groups, name='study-groups'),
-    path('groups/hobby/', views.hobby_groups, name='hobby-groups'),
+    path('groups/discover/', views.GroupDiscoveryView.as_view(), name='group-discovery'),
+    path('groups/study/', views.GroupDiscoveryView.as_view(group_type='study'), name='study-groups'),
+    path('groups/hobby/', views.GroupDiscoveryView.as_view(group_type='hobby'), name='hobby-groups'),
     path('groups/<int:group_id>/manage/', views.GroupManagementView.as_view(), name='group-management'),
+    path('groups/<int:group_id>/online/', views.GroupOnlineMembersView.as_view(), name='group-online-members'),
 
     # Search URL
     path('find-students/', views.FindStudentsView.as_view(), name='find-students'),
@@ -0,0 +1,7 @@
+from django.urls import path
+from .. import views
+
+urlpatterns = [
+    path('', views.UploadCreateView.as_view(), name='upload-create'),
+    path('<uuid:upload_id>/', views.UploadView.as_view(), name='upload'),
+]
@@ -9,16 +9,24 @@ urlpatterns = [
     path('chat/rooms/', views.ChatRoomListCreateView.as_view(), name='chat-room-list'),
     path('chat/rooms/<int:room_id>/messages/', views.ChatMessageListView.as_view(), name='room-messages'),
     path('chat/rooms/<int:room_id>/send/', views.SendMessageView.as_view(), name='send-message'),
+    path('chat/rooms/<int:room_id>/read/', views.MarkRoomReadView.as_view(), name='mark-room-read'),
     
     # Private Chat URLs
     path('chat/private/', views.PrivateChatListCreateView.as_view(), name='private-chat'),
     path('chat/private/<int:chat_id>/messages/', views.PrivateMessageListView.as_view(), name='private-messages'),
     path('chat/private/<int:chat_id>/send/', views.SendPrivateMessageView.as_view(), name='send-private-message'),
+    path('chat/private/<int:chat_id>/read/', views.MarkPrivateChatReadView.as_view(), name='mark-private-chat-read'),
+
+    # Read tracking
+    path('chat/unread/', views.UnreadCountsView.as_view(), name='unread-counts'),
+    path('chat/inbox/', views.InboxView.as_view(), name='inbox'),
+    path('chat/metrics/', views.RealtimeMetricsView.as_view(), name='realtime-metrics'),
 
 ]
 
 websocket_urlpatterns = [
-    re_path(r'ws/chat/(?P<group_id>\d+)/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'ws/chat/(?P<room_id>\d+)/$', consumers.ChatConsumer.as_asgi()),
     re_path(r'ws/private-chat/(?P<chat_id>\d+)/$',consumers.PrivateChatConsumer.as_asgi()),
+    re_path(r'ws/user/$', consumers.UserConsumer.as_asgi()),
     
 ]
\ No newline at end of file
@@ -4,4 +4,4 @@ from .groups import *
 from .messaging import *
 from .events import *
 from .tutoring import *
-
+from .media import *
@@ -1,79 +1,83 @@
+from asgiref.sync import async_to_sync
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db.models import Q, Count
-from rest_framework import status
+from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from stripe import Event
 
-from ..models import EventComment, EventMedia, EventParticipant, EventTag
-from ..serializers import EventCommentSerializer, EventDetailSerializer, EventMediaSerializer, EventParticipantSerializer, EventSerializer, EventTagSerializer
-from ..models import CustomUser
+from ..models import Event, EventComment, EventMedia, EventParticipant, EventTag
+from ..serializers import EventCommentSerializer, EventDetailSerializer, EventMediaSerializer, EventParticipantSerializer, EventSerializer, EventTagSerializer, get_event_list_context
+from ..models import CustomUser, GroupMembership
+from ..eager_loading import eager_load, serialize
+from ..counters import Full, leave_event, set_participation
+from ..caching import get_cached_event_feed, invalidate_event_feeds, set_cached_event_feed
+from ..filters import EventFilterBackend
+from ..pagination import EventCursorPagination
+from ..membership import get_memberships, invalidate_memberships
+from ..recommendations import get_recommended_event_ids, invalidate_recommendations
+from ..realtime.delivery import get_room_member_ids, invite_notification, notify, publish_event_comment
+from ..media.uploads import UploadError, get_completed_uploads, media_kind, store_upload
+from ..media.variants import schedule_variants
 
-class EventListCreateView(APIView):
+class EventListCreateView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
-    
-    def get(self, request):
-        """
-        List all events the user can access (public events and private events they're invited to)
-        Supports filtering by various parameters
-        """
-        # Get query parameters
-        event_type = request.query_params.get('event_type')
-        tag = request.query_params.get('tag')
-        search = request.query_params.get('search')
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        my_events = request.query_params.get('my_events') == 'true'
-        participating = request.query_params.get('participating') == 'true'
-        
-        # Base queryset
+    serializer_class = EventSerializer
+    filter_backends = [EventFilterBackend]
+    pagination_class = EventCursorPagination
+
+    def get_queryset(self):
+        my_events = self.request.query_params.get('my_events') == 'true'
+        participating = self.request.query_params.get('participating') == 'true'
+
         if my_events:
             # Events created by current user
-            queryset = Event.objects.filter(creator=request.user)
-        elif participating:
+            return Event.objects.filter(creator=self.request.user)
+
+        if participating:
             # Events the user is participating in
             user_events = EventParticipant.objects.filter(
-                user=request.user,
+                user=self.request.user,
                 status='going'
             ).values_list('event_id', flat=True)
-            queryset = Event.objects.filter(id__in=user_events)
-        else:
-            # All events user can access
-            queryset = Event.objects.filter(
-                Q(is_public=True) | 
-                Q(participants__user=request.user)
-            ).distinct()
-        
-        # Apply filters
-        if event_type:
-            queryset = queryset.filter(event_type=event_type)
-        
-        if tag:
-            queryset = queryset.filter(tags__name=tag)
-        
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search) |
-                Q(location__icontains=search)
-            )
-        
-        if date_from:
-            queryset = queryset.filter(start_time__gte=date_from)
-        
-        if date_to:
-            queryset = queryset.filter(start_time__lte=date_to)
-        
-        # Order by start time (upcoming first)
-        queryset = queryset.filter(end_time__gte=timezone.now()).order_by('start_time')
+            return Event.objects.filter(id__in=user_events)
+
+        # All events user can access. A subquery rather than a join keeps
+        # one row per event, so no DISTINCT is needed and the participant
+        # count annotation is not skewed by the join.
+        return Event.objects.filter(
+            Q(is_public=True) | 
+            Q(id__in=EventParticipant.objects.filter(user=self.request.user).values('event_id'))
+        )
+    
+    def get(self, request):
+        """
+        List upcoming events the user can access (public events and private events they're invited to),
+        one page at a time ordered by start time. Supports filtering by various parameters.
+        The default feed (no parameters) is cached per user for a short time.
+        """
+        use_cache = not request.query_params
+        if use_cache:
+            data = get_cached_event_feed(request.user.id)
+            if data is not None:
+                return Response(data)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.filter(end_time__gte=timezone.now())
+        events = self.paginate_queryset(eager_load(queryset, EventSerializer))
         
-        serializer = EventSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        serializer = EventSerializer(events, many=True, context=get_event_list_context(request, events))
+        response = self.get_paginated_response(serialize(serializer))
+
+        if use_cache:
+            set_cached_event_feed(request.user.id, response.data)
+        return response
     
     def post(self, request):
         """Create a new event"""
@@ -88,11 +92,11 @@ class EventDetailView(APIView):
     
     def get_object(self, pk):
         """Get event or return 404"""
-        event = get_object_or_404(Event, pk=pk)
+        event = get_object_or_404(eager_load(Event.objects.all(), EventDetailSerializer), pk=pk)
         
         # Check if user can access this event
         if not event.is_public:
-            if not EventParticipant.objects.filter(event=event, user=self.request.user).exists():
+            if not get_memberships(self.request.user).in_event(event.id):
                 # If private event and user is not a participant, deny access
                 raise Http404("Event not found")
         
@@ -102,7 +106,7 @@ class EventDetailView(APIView):
         """Get event details"""
         event = self.get_object(pk)
         serializer = EventDetailSerializer(event, context={'request': request})
-        return Response(serializer.data)
+        return Response(serialize(serializer))
     
     def put(self, request, pk):
         """Update event"""
@@ -142,14 +146,6 @@ class EventParticipationView(APIView):
         """Join an event or update participation status"""
         event = get_object_or_404(Event, pk=pk)
         
-        # Check if event is full
-        if (event.participants.filter(status='going').count() >= event.max_participants and 
-            not EventParticipant.objects.filter(event=event, user=request.user).exists()):
-            return Response(
-                {"detail": "This event has reached its maximum capacity"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Get participation status
         status_value = request.data.get('status', 'going')
         if status_value not in [s[0] for s in EventParticipant.STATUS_CHOICES]:
@@ -158,17 +154,17 @@ class EventParticipationView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create or update participant
-        participant, created = EventParticipant.objects.update_or_create(
-            event=event,
-            user=request.user,
-            defaults={'status': status_value}
-        )
-        
-        # If user is the creator, make sure they're an organizer
-        if event.creator == request.user:
-            participant.role = 'organizer'
-            participant.save()
+        # Create or update participant; if user is the creator, make sure they're an organizer
+        try:
+            participant, created = set_participation(
+                event, request.user, status_value,
+                role='organizer' if event.creator == request.user else None
+            )
+        except Full:
+            return Response(
+                {"detail": "This event has reached its maximum capacity"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = EventParticipantSerializer(participant)
         return Response(serializer.data)
@@ -185,11 +181,19 @@ class EventParticipationView(APIView):
             )
         
         # Remove participation
-        EventParticipant.objects.filter(event=event, user=request.user).delete()
+        leave_event(event, request.user)
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class EventInviteView(APIView):
+    """
+    Invite users to an event: ``{"user_ids": [...]}``, and/or every member of
+    a group (``"group_id"``) or chat room (``"room_id"``) the inviter belongs
+    to. Users already taking part are skipped. Invitees are validated,
+    diffed against the participants and inserted in one query each, however
+    many there are, and notified on their sockets in the background after
+    the commit.
+    """
     permission_classes = [IsAuthenticated]
     
     def post(self, request, pk):
@@ -197,41 +201,71 @@ class EventInviteView(APIView):
         event = get_object_or_404(Event, pk=pk)
         
         # Check if user has permission to invite (must be a participant)
-        try:
-            participant = EventParticipant.objects.get(event=event, user=request.user)
-        except EventParticipant.DoesNotExist:
+        if not get_memberships(request.user).in_event(event.id):
             return Response(
                 {"detail": "You must be a participant to invite others"},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Get user IDs to invite
-        user_ids = request.data.get('user_ids', [])
+        try:
+            user_ids = self.get_invitee_ids(request)
+        except PermissionDenied as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_403_FORBIDDEN)
+        except (TypeError, ValueError):
+            return Response({"detail": "Ids must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        user_ids.discard(request.user.id)
         if not user_ids:
             return Response(
                 {"detail": "No users specified to invite"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Invite users
-        invited_count = 0
-        for user_id in user_ids:
-            try:
-                user = CustomUser.objects.get(id=user_id)
-                if not EventParticipant.objects.filter(event=event, user=user).exists():
-                    EventParticipant.objects.create(
-                        event=event,
-                        user=user,
-                        status='invited'
-                    )
-                    invited_count += 1
-                    
-                    # Send notification/email here
-                    
-            except CustomUser.DoesNotExist:
-                pass
+        with transaction.atomic():
+            # Invites to one event wait for each other, so none of them sees a
+            # diff that another is about to change.
+            Event.objects.select_for_update().filter(pk=event.pk).first()
+            user_ids = set(CustomUser.objects.filter(id__in=user_ids).values_list('id', flat=True))
+            user_ids -= set(
+                EventParticipant.objects.filter(event=event, user_id__in=user_ids).values_list('user_id', flat=True)
+            )
+            # Conflicts are users who joined since the diff; they are skipped.
+            EventParticipant.objects.bulk_create(
+                [EventParticipant(event=event, user_id=user_id, status='invited') for user_id in user_ids],
+                batch_size=500, ignore_conflicts=True
+            )
+            # Those users kept the row they joined with, so only rows still
+            # invited are ones inserted here.
+            invited_ids = sorted(
+                EventParticipant.objects.filter(event=event, user_id__in=user_ids, status='invited')
+                .values_list('user_id', flat=True)
+            )
+            # bulk_create sends no post_save, so do what the receivers would.
+            invalidate_event_feeds()
+            invalidate_recommendations(*invited_ids)
+            invalidate_memberships(*invited_ids)
+            notify(invited_ids, invite_notification(event, request.user))
         
-        return Response({"invited_count": invited_count})
+        return Response({"invited_count": len(invited_ids)})
+
+    def get_invitee_ids(self, request):
+        user_ids = request.data.get('user_ids') or []
+        if not isinstance(user_ids, list):
+            raise ValueError("user_ids must be a list")
+        user_ids = {int(user_id) for user_id in user_ids}
+
+        memberships = get_memberships(request.user)
+        group_id = request.data.get('group_id')
+        if group_id is not None:
+            if not memberships.in_group(int(group_id)):
+                raise PermissionDenied("You can only invite groups you belong to")
+            user_ids |= set(GroupMembership.objects.filter(group_id=int(group_id)).values_list('user_id', flat=True))
+
+        room_id = request.data.get('room_id')
+        if room_id is not None:
+            if not memberships.in_room(int(room_id)):
+                raise PermissionDenied("You can only invite rooms you belong to")
+            user_ids |= get_room_member_ids(int(room_id))
+        return user_ids
 
 class EventCommentView(APIView):
     permission_classes = [IsAuthenticated]
@@ -240,15 +274,16 @@ class EventCommentView(APIView):
         """Get comments for an event"""
         event = get_object_or_404(Event, pk=pk)
         comments = EventComment.objects.filter(event=event).order_by('created_at')
+        comments = eager_load(comments, EventCommentSerializer)
         serializer = EventCommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        return Response(serialize(serializer))
     
     def post(self, request, pk):
         """Add a comment to an event"""
         event = get_object_or_404(Event, pk=pk)
         
         # Check if user is a participant
-        if not EventParticipant.objects.filter(event=event, user=request.user).exists():
+        if not get_memberships(request.user).in_event(event.id):
             return Response(
                 {"detail": "You must be a participant to comment"},
                 status=status.HTTP_403_FORBIDDEN
@@ -260,7 +295,9 @@ class EventCommentView(APIView):
         
         if serializer.is_valid():
             comment = serializer.save(event=event, user=request.user)
-            return Response(EventCommentSerializer(comment).data, status=status.HTTP_201_CREATED)
+            data = EventCommentSerializer(comment).data
+            async_to_sync(publish_event_comment)(comment, data)
+            return Response(data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -270,21 +307,24 @@ class EventMediaView(APIView):
     def get(self, request, pk):
         """Get media for an event"""
         event = get_object_or_404(Event, pk=pk)
-        media = EventMedia.objects.filter(event=event)
+        media = eager_load(EventMedia.objects.filter(event=event), EventMediaSerializer)
         serializer = EventMediaSerializer(media, many=True)
-        return Response(serializer.data)
+        return Response(serialize(serializer))
     
     def post(self, request, pk):
         """Add media to an event"""
         event = get_object_or_404(Event, pk=pk)
         
         # Check if user is a participant
-        if not EventParticipant.objects.filter(event=event, user=request.user).exists():
+        if not get_memberships(request.user).in_event(event.id):
             return Response(
                 {"detail": "You must be a participant to add media"},
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        if request.data.get('upload'):
+            return self.post_upload(request, event)
+
         serializer = EventMediaSerializer(data={
             'file': request.data.get('file'),
             'media_type': request.data.get('media_type'),
@@ -292,11 +332,35 @@ class EventMediaView(APIView):
         })
         
         if serializer.is_valid():
-            media = serializer.save(event=event, uploaded_by=request.user)
+            # A failed insert also undoes its blob reference (see myapp/media/blobs.py).
+            with transaction.atomic():
+                media = serializer.save(event=event, uploaded_by=request.user)
+            if media.media_type == 'image':
+                schedule_variants(media)
             return Response(EventMediaSerializer(media).data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def post_upload(self, request, event):
+        """Add a completed chunked upload (see myapp/media/uploads.py) as media"""
+        try:
+            upload, = get_completed_uploads(request.user, [request.data.get('upload')])
+        except UploadError as exc:
+            return Response({"upload": [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        kind = media_kind(upload.content_type)
+        media_type = request.data.get('media_type') or (kind if kind in ('image', 'video') else 'document')
+        if media_type not in dict(EventMedia.MEDIA_TYPE_CHOICES):
+            return Response({"media_type": ["Invalid media type."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        media = store_upload(upload, EventMedia(
+            event=event,
+            uploaded_by=request.user,
+            media_type=media_type,
+            title=request.data.get('title', '')
+        ))
+        return Response(EventMediaSerializer(media).data, status=status.HTTP_201_CREATED)
+
 class EventTagsView(APIView):
     permission_classes = [AllowAny]
     
@@ -318,24 +382,16 @@ def join_event_by_invite(request, invite_link):
     except Event.DoesNotExist:
         return Response({"detail": "Invalid invite link"}, status=status.HTTP_404_NOT_FOUND)
     
-    # Check if event is full
-    if event.participants.filter(status='going').count() >= event.max_participants:
+    # Add user as participant
+    try:
+        set_participation(event, request.user, 'going')
+    except Full:
         return Response(
             {"detail": "This event has reached its maximum capacity"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Add user as participant
-    participant, created = EventParticipant.objects.get_or_create(
-        event=event,
-        user=request.user,
-        defaults={'status': 'going'}
-    )
-    
-    if not created:
-        participant.status = 'going'
-        participant.save()
-    
+    event.refresh_from_db(fields=['participants_count'])
     serializer = EventDetailSerializer(event, context={'request': request})
     return Response(serializer.data)
 
@@ -355,52 +411,27 @@ def upcoming_events(request):
     events = Event.objects.filter(
         id__in=user_events
     ).order_by('start_time')[:5]  # Get next 5 events
+    events = list(eager_load(events, EventSerializer))
     
-    serializer = EventSerializer(events, many=True, context={'request': request})
-    return Response(serializer.data)
+    serializer = EventSerializer(events, many=True, context=get_event_list_context(request, events))
+    return Response(serialize(serializer))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def recommended_events(request):
     """Get recommended events based on user interests and past participation"""
-    now = timezone.now()
-    user = request.user
-    
-    # Get user's past events
-    past_events = EventParticipant.objects.filter(
-        user=user,
-        status='going',
-        event__end_time__lt=now
-    ).values_list('event_id', flat=True)
-    
-    # Get event types user has participated in
-    event_types = Event.objects.filter(
-        id__in=past_events
-    ).values_list('event_type', flat=True).distinct()
-    
-    # Get tags from events user has participated in
-    tags = Event.objects.filter(
-        id__in=past_events
-    ).values_list('tags__name', flat=True).distinct()
-    
-    # Find upcoming events that match user interests
-    if hasattr(user, 'student_profile'):
-        hobbies = user.student_profile.hobbies
-    else:
-        hobbies = ""
+    # Ranked ids are precomputed and cached per user (see myapp/recommendations.py)
+    event_ids = get_recommended_event_ids(request.user)
+    positions = {event_id: position for position, event_id in enumerate(event_ids)}
     
+    # Rankings are cached for a while, so events that became private or ended
+    # since are dropped here, and the next best take their place.
     recommended = Event.objects.filter(
-        Q(is_public=True) &
-        Q(end_time__gt=now) &
-        (
-            Q(event_type__in=event_types) |
-            Q(tags__name__in=tags) |
-            Q(description__icontains=hobbies) |
-            Q(title__icontains=hobbies)
-        )
-    ).exclude(
-        participants__user=user  # Exclude events user is already participating in
-    ).distinct().order_by('start_time')[:10]
+        id__in=event_ids,
+        is_public=True,
+        end_time__gt=timezone.now()
+    )
+    recommended = sorted(eager_load(recommended, EventSerializer), key=lambda event: positions[event.id])[:10]
     
-    serializer = EventSerializer(recommended, many=True, context={'request': request})
-    return Response(serializer.data)
\ No newline at end of file
+    serializer = EventSerializer(recommended, many=True, context=get_event_list_context(request, recommended))
+    return Response(serialize(serializer))
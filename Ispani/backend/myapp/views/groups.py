@@ -6,17 +6,53 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Q
 
 from .authentication import UserSerializer
 
 from ..models import CustomUser, Group, GroupMembership
-from ..serializers import GroupSerializer, GroupMembershipSerializer
-
-class GroupListCreate(generics.ListCreateAPIView):
+from ..serializers import GroupListSerializer, GroupSerializer, GroupMembershipSerializer, StudentMatchSerializer
+from ..matching import get_similar_students
+from ..membership import add_members, get_memberships
+from ..eager_loading import EagerLoadingMixin, eager_load, serialize
+from ..filters import GroupFilterBackend
+from ..pagination import GroupCursorPagination, RankedListPagination
+from ..search import filter_ranked
+from ..realtime.presence import get_online_user_ids
+
+class GroupListCreate(EagerLoadingMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
+    pagination_class = GroupCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        query = self.request.query_params.get('q')
+        if query:
+            queryset = filter_ranked(queryset, 'group', query)
+        return queryset
+
+    @property
+    def paginator(self):
+        # Search results keep their relevance order and are capped at SEARCH_MAX_RESULTS.
+        if self.request.query_params.get('q'):
+            return None
+        return super().paginator
+
+class GroupDiscoveryView(EagerLoadingMixin, generics.ListAPIView):
+    """
+    Browse groups a page at a time: ``sort=recent`` (default) or ``popular``,
+    filtered by group_type, course, year_of_study and hobby (see
+    GroupFilterBackend). Each page is a range scan on one of the Group
+    indexes, however many groups there are.
+    """
+    permission_classes = [IsAuthenticated]
+    queryset = Group.objects.all()
+    serializer_class = GroupListSerializer
+    filter_backends = [GroupFilterBackend]
+    pagination_class = GroupCursorPagination
+    # Set for the per-type listings.
+    group_type = None
 
 class CreateGroupView(APIView):
     permission_classes = [IsAuthenticated]
@@ -51,7 +87,8 @@ class CreateGroupView(APIView):
             invite_link=get_random_string(20)
         )
 
-        group.members.add(request.user)
+        add_members(group, [request.user.id], role='ADMIN')
+        group.refresh_from_db(fields=['member_count'])
 
         serializer = GroupSerializer(group)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -66,26 +103,13 @@ def join_group(request):
 
     group = get_object_or_404(Group, id=group_id)
 
-    if group.members.filter(id=request.user.id).exists():
+    if get_memberships(request.user).in_group(group.id):
         return Response({"error": "You are already a member of this group"}, status=status.HTTP_400_BAD_REQUEST)
 
-    group.members.add(request.user)
+    add_members(group, [request.user.id])
 
     return Response({"message": "You have successfully joined the group."}, status=status.HTTP_200_OK)
 
-@api_view(['GET'])
-def study_groups(request):
-    study_groups = Group.objects.filter(group_type='study')
-    serializer = GroupSerializer(study_groups, many=True)
-    return Response(serializer.data)
-
-@api_view(['GET'])
-def hobby_groups(request):
-    hobby_groups = Group.objects.filter(group_type='hobby')
-    serializer = GroupSerializer(hobby_groups, many=True)
-    return Response(serializer.data)
-
-
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def join_group_by_invite(request):
@@ -99,11 +123,10 @@ def join_group_by_invite(request):
     except Group.DoesNotExist:
         return Response({"error": "Invalid invite link"}, status=status.HTTP_404_NOT_FOUND)
 
-    if group.members.filter(id=request.user.id).exists():
+    if get_memberships(request.user).in_group(group.id):
         return Response({"error": "You are already a member of this group"}, status=status.HTTP_400_BAD_REQUEST)
 
-    group.members.add(request.user)
-    GroupMembership.objects.create(user=request.user, group=group)
+    add_members(group, [request.user.id])
 
     return Response({
         "message": f"You have joined the group: {group.name}",
@@ -127,36 +150,68 @@ class GroupManagementView(APIView):
 
         user = get_object_or_404(CustomUser, id=user_id)
 
-        if group.members.filter(id=user.id).exists():
+        if get_memberships(user).in_group(group.id):
             return Response({"error": "User is already a member of this group"}, status=status.HTTP_400_BAD_REQUEST)
 
-        group.members.add(user)
-        membership, created = GroupMembership.objects.get_or_create(
-            user=user,
-            group=group,
-            defaults={'role': role}
-        )
+        add_members(group, [user.id], role=role)
+        membership = GroupMembership.objects.get(user=user, group=group)
 
         return Response(GroupMembershipSerializer(membership).data, status=status.HTTP_201_CREATED)
+
+class GroupOnlineMembersView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, group_id):
+        """List the members of a group who are currently online"""
+        group = get_object_or_404(Group, id=group_id)
+
+        if not get_memberships(request.user).in_group(group.id):
+            return Response({"error": "Only members can see who is online"}, status=status.HTTP_403_FORBIDDEN)
+
+        member_ids = list(GroupMembership.objects.filter(group=group).values_list('user_id', flat=True))
+        online = get_online_user_ids(member_ids)
+        return Response({
+            "group_id": group.id,
+            "online_count": len(online),
+            "online_user_ids": online
+        })
     
 class FindStudentsView(APIView):
+    """
+    Search students with ``q``; without it, list the students most similar
+    to the user by course, hobbies, institution and year (myapp/matching.py),
+    a page at a time.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         query = request.query_params.get('q', '')
 
+        if not query:
+            return self.similar_students(request)
+
         if len(query) < 3:
             return Response({"error": "Query must be at least 3 characters"}, status=status.HTTP_400_BAD_REQUEST)
 
-        students = CustomUser.objects.filter(
-            Q(username__icontains=query) |
-            Q(student_profile__course__icontains=query) |
-            Q(student_profile__hobbies__icontains=query),
-            role='student'
-        ).exclude(id=request.user.id).distinct()
+        # One more than is shown, since the caller may be among the matches.
+        students = filter_ranked(CustomUser.objects.filter(role='student'), 'student', query, limit=51)
+        students = eager_load(students.exclude(id=request.user.id), UserSerializer)[:50]
 
         serializer = UserSerializer(students, many=True)
-        return Response(serializer.data)
+        return Response(serialize(serializer))
+
+    def similar_students(self, request):
+        paginator = RankedListPagination()
+        matches = paginator.paginate_queryset(get_similar_students(request.user), request, view=self)
+        similarity = dict(matches)
+        students = {
+            student.id: student
+            for student in eager_load(CustomUser.objects.filter(id__in=similarity, role='student'), StudentMatchSerializer)
+        }
+        # Students who left since the ranking was computed are skipped.
+        page = [students[user_id] for user_id, _ in matches if user_id in students]
+        serializer = StudentMatchSerializer(page, many=True, context={'similarity': similarity})
+        return paginator.get_paginated_response(serialize(serializer))
 
 
 
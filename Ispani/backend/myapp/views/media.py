@@ -0,0 +1,83 @@
+from django.http import Http404
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..media.access import PUBLIC, media_access
+from ..media.serving import serve_media
+from ..media.uploads import OffsetMismatch, UploadError, discard_upload, write_chunk
+from ..models import Upload
+from ..serializers import UploadSerializer
+
+
+class UploadCreateView(APIView):
+    """Start a chunked upload: ``{"filename", "size", "content_type"}``."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = UploadSerializer(data=request.data)
+        if serializer.is_valid():
+            upload = serializer.save(user=request.user)
+            return Response(UploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UploadView(APIView):
+    """
+    GET reports how much of the upload has arrived, PUT appends the request
+    body at the ``Upload-Offset`` header, DELETE abandons the upload.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        upload = Upload.objects.filter(pk=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(UploadSerializer(upload).data)
+
+    def put(self, request, upload_id):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({"error": "An Upload-Offset header is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # The body is streamed to disk, never read into memory whole.
+            upload = write_chunk(request.user, upload_id, offset, request.stream, length)
+        except Upload.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        except OffsetMismatch as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except UploadError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSerializer(upload).data)
+
+    def delete(self, request, upload_id):
+        upload = Upload.objects.filter(pk=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        discard_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MediaFileView(APIView):
+    """
+    Stored media under ``MEDIA_URL``, with range requests and revalidation
+    (see myapp/media/serving.py), for users allowed to see a row using it
+    (see myapp/media/access.py). Other files are reported as missing.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, name):
+        access = media_access(request.user, name)
+        if access is None:
+            raise Http404("No such file")
+        return serve_media(request, name, public=access == PUBLIC)
+
+    def head(self, request, name):
+        return self.get(request, name)
+
+    def perform_content_negotiation(self, request, force=False):
+        # Files are sent as they are, whatever the client accepts.
+        return super().perform_content_negotiation(request, force=True)
@@ -1,32 +1,63 @@
+from asgiref.sync import async_to_sync
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import generics
-from ..models import CustomUser,ChatRoom, ChatMessage, PrivateChat, PrivateMessage
-from ..serializers import ChatMessageSerializer, ChatRoomSerializer,PrivateChatSerializer, PrivateMessageSerializer
+from rest_framework.exceptions import PermissionDenied
+from ..models import CustomUser,ChatRoom, ChatMessage, MessageAttachment, PrivateChat, PrivateMessage, ReadState
+from ..serializers import ChatMessageSerializer, ChatRoomSerializer,PrivateChatSerializer, PrivateMessageSerializer, ReadStateSerializer, InboxSerializer
+from ..pagination import InboxCursorPagination, MessageCursorPagination
+from ..eager_loading import EagerLoadingMixin
+from ..membership import get_memberships
+from ..media.uploads import UploadError, get_completed_uploads, media_kind, store_upload
+from ..realtime.delivery import deliver_message, get_private_chat_user_ids, get_room_member_ids, message_event
+from ..realtime.flow import get_flow_metrics
+from ..realtime.replay import next_seq
+from ..realtime.unread import mark_read
+from ..realtime.writebehind import get_write_behind_metrics
 
-class ChatRoomListCreateView(generics.ListCreateAPIView):
+class ChatRoomListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = ChatRoom.objects.all()
     serializer_class = ChatRoomSerializer
     permission_classes = [IsAuthenticated]
 
-class ChatMessageListView(generics.ListAPIView):
+class ChatMessageListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = ChatMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     def get_queryset(self):
         room_id = self.kwargs['room_id']
-        return ChatMessage.objects.filter(room_id=room_id).order_by('timestamp')
+        if not get_memberships(self.request.user).in_room(room_id):
+            raise PermissionDenied("You are not a member of this room")
+        return ChatMessage.objects.filter(room_id=room_id)
 
 class SendMessageView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, room_id):
         room = get_object_or_404(ChatRoom, id=room_id)
+        if not get_memberships(request.user).in_room(room.id):
+            return Response({"error": "You are not a member of this room"}, status=403)
         serializer = ChatMessageSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(sender=request.user, room=room)
+            # Completed chunked uploads (see myapp/media/uploads.py) to attach
+            upload_ids = request.data.get('uploads') or []
+            if hasattr(request.data, 'getlist'):
+                upload_ids = request.data.getlist('uploads')
+            try:
+                uploads = get_completed_uploads(request.user, upload_ids)
+            except UploadError as exc:
+                return Response({"uploads": [str(exc)]}, status=400)
+
+            message = serializer.save(sender=request.user, room=room, seq=next_seq(ChatMessage, room.id))
+            for upload in uploads:
+                store_upload(upload, MessageAttachment(
+                    message=message,
+                    attachment_type=media_kind(upload.content_type).upper()
+                ))
+            async_to_sync(deliver_message)(get_room_member_ids(room.id), message_event(message, request.user))
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
@@ -45,21 +76,106 @@ class PrivateChatListCreateView(APIView):
         serializer = PrivateChatSerializer(chat)
         return Response(serializer.data, status=201 if created else 200)
 
-class PrivateMessageListView(generics.ListAPIView):
+class PrivateMessageListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = PrivateMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     def get_queryset(self):
         chat_id = self.kwargs['chat_id']
-        return PrivateMessage.objects.filter(chat_id=chat_id).order_by('timestamp')
+        if self.request.user.id not in get_private_chat_user_ids(chat_id):
+            raise PermissionDenied("You are not part of this chat")
+        return PrivateMessage.objects.filter(chat_id=chat_id)
 
 class SendPrivateMessageView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, chat_id):
         chat = get_object_or_404(PrivateChat, id=chat_id)
+        if request.user.id not in get_private_chat_user_ids(chat.id):
+            return Response({"error": "You are not part of this chat"}, status=403)
         serializer = PrivateMessageSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(sender=request.user, chat=chat)
+            message = serializer.save(sender=request.user, chat=chat, seq=next_seq(PrivateMessage, chat.id))
+            async_to_sync(deliver_message)(get_private_chat_user_ids(chat.id), message_event(message, request.user))
             return Response(serializer.data, status=201)
-        return Response(serializer.errors, status=400)
\ No newline at end of file
+        return Response(serializer.errors, status=400)
+
+class MarkReadView(APIView):
+    """
+    Move the user's read position in a conversation. Accepts an optional
+    ``message_id`` (the last message seen); without it everything stored
+    so far is marked read.
+    """
+    permission_classes = [IsAuthenticated]
+    model = None
+    url_kwarg = None
+
+    def post(self, request, **kwargs):
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return Response({"error": "message_id must be an integer"}, status=400)
+
+        state = mark_read(request.user, self.model, kwargs[self.url_kwarg], message_id)
+        if state is None:
+            return Response({"error": "You are not part of this conversation"}, status=404)
+        return Response(ReadStateSerializer(state).data)
+
+class MarkRoomReadView(MarkReadView):
+    model = ChatMessage
+    url_kwarg = 'room_id'
+
+class MarkPrivateChatReadView(MarkReadView):
+    model = PrivateMessage
+    url_kwarg = 'chat_id'
+
+class UnreadCountsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Unread counts for all of the user's conversations"""
+        rooms = {}
+        private_chats = {}
+        states = ReadState.objects.filter(user=request.user).values_list('room_id', 'private_chat_id', 'unread_count')
+        for room_id, chat_id, unread_count in states:
+            if room_id is not None:
+                rooms[room_id] = unread_count
+            else:
+                private_chats[chat_id] = unread_count
+
+        return Response({
+            "rooms": rooms,
+            "private_chats": private_chats,
+            "total": sum(rooms.values()) + sum(private_chats.values())
+        })
+
+class InboxView(EagerLoadingMixin, generics.ListAPIView):
+    """
+    The user's chat rooms and private chats, most recently active first,
+    with the last message and unread count of each.
+    """
+    serializer_class = InboxSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = InboxCursorPagination
+    select_related_fields = (
+        'room__last_message__sender',
+        'private_chat__last_message__sender',
+        'private_chat__user1',
+        'private_chat__user2',
+    )
+
+    def get_queryset(self):
+        return ReadState.objects.filter(user=self.request.user)
+
+class RealtimeMetricsView(APIView):
+    """Counters of the serving process's message writers and WebSockets."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'write_behind': get_write_behind_metrics(),
+            'websockets': get_flow_metrics(),
+        })
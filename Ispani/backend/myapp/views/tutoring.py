@@ -17,9 +17,9 @@ from ..serializers import (
     BookingSerializer,CalendlyConnectionSerializer, CalendlyOAuthCallbackSerializer,
     JoinGroupSessionSerializer
 )
+from ..eager_loading import EagerLoadingMixin, eager_load, serialize
 
 from datetime import datetime, timedelta, timezone
-from requests import Response
 from .. import models
 
 
@@ -37,9 +37,10 @@ class TutorAvailabilityView(APIView):
             tutor_id=tutor_id,
             end_time__gt=timezone.now()
         ).order_by('start_time')
+        availabilities = eager_load(availabilities, TutorAvailabilitySerializer)
         
         serializer = TutorAvailabilitySerializer(availabilities, many=True)
-        return Response(serializer.data)
+        return Response(serialize(serializer))
 
     def post(self, request):
         if request.user.role != 'tutor':
@@ -314,9 +315,11 @@ class CalendlyWebhookView(APIView):
             return Response({'status': 'error', 'message': 'Event not found'}, 
                             status=status.HTTP_404_NOT_FOUND)
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ('student', 'tutor')
+    prefetch_related_fields = ('participants__student',)
     
     def get_queryset(self):
         user = self.request.user
@@ -424,9 +427,14 @@ class GroupSessionViewSet(viewsets.ViewSet):
             start_time__gt=datetime.now(),
             current_participants__lt=models.F('max_participants')
         )
+        group_sessions = eager_load(
+            group_sessions, BookingSerializer,
+            select_related=('student', 'tutor'),
+            prefetch_related=('participants__student',)
+        )
         
         serializer = BookingSerializer(group_sessions, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(serialize(serializer))
     
     @action(detail=False, methods=['post'])
     def join(self, request):